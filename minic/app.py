@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Application bootstrap shared by GUI and headless entry points. Must not import
+GUI toolkits.
+"""
+import logging
+import os
+import sys
+import tx_logging
+
+from twisted.python.logfile import LogFile
+
+from tx_logging.observers import LevelFileLogObserver
+
+from minic.settings import SETTINGS_ROOT, LOG_ROOT, LOG_SETTINGS
+from minic.util import ugettext_lazy as _, pid_exists
+
+
+LOG = tx_logging.getLogger(__name__)
+
+class PidLock(object):
+
+    def __init__(self):
+        self.pidpath = os.path.join(SETTINGS_ROOT, 'minic.pid')
+        if not os.path.exists(self.pidpath):
+            return
+        with open(self.pidpath, 'r') as f:
+            pid = int(f.readline().strip())
+        if pid_exists(pid):
+            raise RuntimeError(_("Another instance is still running"))
+
+    def __enter__(self):
+        with open(self.pidpath, 'w') as f:
+            f.write(str(os.getpid()))
+
+    def __exit__(self, *args):
+        os.remove(self.pidpath)
+
+
+def check_dir(path):
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            raise RuntimeError(_("Failed to create path: \n{0}".format(path)))
+
+
+def check_dirs():
+    check_dir(SETTINGS_ROOT)
+    check_dir(LOG_ROOT)
+
+
+def setup_logging():
+    filename = LOG_SETTINGS['file_path']
+    log_file = LogFile.fromFullPath(
+        filename,
+        rotateLength=LOG_SETTINGS['max_bytes'],
+        maxRotatedFiles=LOG_SETTINGS['max_backups']
+    ) if filename is not None else sys.stdout
+
+    log_level = getattr(logging, LOG_SETTINGS['level'])
+
+    observer = LevelFileLogObserver(log_file, log_level)
+    observer.timeFormat = LOG_SETTINGS['time_format']
+    observer.start()
+
+
+def start_metrics_service(port):
+    """
+    Serve metrics over HTTP on given port until reactor is stopped. Endpoint
+    is disabled if it cannot be started, e.g. if `twisted.web` is missing
+    from a frozen build.
+
+    Output:
+    Started service or `None`.
+    """
+    from twisted.internet import reactor
+    try:
+        from minic.web import MetricsService
+        service = MetricsService(port)
+        service.startService()
+    except Exception as e:
+        LOG.error("Failed to start metrics endpoint: {0}".format(unicode(e)))
+        return None
+    reactor.addSystemEventTrigger('before', 'shutdown', service.stopService)
+    return service
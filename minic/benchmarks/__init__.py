@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for commander's hot paths. Run them with::
+
+    python -m minic.benchmarks --output results.json
+    python -m minic.benchmarks --compare results.json
+
+Results are stored as JSON, so runs can be compared with each other to see
+regressions.
+"""
+import json
+import math
+import platform
+import time
+
+import minic
+
+
+#: Relative slowdown which is treated as regression by default
+DEFAULT_TOLERANCE = 0.2
+
+
+def percentile(values, p):
+    """
+    Get percentile of sorted values using nearest-rank method.
+
+    :param list values: sorted list of values.
+    :param float p: percentile in range ``[0, 100]``.
+    """
+    if not values:
+        return None
+    index = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+class Recorder(object):
+    """
+    Collects durations of measured operations grouped by names.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._units = {}
+
+    def add(self, name, duration, units=1):
+        """
+        Add duration of operation which has processed given number of units
+        (e.g. lines or events).
+        """
+        self._samples.setdefault(name, []).append(duration)
+        self._units[name] = self._units.get(name, 0) + units
+
+    def measure(self, name, func, *args, **kwargs):
+        start = time.time()
+        result = func(*args, **kwargs)
+        self.add(name, time.time() - start)
+        return result
+
+    def results(self):
+        results = {}
+        for name, samples in self._samples.items():
+            samples = sorted(samples)
+            total = sum(samples)
+            results[name] = {
+                'count': len(samples),
+                'mean': total / len(samples),
+                'p50': percentile(samples, 50),
+                'p90': percentile(samples, 90),
+                'p99': percentile(samples, 99),
+                'max': samples[-1],
+                'throughput': (self._units[name] / total) if total else None,
+            }
+        return results
+
+
+def make_report(results, params):
+    return {
+        'version': minic.get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'params': params,
+        'results': results,
+    }
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results with baseline ones by 90th percentile.
+
+    :returns: a list of tuples ``(name, baseline_p90, p90, ratio,
+              is_regression)`` sorted by name.
+    """
+    rows = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['p90'], results[name]['p90']
+        ratio = (new / old) if old else None
+        is_regression = ratio is not None and ratio > 1 + tolerance
+        rows.append((name, old, new, ratio, is_regression))
+    return rows
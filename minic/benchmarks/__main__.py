@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Run commander's benchmarks against a fake game server.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer
+
+from minic.benchmarks import (
+    Recorder, DEFAULT_TOLERANCE, compare, load_report, make_report,
+    save_report,
+)
+from minic.benchmarks.server import FakeServer
+
+
+EVENT_LOG_SAMPLES = (
+    "[8:46:55 PM] user{0} selected army Red at 100.0 200.99",
+    "[8:49:39 PM] user{0}:Pe-8(0) seat occupied by user{0} at 100.0 200.99",
+    "[8:49:35 PM] user{0}:Pe-8 loaded weapons '40fab100' fuel 40%",
+    "[8:49:32 PM] user{0}:Pe-8 in flight at 100.0 200.99",
+    "[8:49:32 PM] user{0}:Pe-8 damaged by user1:Bf-109G-6_Late at 1.0 2.0",
+    "[8:49:39 PM] 3do/Buildings/Finland/CenterHouse1_w/live.sim destroyed "
+    "by user{0}:Pe-8 at 100.0 200.99",
+    "[8:49:32 PM] user{0}:Pe-8 shot down by user1:Bf-109G-6_Late at 1.0 2.0",
+    "[9:31:20 PM] user{0}:Pe-8(0) bailed out at 100.0 200.99",
+    "[8:49:32 PM] user{0}:Pe-8 landed at 100.0 200.99",
+    "[8:49:20 PM] user{0} entered refly menu",
+)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m minic.benchmarks',
+        description="Benchmark commander's hot paths using fake game server.")
+    parser.add_argument('--missions', type=int, default=300,
+                        help="number of missions in rotation list")
+    parser.add_argument('--rotations', type=int, default=30,
+                        help="number of mission load/begin/destroy cycles")
+    parser.add_argument('--log-lines', type=int, default=100000,
+                        help="number of events log lines to parse")
+    parser.add_argument('--chat-lines', type=int, default=10000,
+                        help="number of chat lines sent by server")
+    parser.add_argument('--lookups', type=int, default=100000,
+                        help="number of missions lookups")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed for random data")
+    parser.add_argument('-o', '--output',
+                        help="path to JSON file to save results to")
+    parser.add_argument('-c', '--compare',
+                        help="path to JSON file with results to compare with")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown treated as regression")
+    return parser.parse_args(args)
+
+
+def make_log_lines(count):
+    return [
+        EVENT_LOG_SAMPLES[i % len(EVENT_LOG_SAMPLES)].format(i % 128)
+        for i in xrange(count)
+    ]
+
+
+def batches(total, size):
+    while total > 0:
+        yield min(total, size)
+        total -= size
+
+
+@defer.inlineCallbacks
+def run(options, recorder):
+    from minic.models import Mission, MissionManager
+    from minic.service import RootService
+    from minic.settings import user_settings
+
+    root = tempfile.mkdtemp(prefix='minic-benchmark-')
+    server = FakeServer(root)
+    server.start()
+
+    # Never touch real user settings
+    user_settings.root = root
+    user_settings.server_path = server.executable_path
+    MissionManager.update([
+        Mission(i, "Mission {0}".format(i), "bench/{0}.mis".format(i), 60)
+        for i in xrange(1, options.missions + 1)
+    ])
+    MissionManager.set_current_id(1)
+
+    service = RootService()
+    connected = defer.Deferred()
+    service.set_callbacks(on_connection_done=connected.callback,
+                          on_connection_failed=connected.errback)
+    missions = service.commander.services.missions
+
+    try:
+        # Connection -----------------------------------------------------------
+        start = time.time()
+        service.startService()
+        yield connected
+        recorder.add('connect', time.time() - start)
+
+        # Missions flow --------------------------------------------------------
+        for i in xrange(options.rotations):
+            index = i % MissionManager.count()
+            MissionManager.set_current_id(MissionManager.get_id_by_index(index))
+
+            start = time.time()
+            yield missions.mission_run()
+            recorder.add('mission_run', time.time() - start)
+
+            start = time.time()
+            yield missions.mission_stop()
+            recorder.add('mission_stop', time.time() - start)
+
+        # Pipelined replacement of playing mission -----------------------------
+        yield missions.mission_run()
+        for i in xrange(options.rotations):
+            mission_id = MissionManager.get_id_by_index(
+                (i + 1) % MissionManager.count())
+            MissionManager.set_current_id(mission_id)
+
+            start = time.time()
+            yield missions.mission_replace(MissionManager.get(mission_id))
+            recorder.add('mission_replace', time.time() - start)
+        yield missions.mission_stop()
+
+        # Events log -----------------------------------------------------------
+        yield missions.mission_run()
+        log_watcher = missions.log_watcher
+        lines = make_log_lines(options.log_lines)
+
+        parse_line = service.commander.parsers.log.parse_line
+        for size in batches(len(lines), 1000):
+            start = time.time()
+            for line in lines[:size]:
+                parse_line(line)
+            recorder.add('log_parser', time.time() - start, size)
+
+        for size in batches(len(lines), 10000):
+            server.enlog_lines(lines[:size])
+            log_size = os.path.getsize(server.log_path)
+            start = time.time()
+            while log_watcher.log_file.tell() < log_size:
+                log_watcher.do_watch()
+            recorder.add('log_watching', time.time() - start, size)
+
+        yield missions.mission_stop()
+
+        # Chat traffic ---------------------------------------------------------
+        for size in batches(options.chat_lines, 1000):
+            start = time.time()
+            server.chat_lines(size)
+            yield service.cl_client.mission_status()
+            recorder.add('chat_burst', time.time() - start, size)
+
+        # Missions lookups -----------------------------------------------------
+        rnd = random.Random(options.seed)
+        count = MissionManager.count()
+        for size in batches(options.lookups, 1000):
+            ids = [rnd.randint(1, count) for i in xrange(size)]
+            start = time.time()
+            for mission_id in ids:
+                MissionManager.set_current_id(mission_id)
+                MissionManager.get_current_mission()
+                index = MissionManager.get_index_by_id(mission_id)
+                MissionManager.get_id_by_index((index + 1) % count)
+            recorder.add('missions_lookup', time.time() - start, size)
+    finally:
+        yield service.stopService()
+        yield server.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def print_results(results, stream=sys.stdout):
+    header = "{0:<18}{1:>7}{2:>12}{3:>12}{4:>12}{5:>14}".format(
+             "name", "count", "p50, ms", "p90, ms", "p99, ms", "units/s")
+    stream.write(header + '\n' + '-' * len(header) + '\n')
+    for name in sorted(results):
+        r = results[name]
+        stream.write("{0:<18}{1:>7}{2:>12.3f}{3:>12.3f}{4:>12.3f}{5:>14.1f}\n"
+                     .format(name, r['count'], r['p50'] * 1000,
+                             r['p90'] * 1000, r['p99'] * 1000,
+                             r['throughput'] or 0))
+
+
+def print_comparison(rows, stream=sys.stdout):
+    stream.write("\nComparison by p90:\n")
+    for name, old, new, ratio, is_regression in rows:
+        stream.write("{0:<18}{1:>12.3f}{2:>12.3f}{3:>9}{4}\n".format(
+                     name, old * 1000, new * 1000,
+                     "x{0:.2f}".format(ratio) if ratio is not None else "-",
+                     "  REGRESSION" if is_regression else ""))
+
+
+def main(args=None):
+    from twisted.internet import reactor
+
+    options = parse_args(args)
+    recorder = Recorder()
+    status = {'code': 0}
+
+    def on_done(unused):
+        results = recorder.results()
+        print_results(results)
+
+        params = dict(vars(options))
+        for key in ('output', 'compare', 'tolerance'):
+            params.pop(key)
+        report = make_report(results, params)
+
+        if options.output:
+            save_report(report, options.output)
+        if options.compare:
+            baseline = load_report(options.compare)
+            if baseline['params'] != params:
+                sys.stdout.write("\nWarning: parameters of runs differ.\n")
+            rows = compare(results, baseline['results'], options.tolerance)
+            print_comparison(rows)
+            if any(row[-1] for row in rows):
+                status['code'] = 1
+
+    def on_error(failure):
+        sys.stderr.write("Benchmark failed: {0}\n".format(
+                         failure.getTraceback()))
+        status['code'] = 2
+
+    def start():
+        run(options, recorder).addCallbacks(on_done, on_error).addBoth(
+            lambda unused: reactor.stop())
+
+    reactor.callWhenRunning(start)
+    reactor.run()
+    return status['code']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+Replay of recorded sessions: archived events log and, optionally, console
+transcript are fed through commander's parsers and services as fast as
+possible or at a chosen multiple of real time. Run it with::
+
+    python -m minic.benchmarks.replay eventlog.lst
+    python -m minic.benchmarks.replay eventlog.lst --console console.log \
+                                      --speed 60
+
+Time of services runs on a virtual clock driven by timestamps of lines, so
+timers, countdowns and periodic flushes behave as they did during the
+session, only faster. Console transcript is expected to be written by server
+with ``LOGTIME`` option on, i.e. every line starts with a timestamp.
+"""
+import argparse
+import heapq
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from il2ds_middleware.constants import MISSION_STATUS
+
+from twisted.internet import defer, task
+
+from minic.models import Mission
+
+
+#: Timestamp of events log and console lines, e.g. "[8:49:32 PM]" or
+#: "[Sep 15, 2013 8:46:46 PM]"
+RX_TIMESTAMP = re.compile(
+    r"^\[(?:\w+ \d+, \d+ )?(\d+):(\d+):(\d+) ([AP]M)\]\s?")
+
+#: Duration of missions played during replay in minutes
+DEFAULT_MISSION_DURATION = 60
+
+_HALF_DAY = 12 * 3600
+
+
+def read_timed_lines(lines):
+    """
+    Get time of lines from their timestamps. Lines without timestamps get
+    time of previous ones. Time grows across midnight.
+
+    Input:
+    `lines`     # an iterable of strings.
+
+    Output:
+    A generator of `(seconds, line, body)` tuples, where `body` is line
+    without timestamp.
+    """
+    days, last = 0, None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        m = RX_TIMESTAMP.match(line)
+        if m is None:
+            yield ((last or 0) + days * 86400, line, line)
+            continue
+
+        hours, minutes, seconds, half = m.groups()
+        value = ((int(hours) % 12 + (12 if half == 'PM' else 0)) * 3600
+                 + int(minutes) * 60 + int(seconds))
+        if last is not None and value < last - _HALF_DAY:
+            days += 1
+        last = value
+        yield (value + days * 86400, line, line[m.end():])
+
+
+class ReplayConsoleClient(object):
+    """
+    Console client which takes place of connection with server during
+    replay. Server's output comes from recordings, so requests are only
+    recorded and answered right away. Mission status is the one seen in
+    recordings most recently.
+    """
+    pending = 0
+
+    def __init__(self):
+        self.requests = []
+        self.status = (MISSION_STATUS.NOT_LOADED, None)
+
+    def chat_all(self, message):
+        self.requests.append(('chat_all', message))
+
+    def send_request(self, line, timeout=None):
+        self.requests.append(('send_request', line))
+        return defer.succeed([])
+
+    def users_common_info(self, timeout=None):
+        self.requests.append(('users_common_info', ))
+        return defer.succeed({})
+
+    def mission_status(self, timeout=None):
+        return defer.succeed(self.status)
+
+    def mission_load(self, mission, timeout=None):
+        self.requests.append(('mission_load', mission))
+        return defer.succeed(self.status)
+
+    def mission_destroy(self, timeout=None):
+        self.requests.append(('mission_destroy', ))
+        return defer.succeed(self.status)
+
+
+class Replay(object):
+    """
+    Drives a commander which is connected to no server with recorded lines.
+    Missions which are seen playing in recordings are added to missions list
+    of replay, so commander's missions flow follows the recorded one.
+    """
+    #: Multiple of real time to replay at. Lines are fed as fast as possible
+    #: if not set
+    speed = None
+    mission_duration = DEFAULT_MISSION_DURATION
+    #: Reactor-like object to wait with when `speed` is set. Reactor is used
+    #: if not set
+    wall_clock = None
+
+    def __init__(self, settings_path=None, name='replay'):
+        """
+        Input:
+        `settings_path`     # path to user settings file of a server, so
+                            # missions list and rules of rotation are taken
+                            # from it. Settings file is never changed.
+        `name`              # name of server in logs and metrics.
+        """
+        from minic.service import RootService
+        from minic.settings import UserSettings
+
+        self.root = tempfile.mkdtemp(prefix='minic-replay-')
+        self.settings = UserSettings(self.root)
+        if settings_path is not None:
+            shutil.copyfile(settings_path, self.settings.file_path)
+            self.settings.load()
+        #: Virtual clock of services
+        self.clock = self.settings.clock = task.Clock()
+        self.time = None
+        self.lines_count = 0
+
+        self.client = ReplayConsoleClient()
+        self.service = RootService(self.settings, name, self.clock)
+        self.commander = self.service.commander
+
+    def _get_wall_clock(self):
+        if self.wall_clock is None:
+            from twisted.internet import reactor
+            return reactor
+        return self.wall_clock
+
+    def start(self):
+        self.service.cl_client = self.client
+        return self.commander.startService()
+
+    @defer.inlineCallbacks
+    def stop(self):
+        try:
+            if self.commander.running:
+                yield self.commander.stopService()
+            yield self.commander.services.stats.store.close()
+        finally:
+            self.service.cl_client = None
+            self.service.unregister_metrics()
+            self.settings.flush()
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def run(self, log_lines, console_lines=None):
+        """
+        Feed lines of events log and of console transcript in order of their
+        time. Virtual clock is advanced to time of each line before line is
+        parsed.
+
+        Output:
+        Deferred which fires with results of `get_results`.
+        """
+        # Console lines go before log lines of the same second, as server
+        # reports mission status to console before writing to events log
+        sources = [
+            ((seconds, 1, i, self.feed_log_line, line)
+             for i, (seconds, line, body) in enumerate(
+                 read_timed_lines(log_lines))),
+        ]
+        if console_lines is not None:
+            sources.append(
+                (seconds, 0, i, self.feed_console_line, body)
+                for i, (seconds, line, body) in enumerate(
+                    read_timed_lines(console_lines)))
+
+        started = time.time()
+        events = heapq.merge(*sources)
+        if self.speed:
+            d = self._paced(events)
+        else:
+            d = defer.maybeDeferred(self._feed, events)
+        return d.addCallback(lambda unused: self.get_results(
+                             time.time() - started))
+
+    def _feed(self, events):
+        for seconds, unused, unused, feed, line in events:
+            self._advance(seconds)
+            feed(line)
+
+    @defer.inlineCallbacks
+    def _paced(self, events):
+        for seconds, unused, unused, feed, line in events:
+            if self.time is not None and seconds > self.time:
+                yield task.deferLater(self._get_wall_clock(),
+                                      (seconds - self.time) / self.speed,
+                                      lambda: None)
+            self._advance(seconds)
+            feed(line)
+
+    def _advance(self, seconds):
+        if self.time is not None and seconds > self.time:
+            self.clock.advance(seconds - self.time)
+        if self.time is None or seconds > self.time:
+            self.time = seconds
+
+    def feed_log_line(self, line):
+        """
+        Parse events log line. Lines about status of mission are passed to
+        missions service as if they came from console.
+        """
+        self.lines_count += 1
+        if self.commander.parsers.log.parse_line(line) is not None:
+            return
+        m = RX_TIMESTAMP.match(line)
+        body = line[m.end():] if m else line
+        if body == "Mission END":
+            self._set_status("Mission NOT loaded")
+        elif body.startswith("Mission:"):
+            self._set_status(body)
+
+    def feed_console_line(self, line):
+        """
+        Parse line of console output without timestamp.
+        """
+        self.lines_count += 1
+        if line.startswith("Mission"):
+            self._set_status(line)
+        else:
+            self.commander.parsers.console.parse_line(line)
+
+    def _set_status(self, line):
+        parser = self.commander.parsers.console
+        missions = self.commander.services.missions
+        if line.endswith("is Playing") or line.endswith("is Loaded"):
+            path = line.split()[1]
+            if line.endswith("is Playing"):
+                self.client.status = (MISSION_STATUS.PLAYING, path)
+                if missions.status != MISSION_STATUS.PLAYING:
+                    missions.current_mission = self._get_mission(path)
+            else:
+                self.client.status = (MISSION_STATUS.LOADED, path)
+        elif line == "Mission NOT loaded":
+            self.client.status = (MISSION_STATUS.NOT_LOADED, None)
+        parser.parse_line(line)
+
+    def _get_mission(self, path):
+        """
+        Get mission with given path from missions list, adding it if needed.
+        """
+        missions = self.service.mission_manager
+        prefix = missions.dogfight_subpath.lower() + os.path.sep
+        relative_path = path.replace('/', os.path.sep)
+        if relative_path.lower().startswith(prefix):
+            relative_path = relative_path[len(prefix):]
+        for mission in missions.all():
+            if mission.relative_path == relative_path:
+                break
+        else:
+            mission = Mission(
+                id=missions.generate_id(),
+                name=os.path.splitext(os.path.basename(path))[0],
+                relative_path=relative_path,
+                duration=self.mission_duration)
+            missions.update(list(missions.all()) + [mission, ])
+        missions.set_current_id(mission.id)
+        return mission
+
+    def get_results(self, elapsed=None):
+        """
+        Get counters of replay.
+
+        Output:
+        A dict with numbers of fed lines and recognized events, time covered
+        by recordings in seconds and wall time spent, pilots online at the
+        end and number of requests commander has made to console.
+        """
+        parser = self.commander.parsers.log
+        return {
+            'lines': self.lines_count,
+            'events': sum(parser.events_count.values()),
+            'virtual_time': self.clock.seconds(),
+            'elapsed': elapsed,
+            'pilots': self.commander.services.pilots.count,
+            'requests': len(self.client.requests),
+        }
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m minic.benchmarks.replay',
+        description="Replay recorded events log through commander.")
+    parser.add_argument('log', help="path to events log file")
+    parser.add_argument('--console',
+                        help="path to console transcript with timestamps")
+    parser.add_argument('--settings',
+                        help="user settings file of server to take missions "
+                             "list from (it is never changed)")
+    parser.add_argument('--speed', type=float,
+                        help="multiple of real time to replay at (default: "
+                             "as fast as possible)")
+    parser.add_argument('-o', '--output',
+                        help="path to JSON file to save results to")
+    return parser.parse_args(args)
+
+
+def print_results(results, stream=sys.stdout):
+    elapsed = results['elapsed']
+    stream.write(
+        "lines: {0}\nevents: {1}\nvirtual time: {2:.0f} s\n"
+        "elapsed: {3:.3f} s\nlines/s: {4:.1f}\nspeedup: x{5:.1f}\n"
+        "pilots online: {6}\nconsole requests: {7}\n".format(
+            results['lines'], results['events'], results['virtual_time'],
+            elapsed, results['lines'] / elapsed if elapsed else 0,
+            results['virtual_time'] / elapsed if elapsed else 0,
+            results['pilots'], results['requests']))
+
+
+def main(args=None):
+    from twisted.internet import reactor
+
+    from minic.benchmarks import Recorder, make_report, save_report
+
+    options = parse_args(args)
+    status = {'code': 0}
+
+    @defer.inlineCallbacks
+    def run():
+        replay = Replay(options.settings)
+        replay.speed = options.speed
+        yield replay.start()
+        try:
+            with open(options.log, 'rb') as log_file:
+                console_file = (open(options.console, 'rb')
+                                if options.console else None)
+                try:
+                    results = yield replay.run(log_file, console_file)
+                finally:
+                    if console_file is not None:
+                        console_file.close()
+        finally:
+            yield replay.stop()
+
+        print_results(results)
+        if options.output:
+            recorder = Recorder()
+            recorder.add('replay', results['elapsed'], results['lines'])
+            save_report(make_report(recorder.results(), {
+                'log': os.path.basename(options.log),
+                'console': options.console and os.path.basename(
+                    options.console),
+                'speed': options.speed,
+            }), options.output)
+
+    def on_error(failure):
+        sys.stderr.write("Replay failed: {0}\n".format(
+                         failure.getTraceback()))
+        status['code'] = 2
+
+    def start():
+        run().addErrback(on_error).addBoth(lambda unused: reactor.stop())
+
+    reactor.callWhenRunning(start)
+    reactor.run()
+    return status['code']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for IL-2 FB Dedicated Server: console over TCP, DeviceLink over UDP
+and events log file. Built on top of DS emulator from `il2ds_middleware`.
+"""
+import os
+
+from il2ds_middleware.ds_emulator.protocol import (
+    ConsoleServerFactory, DeviceLinkServerProtocol,
+)
+from il2ds_middleware.ds_emulator.service import RootService
+
+from twisted.internet import defer
+
+
+CONFIG_TEMPLATE = """\
+[NET]
+localHost={host}
+serverName=Benchmark
+serverDescription=Fake server for benchmarks
+serverChannels=128
+
+[Console]
+IP={cl_port}
+
+[DeviceLink]
+host={host}
+port={dl_port}
+
+[game]
+eventlog={log_name}
+"""
+
+
+class FakeServer(object):
+    """
+    Fake game server placed into given directory. Creates server's config and
+    a fake executable there, so minic can be pointed to it.
+    """
+    host = '127.0.0.1'
+    executable_name = 'il2server.exe'
+    log_name = 'eventlog.lst'
+
+    def __init__(self, root):
+        self.root = root
+        self.service = RootService(self.log_path)
+        self.console_factory = None
+        self.console_listener = None
+        self.dl_listener = None
+
+    @property
+    def executable_path(self):
+        return os.path.join(self.root, self.executable_name)
+
+    @property
+    def log_path(self):
+        return os.path.join(self.root, self.log_name)
+
+    @property
+    def pilots(self):
+        return self.service.getServiceNamed('pilots')
+
+    def start(self):
+        from twisted.internet import reactor
+
+        self.service.startService()
+
+        self._listen_console()
+
+        dl_server = DeviceLinkServerProtocol()
+        dl_server.service = self.service.getServiceNamed('dl')
+        self.dl_listener = reactor.listenUDP(0, dl_server,
+                                             interface=self.host)
+        self._write_config()
+        open(self.executable_path, 'w').close()
+
+    def _listen_console(self):
+        from twisted.internet import reactor
+
+        self.console_factory = ConsoleServerFactory()
+        self.console_factory.on_connected.addCallback(self._on_connected)
+        self.console_listener = reactor.listenTCP(
+            0, self.console_factory, interface=self.host)
+
+    def _on_connected(self, client):
+        client.service = self.service
+        self.service.client = client
+
+    def _write_config(self):
+        with open(os.path.join(self.root, 'confs.ini'), 'w') as f:
+            f.write(CONFIG_TEMPLATE.format(
+                host=self.host,
+                cl_port=self.console_listener.getHost().port,
+                dl_port=self.dl_listener.getHost().port,
+                log_name=self.log_name))
+
+    @defer.inlineCallbacks
+    def stop(self):
+        if self.service.client is not None:
+            self.service.client.transport.loseConnection()
+            self.service.client = None
+        yield defer.maybeDeferred(self.console_listener.stopListening)
+        yield defer.maybeDeferred(self.dl_listener.stopListening)
+        yield self.service.stopService()
+
+    def enlog_lines(self, lines):
+        """
+        Append raw lines to events log as server does while mission is
+        playing.
+        """
+        with open(self.log_path, 'ab') as f:
+            for line in lines:
+                f.write(line)
+                f.write('\n')
+
+    def chat_lines(self, count):
+        """
+        Send chat messages from pilots to console client.
+        """
+        for i in xrange(count):
+            self.service.send("Chat: user{0}: \\tmessage #{1}".format(
+                              i % 32, i))
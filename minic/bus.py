@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+In-process event bus which lets any number of subscribers follow state of
+services.
+"""
+import tx_logging
+
+from minic.constants import DELIVERY
+from minic.metrics import ServerMetric
+from minic.util import ClockMixin
+
+
+LOG = tx_logging.getLogger(__name__)
+
+
+class Subscription(object):
+    """
+    Subscription to a topic of event bus. Keeps event which waits to be
+    delivered.
+    """
+
+    def __init__(self, topic, callback, policy, rate=None):
+        self.topic = topic
+        self.callback = callback
+        self.policy = policy
+        self.rate = rate
+        self.active = True
+        self.value = None
+        self.call = None
+        self.delivered_at = None
+
+
+class EventBus(ClockMixin):
+    """
+    Delivers events published by services to subscribers of their topics.
+    Every subscriber chooses its own delivery policy (see `DELIVERY`), so
+    slow consumers (e.g. GUI) can skip intermediate states while others
+    (e.g. loggers) see every event. Errors of subscribers are logged and do
+    not reach publishers.
+    """
+    #: Labels of metrics, e.g. name of server
+    metric_labels = None
+
+    event_count = ServerMetric(
+        'counter', 'minic_bus_events_total',
+        "Number of events published to event bus")
+    coalesced_count = ServerMetric(
+        'counter', 'minic_bus_coalesced_total',
+        "Number of events replaced by newer ones before delivery")
+    delivery_failure_count = ServerMetric(
+        'counter', 'minic_bus_delivery_failures_total',
+        "Number of events subscribers failed to process")
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._demand_callbacks = {}
+
+    def subscribe(self, topic, callback, policy=DELIVERY.EVERY, rate=None):
+        """
+        Call given function with value of every event of given topic, as
+        delivery policy allows.
+
+        Input:
+        `topic`     # one of `BUS_TOPIC` values.
+        `callback`  # a callable which accepts value of event.
+        `policy`    # one of `DELIVERY` values.
+        `rate`      # max number of deliveries per second for throttled
+                    # delivery.
+
+        Output:
+        `Subscription` instance to unsubscribe with.
+        """
+        if policy not in (DELIVERY.EVERY, DELIVERY.LATEST,
+                          DELIVERY.THROTTLED):
+            raise ValueError("Unknown delivery policy: {0}".format(policy))
+        if policy == DELIVERY.THROTTLED and not rate > 0:
+            raise ValueError("Rate of throttled delivery must be positive")
+
+        subscription = Subscription(topic, callback, policy, rate)
+        subscriptions = self._subscriptions.setdefault(topic, [])
+        subscriptions.append(subscription)
+        if len(subscriptions) == 1:
+            self._notify_demand(topic, True)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop delivering events to subscriber. Event which waits to be
+        delivered is dropped.
+        """
+        subscriptions = self._subscriptions.get(subscription.topic, [])
+        if subscription not in subscriptions:
+            return
+        subscriptions.remove(subscription)
+        subscription.active = False
+        if subscription.call is not None and subscription.call.active():
+            subscription.call.cancel()
+        subscription.call = None
+
+        if not subscriptions:
+            del self._subscriptions[subscription.topic]
+            self._notify_demand(subscription.topic, False)
+
+    def has_subscribers(self, topic):
+        return topic in self._subscriptions
+
+    def set_demand_callback(self, topic, callback):
+        """
+        Call given function with `True` when topic gets its first subscriber
+        and with `False` when it loses the last one, so publisher produces
+        events only while somebody needs them. Function is called with
+        current state right away. Pass `None` to remove callback.
+        """
+        if callback is None:
+            self._demand_callbacks.pop(topic, None)
+        else:
+            self._demand_callbacks[topic] = callback
+            callback(self.has_subscribers(topic))
+
+    def _notify_demand(self, topic, has_subscribers):
+        callback = self._demand_callbacks.get(topic)
+        if callback is not None:
+            callback(has_subscribers)
+
+    def publish(self, topic, value=None):
+        subscriptions = self._subscriptions.get(topic)
+        if not subscriptions:
+            return
+        self.event_count.inc()
+        for subscription in list(subscriptions):
+            if subscription.policy == DELIVERY.EVERY:
+                self._deliver(subscription, value)
+            else:
+                self._postpone(subscription, value)
+
+    def _postpone(self, subscription, value):
+        subscription.value = value
+        if subscription.call is not None:
+            self.coalesced_count.inc()
+            return
+
+        clock = self._get_clock()
+        delay = 0
+        if (
+            subscription.policy == DELIVERY.THROTTLED
+            and subscription.delivered_at is not None
+        ):
+            delay = max(subscription.delivered_at + 1.0 / subscription.rate
+                        - clock.seconds(), 0)
+        subscription.call = clock.callLater(delay, self._flush, subscription)
+
+    def _flush(self, subscription):
+        subscription.call = None
+        subscription.delivered_at = self._get_clock().seconds()
+        value, subscription.value = subscription.value, None
+        self._deliver(subscription, value)
+
+    def _deliver(self, subscription, value):
+        if not subscription.active:
+            return
+        try:
+            subscription.callback(value)
+        except Exception as e:
+            self.delivery_failure_count.inc()
+            LOG.error(u"Failed to deliver '{0}' event: {1}".format(
+                      subscription.topic, unicode(e)))
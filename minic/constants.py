@@ -30,3 +30,96 @@ MISSION_STATUS_INFO = {
         'color_hex': '009944',
     },
 }
+
+
+class CHAT_PRIORITY:
+    """
+    Priorities of chat messages. Messages with lower values are sent first.
+    """
+    #: Announcements of mission status
+    STATUS = 0
+    #: Other messages, e.g. greetings
+    INFO = 1
+
+
+class MISSION_FILE_STATE:
+    """
+    States of mission files known to index of missions.
+    """
+    #: Directory of file was not indexed yet
+    UNKNOWN = 0
+    #: File exists and is valid
+    OK = 1
+    #: File is invalid
+    INVALID = 2
+    #: File does not exist
+    MISSING = 3
+
+
+class EVENT_KIND:
+    """
+    Kinds of events kept in statistics.
+    """
+    TOOK_OFF = 1
+    LANDED = 2
+    CRASHED = 3
+    #: Pilot was shot down by other pilot, by static object or by himself
+    SHOT_DOWN = 4
+    #: Crew member was killed by other pilot
+    KILLED = 5
+    BAILED_OUT = 6
+    #: Building, bridge or static object was destroyed by pilot
+    DESTROYED = 7
+
+    #: Names of kinds used in statistics
+    NAMES = {
+        TOOK_OFF: 'took_off',
+        LANDED: 'landed',
+        CRASHED: 'crashed',
+        SHOT_DOWN: 'shot_down',
+        KILLED: 'killed',
+        BAILED_OUT: 'bailed_out',
+        DESTROYED: 'destroyed',
+    }
+
+
+class BUS_TOPIC:
+    """
+    Topics of events published to event bus of server.
+    """
+    #: State of connection with server's console, one of `CONNECTION_STATE`
+    #: values
+    CONNECTION = 'connection'
+    #: New status of mission, one of `MISSION_STATUS` values
+    MISSION_STATUS = 'mission_status'
+    #: Seconds left until the end of playing mission, published every second
+    #: while there are subscribers
+    MISSION_TIME_LEFT = 'mission_time_left'
+    #: New number of pilots on server
+    PILOTS = 'pilots'
+    #: New `RadarSnapshot` of positions
+    RADAR = 'radar'
+
+
+class CONNECTION_STATE:
+    """
+    States of connection with server's console.
+    """
+    CONNECTED = 'connected'
+    #: Connection was closed by commander
+    CLOSED = 'closed'
+    #: Connection was lost unexpectedly and will be reestablished
+    LOST = 'lost'
+
+
+class DELIVERY:
+    """
+    Policies of delivering events of event bus to subscribers.
+    """
+    #: Every event is delivered right when it is published
+    EVERY = 'every'
+    #: Only the latest of events published during one reactor iteration is
+    #: delivered, when publisher is done
+    LATEST = 'latest'
+    #: Only the latest event is delivered, at most `rate` times per second
+    THROTTLED = 'throttled'
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Headless commander: runs root service on the default reactor without any GUI
+and accepts simple text commands on a local TCP port. Run it with::
+
+    python -m minic.daemon
+
+and control it, e.g., with ``telnet 127.0.0.1 20100``. Type ``help`` to see
+available commands.
+
+A single process can manage several servers. Give each server its own user
+settings file (e.g. a copy of ``minic.conf`` with server's path and missions)::
+
+    python -m minic.daemon --server ~/servers/first.conf \
+                           --server ~/servers/second.conf
+
+Servers are named after their settings files.
+
+Everything except profiler is imported inside `main`, so startup profile
+covers all imports.
+"""
+import argparse
+import os
+import sys
+
+from minic import profiling
+
+
+#: Default port of local control interface
+DEFAULT_CONTROL_PORT = 20100
+#: Control interface is local only by default
+DEFAULT_CONTROL_INTERFACE = '127.0.0.1'
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m minic.daemon',
+        description="Run commander without GUI.")
+    parser.add_argument('--control-port', type=int,
+                        help="port of local control interface, 0 disables it "
+                             "(default: {0})".format(DEFAULT_CONTROL_PORT))
+    parser.add_argument('--control-interface',
+                        default=DEFAULT_CONTROL_INTERFACE,
+                        help="interface of control interface to listen on")
+    parser.add_argument('--no-autorun', action='store_true',
+                        help="do not run current mission after connecting")
+    parser.add_argument('--server', dest='servers', action='append',
+                        default=[], metavar='SETTINGS',
+                        help="user settings file of a server to manage, can "
+                             "be given several times (default: manage the "
+                             "server from global user settings)")
+    parser.add_argument(profiling.PROFILE_STARTUP_OPTION, action='store_true',
+                        help="report import times and time to connection")
+    return parser.parse_args(args)
+
+
+def load_servers(paths):
+    """
+    Create root services for servers with given user settings files.
+
+    Output:
+    A list of root services.
+    """
+    from minic.service import RootService
+    from minic.settings import UserSettings
+
+    services = []
+    for path in paths:
+        path = os.path.abspath(os.path.expanduser(path))
+        if not os.path.isfile(path):
+            raise ValueError("Server settings file is not found: {0}".format(
+                             path))
+
+        file_name = os.path.basename(path)
+        name = os.path.splitext(file_name)[0]
+        if name in [x.name for x in services]:
+            raise ValueError("Server name is not unique: {0}".format(name))
+
+        settings = UserSettings(os.path.dirname(path), file_name)
+        settings.load()
+        services.append(RootService(settings, name))
+    return services
+
+
+def main(args=None):
+    options = parse_args(args)
+    if options.profile_startup:
+        profiling.startup_profiler.install()
+
+    from twisted.internet import reactor
+
+    from minic.app import (
+        PidLock, check_dirs, setup_logging, start_metrics_service,
+    )
+    from minic.headless import ControlFactory, Daemon
+    from minic.settings import user_settings
+
+    profiling.mark("imports are done")
+
+    try:
+        check_dirs()
+        pid_lock = PidLock()
+    except Exception as e:
+        sys.stderr.write("{0}\n".format(e))
+        return 1
+
+    with pid_lock:
+        setup_logging()
+        user_settings.load()
+
+        if options.servers:
+            try:
+                services = load_servers(options.servers)
+            except Exception as e:
+                sys.stderr.write("{0}\n".format(e))
+                return 1
+        else:
+            from minic.service import get_root_service
+            services = [get_root_service(), ]
+
+        reactor.addSystemEventTrigger('before', 'shutdown',
+                                      user_settings.flush)
+
+        if user_settings.metrics_port:
+            start_metrics_service(user_settings.metrics_port)
+
+        daemons = [
+            Daemon(x, autorun=not options.no_autorun) for x in services
+        ]
+        for daemon in daemons:
+            reactor.addSystemEventTrigger('before', 'shutdown', daemon.stop)
+
+        control_port = options.control_port
+        if control_port is None:
+            control_port = user_settings.control_port or DEFAULT_CONTROL_PORT
+        if control_port:
+            reactor.listenTCP(control_port, ControlFactory(daemons),
+                              interface=options.control_interface)
+
+        reactor.addSystemEventTrigger('before', 'shutdown', profiling.report)
+        reactor.callWhenRunning(profiling.mark, "reactor is running")
+
+        def start():
+            results = [daemon.start() for daemon in daemons]
+            if not any(results):
+                reactor.stop()
+
+        reactor.callWhenRunning(start)
+        reactor.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
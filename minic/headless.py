@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Missions flow control without GUI: automatic missions running and simple text
+commands accepted on a local TCP port.
+"""
+import tx_logging
+
+from twisted.internet import defer
+from twisted.internet.protocol import Factory
+from twisted.protocols.basic import LineOnlyReceiver
+
+from minic.rotation import SCHEDULERS
+from minic.settings import ROTATION_SCHEDULER
+from minic.util import ugettext_lazy as _
+
+
+LOG = tx_logging.getLogger(__name__)
+
+
+class Daemon(object):
+    """
+    Drives missions flow of given root service without user interaction:
+    connects to server and runs current mission once connection is
+    established.
+    """
+
+    def __init__(self, service, autorun=True):
+        self.service = service
+        self.autorun = autorun
+        self._was_connected = False
+        service.set_callbacks(self.on_connection_done,
+                              self.on_connection_failed,
+                              self.on_connection_closed,
+                              self.on_connection_lost)
+
+    @property
+    def name(self):
+        return self.service.name or "default"
+
+    @property
+    def missions(self):
+        return self.service.commander.services.missions
+
+    @property
+    def mission_manager(self):
+        return self.service.mission_manager
+
+    def _log(self, method, message):
+        if self.service.name:
+            message = u"{0}: {1}".format(self.service.name, message)
+        method(message)
+
+    def start(self):
+        """
+        Start connecting to server.
+
+        Output:
+        `True` if connecting was started, `False` otherwise.
+        """
+        self._log(LOG.info, "Connecting to server...")
+        try:
+            self.service.startService()
+        except Exception as e:
+            self._log(LOG.error, u"Failed to start commander: {0}".format(
+                      unicode(e)))
+            return False
+        return True
+
+    def stop(self):
+        def errback(reason):
+            self._log(LOG.error, u"Failed to stop root service: {0}".format(
+                      unicode(reason.value)))
+        return self.service.stopService().addErrback(errback)
+
+    def on_connection_done(self, *args):
+        self._log(LOG.info, "Connection with server is established")
+        is_first = not self._was_connected
+        self._was_connected = True
+
+        # Missions service restores mission after reconnection by itself
+        if self.autorun and is_first and not self.missions.is_mission_playing:
+            self.run_mission()
+
+    def on_connection_failed(self, reason):
+        self._log(LOG.error, u"Failed to connect to server: {0}".format(
+                  unicode(reason.value)))
+
+    def on_connection_closed(self, *args):
+        self._log(LOG.info, "Connection with server is closed")
+
+    def on_connection_lost(self, reason):
+        self._log(LOG.error, u"Connection with server is lost: {0}".format(
+                  unicode(reason.value)))
+
+    def run_mission(self):
+        missions = self.mission_manager
+        if missions.get_current_mission() is None:
+            if not missions.count():
+                self._log(LOG.error, "Missions list is empty")
+                return defer.succeed(None)
+            missions.set_current_id(missions.get_id_by_index(0))
+        return self.missions.mission_run()
+
+    def select_mission(self, mission_id):
+        """
+        Make mission with given ID current one. Playing mission is replaced
+        with the new one as it is done by GUI.
+        """
+        missions = self.mission_manager
+        if missions.get_index_by_id(mission_id) == -1:
+            raise ValueError(_("Unknown mission: {0}").format(mission_id))
+
+        if mission_id != missions.get_current_id():
+            missions.set_current_id(mission_id)
+            if self.missions.is_mission_playing:
+                return self.missions.update_playing_mission()
+        return defer.succeed(None)
+
+    def shift_mission(self, delta):
+        missions = self.mission_manager
+        count = missions.count()
+        if not count:
+            raise ValueError(_("Missions list is empty"))
+        index = missions.get_index_by_id(missions.get_current_id())
+        index = (max(index, 0) + delta) % count
+        return self.select_mission(missions.get_id_by_index(index))
+
+
+class ControlProtocol(LineOnlyReceiver):
+    """
+    Line-based control interface. Every reply ends with ``OK`` or
+    ``ERROR <message>`` line. Commands are executed one by one, so replies
+    come in the same order as commands. Commands are applied to the first
+    server until other one is selected.
+    """
+    delimiter = '\n'
+    closing = False
+
+    def connectionMade(self):
+        self._queue = defer.succeed(None)
+        self.daemon = self.factory.daemons[0]
+
+    def lineReceived(self, line):
+        line = line.strip()
+        if line:
+            self._queue.addCallback(lambda unused: self.execute(line))
+
+    def execute(self, line):
+        parts = line.split()
+        name, args = parts[0].lower(), parts[1:]
+        method = getattr(self, 'do_' + name, None)
+        if method is None:
+            self.send_error(_("Unknown command: {0}").format(name))
+            return
+
+        d = defer.maybeDeferred(method, *args)
+        return d.addCallbacks(self.send_ok, self.send_failure)
+
+    def send_line(self, line):
+        self.sendLine(unicode(line).encode('utf-8'))
+
+    def send_ok(self, unused=None):
+        self.sendLine('OK')
+        if self.closing:
+            self.transport.loseConnection()
+
+    def send_error(self, message):
+        self.send_line(u"ERROR {0}".format(message))
+
+    def send_failure(self, failure):
+        self.send_error(failure.getErrorMessage())
+
+    def do_help(self):
+        """
+        Show this help.
+        """
+        for name in sorted(dir(self)):
+            if name.startswith('do_'):
+                doc = getattr(self, name).__doc__.strip()
+                self.send_line(u"{0:<10}{1}".format(name[3:], doc))
+
+    def do_status(self):
+        """
+        Show connection and mission status.
+        """
+        missions = self.daemon.missions
+        mission = self.daemon.mission_manager.get_current_mission()
+        self.send_line(u"server: {0}".format(self.daemon.name))
+        self.send_line(u"connected: {0}".format(
+                       "yes" if self.daemon.service.is_connected else "no"))
+        self.send_line(u"mission: {0}".format(
+                       u"{0} {1}".format(mission.id, mission.name)
+                       if mission else "-"))
+        self.send_line(u"pilots: {0} ({1} in flight)".format(
+                       self.daemon.service.pilots_count,
+                       self.daemon.service.pilots_in_flight_count))
+        self.send_line(u"status: {0}".format(missions.status.name))
+        self.send_line(u"time left: {0}".format(missions.time_left_str))
+
+    def do_missions(self):
+        """
+        List missions. Current mission is marked with '*'.
+        """
+        current_id = self.daemon.mission_manager.get_current_id()
+        for m in self.daemon.mission_manager.all():
+            self.send_line(u"{0} {1:>4} {2} ({3} min) {4}".format(
+                           '*' if m.id == current_id else ' ',
+                           m.id, m.name, m.duration, m.relative_path))
+
+    def do_check(self):
+        """
+        Check mission files and list invalid missions.
+        """
+        def on_checked(results):
+            for mission, error in results:
+                self.send_line(u"{0:>4} {1}: {2}".format(
+                               mission.id, mission.name, error))
+
+        return self.daemon.missions.index_missions().addCallback(on_checked)
+
+    def do_rotation(self, name=None):
+        """
+        Show or set rotation policy: round_robin or weighted.
+        """
+        missions = self.daemon.mission_manager
+        if name is None:
+            self.send_line(missions.get_scheduler_name() or
+                           ROTATION_SCHEDULER)
+        elif name not in SCHEDULERS:
+            raise ValueError(_("Unknown rotation policy: {0}").format(name))
+        else:
+            missions.set_scheduler_name(name)
+
+    def do_radar(self):
+        """
+        Show positions of pilots as they were polled last time.
+        """
+        radar = self.daemon.service.commander.services.radar
+        snapshot = radar.snapshot
+        self.send_line(u"version: {0}, pilots: {1}, objects: {2}".format(
+                       snapshot.version, len(snapshot.pilots),
+                       len(snapshot.statics)))
+        self.send_line(u"age: {0}".format(
+                       "-" if radar.age is None
+                       else "{0:.1f} s".format(radar.age)))
+        self.send_line(u"refreshes: {0} requested, {1} saved".format(
+                       radar.refresh_requests, radar.refreshes_saved))
+        for pilot in snapshot.pilots:
+            pos = pilot['pos']
+            self.send_line(u"{0}: {1} {2} {3}".format(
+                           pilot['callsign'], pos['x'], pos['y'], pos['z']))
+
+    def do_near(self, x, y, radius='10000'):
+        """
+        List pilots and objects within radius (in meters) from point X Y.
+        """
+        try:
+            x, y, radius = float(x), float(y), float(radius)
+        except ValueError:
+            raise ValueError(_("Invalid coordinates: {0} {1} {2}").format(
+                             x, y, radius))
+
+        services = self.daemon.service.commander.services
+        for distance, callsign in services.pilots.get_pilots_near(
+                x, y, radius):
+            self.send_line(u"pilot {0}: {1:.0f} m".format(callsign, distance))
+        for distance, name in services.objects.get_objects_near(x, y, radius):
+            self.send_line(u"object {0}: {1:.0f} m".format(name, distance))
+
+    def do_stats(self):
+        """
+        Show statistics of pilots in current mission.
+        """
+        def on_stats(results):
+            for callsign in sorted(results):
+                counts = results[callsign]
+                self.send_line(u"{0}: {1}".format(callsign, ', '.join(
+                    u"{0} {1}".format(name, counts[name])
+                    for name in sorted(counts))))
+
+        stats = self.daemon.service.commander.services.stats
+        return stats.store.get_run_stats().addCallback(on_stats)
+
+    def do_servers(self):
+        """
+        List servers. Selected server is marked with '*'.
+        """
+        for daemon in self.factory.daemons:
+            self.send_line(u"{0} {1} ({2}, {3})".format(
+                           '*' if daemon is self.daemon else ' ',
+                           daemon.name,
+                           "connected" if daemon.service.is_connected
+                           else "not connected",
+                           daemon.missions.status.name))
+
+    def do_server(self, name):
+        """
+        Select server to apply commands to.
+        """
+        for daemon in self.factory.daemons:
+            if daemon.name == name:
+                self.daemon = daemon
+                return
+        raise ValueError(_("Unknown server: {0}").format(name))
+
+    def do_run(self):
+        """
+        Run current mission.
+        """
+        if not self.daemon.service.is_connected:
+            raise RuntimeError(_("Not connected to server"))
+        if self.daemon.missions.is_mission_playing:
+            raise RuntimeError(_("Mission is already playing"))
+        return self.daemon.run_mission()
+
+    def do_stop(self):
+        """
+        Stop playing mission.
+        """
+        if not self.daemon.missions.is_mission_playing:
+            raise RuntimeError(_("Mission is not playing"))
+        return self.daemon.missions.mission_stop()
+
+    def do_restart(self):
+        """
+        Restart playing mission.
+        """
+        if not self.daemon.missions.is_mission_playing:
+            raise RuntimeError(_("Mission is not playing"))
+        return self.daemon.missions.mission_restart()
+
+    def do_select(self, mission_id):
+        """
+        Make mission with given ID current one.
+        """
+        try:
+            mission_id = int(mission_id)
+        except ValueError:
+            raise ValueError(_("Invalid mission ID: {0}").format(mission_id))
+        return self.daemon.select_mission(mission_id)
+
+    def do_next(self):
+        """
+        Select next mission.
+        """
+        return self.daemon.shift_mission(1)
+
+    def do_prev(self):
+        """
+        Select previous mission.
+        """
+        return self.daemon.shift_mission(-1)
+
+    def do_quit(self):
+        """
+        Close this control connection.
+        """
+        self.closing = True
+
+    def do_shutdown(self):
+        """
+        Stop commander and quit.
+        """
+        from twisted.internet import reactor
+        reactor.callLater(0, reactor.stop)
+
+
+class ControlFactory(Factory):
+
+    protocol = ControlProtocol
+
+    def __init__(self, daemons):
+        """
+        Input:
+        `daemons`       # a list of daemons, one per server.
+        """
+        self.daemons = daemons
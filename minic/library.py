@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+"""
+Access to mission files.
+"""
+import json
+import os
+import tempfile
+import tx_logging
+
+from collections import namedtuple
+
+from twisted.internet import defer, task, threads
+
+from minic.constants import MISSION_FILE_STATE
+from minic.settings import (
+    SETTINGS_ROOT, MISSION_INDEX_PROCESSES, MISSION_INDEX_POOL_THRESHOLD,
+    MISSION_WATCH_DELAY, MISSION_WATCH_INTERVAL,
+)
+from minic.util import ClockMixin, ugettext_lazy as _, replace_file
+
+
+LOG = tx_logging.getLogger(__name__)
+
+MissionFile = namedtuple('MissionFile',
+                         field_names=['path', 'size', 'mtime', 'map_name'])
+MissionInfo = namedtuple('MissionInfo', field_names=[
+    'path', 'size', 'mtime', 'map_name', 'sections', 'objects', 'error',
+])
+
+#: Sections which list objects of mission, keyed by name of objects counter
+OBJECT_SECTIONS = {
+    'wings': ['Wing', ],
+    'chiefs': ['Chiefs', ],
+    'stationary': ['NStationary', 'Stationary', ],
+    'buildings': ['Buildings', ],
+    'born_places': ['BornPlace', ],
+}
+
+
+class MissionFileError(Exception):
+    pass
+
+
+def get_resource_paths(path):
+    """
+    Get paths to files which accompany mission file and are named after it,
+    e.g. mission descriptions 'foo.properties' and 'foo_ru.properties' for
+    mission 'foo.mis'.
+    """
+    root, name = os.path.split(os.path.splitext(path)[0])
+    try:
+        file_names = os.listdir(root)
+    except OSError:
+        return []
+    return [
+        os.path.join(root, x) for x in sorted(file_names)
+        if x.endswith('.properties') and (
+            x == name + '.properties' or x.startswith(name + '_'))
+    ]
+
+
+def read_mission_file(path):
+    """
+    Read mission file and its resources. Besides getting mission's description
+    this puts files into OS cache, so server loads them faster.
+
+    Input:
+    `path`      # absolute path to mission file.
+
+    Output:
+    `MissionFile` instance.
+
+    Raises `MissionFileError` if file cannot be read or is not a mission.
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for resource_path in get_resource_paths(path):
+            with open(resource_path, 'rb') as f:
+                f.read()
+    except (IOError, OSError) as e:
+        raise MissionFileError(_("Failed to read mission file: {0}")
+                               .format(unicode(e)))
+
+    map_name = get_map_name(parse_sections(data))
+    if not map_name:
+        raise MissionFileError(_("Map is not specified in mission file: {0}")
+                               .format(path))
+    return MissionFile(path, stat.st_size, stat.st_mtime, map_name)
+
+
+def parse_sections(data):
+    """
+    Split contents of mission file into sections.
+
+    Output:
+    A dict with lists of non-empty lines keyed by section names.
+    """
+    sections = {}
+    lines = None
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            lines = sections.setdefault(line[1:-1], [])
+        elif lines is not None:
+            lines.append(line)
+    return sections
+
+
+def get_map_name(sections):
+    for line in sections.get('MAIN', []):
+        if line.startswith('MAP '):
+            return line[4:].strip() or None
+
+
+def index_mission_file(path):
+    """
+    Read and check mission file. Problems are reported as a part of result,
+    so this function never fails and can be used in a pool of processes.
+
+    Output:
+    `MissionInfo` instance. Its `error` is `None` if mission is valid.
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError) as e:
+        return MissionInfo(path, None, None, None, [], {},
+                           _("Failed to read mission file: {0}")
+                           .format(unicode(e)))
+
+    sections = parse_sections(data)
+    map_name = get_map_name(sections)
+    objects = dict(
+        (name, sum(len(sections.get(x, [])) for x in section_names))
+        for name, section_names in OBJECT_SECTIONS.iteritems()
+    )
+
+    error = None
+    if 'MAIN' not in sections:
+        error = _("Section [MAIN] is missing")
+    elif not map_name:
+        error = _("Map is not specified")
+    else:
+        missing = [
+            x.split()[0] for x in sections.get('Wing', [])
+            if x.split()[0] not in sections
+        ]
+        if missing:
+            error = _("Sections of wings are missing: {0}").format(
+                      ', '.join(missing))
+
+    return MissionInfo(path, stat.st_size, stat.st_mtime, map_name,
+                       sorted(sections), objects,
+                       None if error is None else unicode(error))
+
+
+def find_mission_files(root):
+    """
+    Get sorted paths to all mission files within given directory.
+    """
+    results = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        results.extend(
+            os.path.join(dir_path, x) for x in file_names
+            if x.lower().endswith('.mis')
+        )
+    return sorted(results)
+
+
+class MissionPreloader(object):
+    """
+    Reads mission files in a thread ahead of time and caches their
+    descriptions. Cached descriptions are used while files are not changed.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def preload(self, path):
+        """
+        Read mission file if it was not read yet or if it was changed.
+
+        Output:
+        Deferred which fires with `MissionFile` instance.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            return defer.fail(MissionFileError(
+                _("Failed to read mission file: {0}").format(unicode(e))))
+
+        cached = self._cache.get(path)
+        if (
+            cached is not None
+            and (cached.size, cached.mtime) == (stat.st_size, stat.st_mtime)
+        ):
+            return defer.succeed(cached)
+
+        return self._read(path).addCallback(self._on_read)
+
+    def _read(self, path):
+        return threads.deferToThread(read_mission_file, path)
+
+    def _on_read(self, mission_file):
+        self._cache[mission_file.path] = mission_file
+        return mission_file
+
+    def clear(self):
+        self._cache.clear()
+
+
+class MissionIndex(object):
+    """
+    Index of mission files within directories. Files are checked in a pool
+    of processes, so large libraries are indexed using all CPUs. The pool is
+    created from the reactor thread on first large scan and is kept until
+    `close` is called. Results are
+    cached by size and modification time of files and are stored in a file,
+    so rescans check only new and changed files. Single files are updated
+    incrementally as they change (see `MissionWatcher`).
+    """
+    processes = MISSION_INDEX_PROCESSES
+    pool_threshold = MISSION_INDEX_POOL_THRESHOLD
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self._entries = None
+        self._roots = set()
+        self._subscribers = []
+        self._pool = None
+        self._pool_size = None
+        self._shutdown_trigger = None
+
+    def _get_entries(self):
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def get(self, path):
+        return self._get_entries().get(path)
+
+    def get_error(self, path):
+        """
+        Get problem of mission file if it is known to be invalid and it was
+        not changed since then.
+        """
+        info = self.get(path)
+        if info is None or info.error is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return info.error
+        if (info.size, info.mtime) == (stat.st_size, stat.st_mtime):
+            return info.error
+
+    def check_file(self, path):
+        """
+        Get description of mission file. File is read only if it was changed
+        since it was indexed.
+
+        Output:
+        `MissionInfo` instance.
+        """
+        info = self.get(path)
+        if info is not None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                pass
+            else:
+                if (info.size, info.mtime) == (stat.st_size, stat.st_mtime):
+                    return info
+        return index_mission_file(path)
+
+    def get_state(self, path):
+        """
+        Get state of mission file as it is known to index without touching
+        file system.
+
+        Output:
+        One of `MISSION_FILE_STATE` values.
+        """
+        info = self.get(path)
+        if info is not None:
+            return (MISSION_FILE_STATE.OK if info.error is None else
+                    MISSION_FILE_STATE.INVALID)
+        self._get_entries()
+        if any(path.startswith(os.path.join(x, '')) for x in self._roots):
+            return MISSION_FILE_STATE.MISSING
+        return MISSION_FILE_STATE.UNKNOWN
+
+    def invalid(self):
+        return sorted(
+            (x for x in self._get_entries().itervalues() if x.error),
+            key=lambda x: x.path)
+
+    def subscribe(self, callback):
+        """
+        Call given function with a list of paths every time files are added
+        to index, updated or removed from it.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def scan(self, root):
+        """
+        Index all mission files within given directory.
+
+        Output:
+        Deferred which fires with a list of `MissionInfo` instances.
+        """
+        known = dict(self._get_entries())
+        d = self._call_in_thread(self._scan, root, known)
+        d.addCallback(self._on_files_found)
+        return d.addCallback(self._on_scanned, root)
+
+    def update(self, paths):
+        """
+        Index given files again. Files which do not exist are removed from
+        index.
+
+        Output:
+        Deferred which fires with a list of `MissionInfo` instances of
+        existing files.
+        """
+        d = self._call_in_thread(self._update, paths)
+        d.addCallback(self._index)
+        return d.addCallback(self._on_updated, paths)
+
+    def close(self):
+        """
+        Stop processes which check mission files.
+        """
+        if self._shutdown_trigger is not None:
+            from twisted.internet import reactor
+            reactor.removeSystemEventTrigger(self._shutdown_trigger)
+            self._shutdown_trigger = None
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _call_in_thread(self, func, *args):
+        return threads.deferToThread(func, *args)
+
+    def _scan(self, root, known):
+        results = []
+        changed = []
+        for path in find_mission_files(root):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            info = known.get(path)
+            if (
+                info is not None
+                and (info.size, info.mtime) == (stat.st_size, stat.st_mtime)
+            ):
+                results.append(info)
+            else:
+                changed.append(path)
+        return results, changed
+
+    def _update(self, paths):
+        return [x for x in paths if os.path.isfile(x)]
+
+    def _on_files_found(self, result):
+        unchanged, changed = result
+        return self._index(changed).addCallback(
+            lambda results: unchanged + results)
+
+    def _index(self, paths):
+        """
+        Check given files in a thread. Pool of processes is got here, as it
+        must not be created from threads.
+        """
+        pool = self._get_pool() if len(paths) >= self.pool_threshold else None
+        return self._call_in_thread(self._index_files, paths, pool)
+
+    def _get_pool(self):
+        if self._pool is None:
+            import multiprocessing
+            from twisted.internet import reactor
+            self._pool_size = self.processes or multiprocessing.cpu_count()
+            self._pool = multiprocessing.Pool(self._pool_size)
+            self._shutdown_trigger = reactor.addSystemEventTrigger(
+                'before', 'shutdown', self.close)
+        return self._pool
+
+    def _index_files(self, paths, pool=None):
+        if pool is None:
+            return map(index_mission_file, paths)
+        chunk_size = max(len(paths) // (self._pool_size * 4), 1)
+        return pool.map(index_mission_file, paths, chunk_size)
+
+    def _on_scanned(self, results, root):
+        entries = self._get_entries()
+        prefix = os.path.join(root, '')
+        removed = [x for x in entries if x.startswith(prefix)]
+        is_new_root = root not in self._roots
+        self._roots.add(root)
+        self._apply(results, removed, force_save=is_new_root)
+        return results
+
+    def _on_updated(self, results, paths):
+        self._apply(results, paths)
+        return results
+
+    def _apply(self, results, removed, force_save=False):
+        """
+        Replace entries of removed files with new ones and tell subscribers
+        about the difference.
+        """
+        entries = self._get_entries()
+        old = dict((x, entries.pop(x)) for x in removed if x in entries)
+        for info in results:
+            entries[info.path] = info
+
+        changed = [
+            x.path for x in results if old.pop(x.path, None) != x
+        ] + old.keys()
+        if not (changed or force_save):
+            return
+
+        if self.cache_path is not None:
+            d = self._call_in_thread(self._save, entries.values(),
+                                     sorted(self._roots))
+            d.addErrback(lambda failure: LOG.error(
+                "Failed to save missions index: {0}".format(
+                    failure.getErrorMessage())))
+        if changed:
+            for callback in list(self._subscribers):
+                callback(changed)
+
+    def _load(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            self._roots.update(data['roots'])
+            return dict((x[0], MissionInfo(*x)) for x in data['entries'])
+        except Exception as e:
+            LOG.error("Failed to load missions index: {0}".format(unicode(e)))
+            return {}
+
+    def _save(self, items, roots):
+        dir_name = os.path.dirname(self.cache_path)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=dir_name)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'roots': roots, 'entries': items, }, f)
+            replace_file(tmp_path, self.cache_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class MissionWatcher(ClockMixin):
+    """
+    Keeps index of mission files within directory up to date. Changes are
+    reported by inotify where it is available, otherwise directory is
+    rescanned every `interval` seconds, so only files with new size or
+    modification time are checked. Changes which come in bursts (e.g. while
+    files are copied) are indexed together after `delay` seconds.
+    """
+    interval = MISSION_WATCH_INTERVAL
+    delay = MISSION_WATCH_DELAY
+
+    def __init__(self, index, root):
+        self.index = index
+        self.root = root
+        self._notifier = None
+        self._poller = None
+        self._pending = set()
+        self._delayed_update = None
+
+    @property
+    def running(self):
+        return self._notifier is not None or self._poller is not None
+
+    def start(self, use_inotify=True):
+        """
+        Index directory and start watching it.
+
+        Output:
+        Deferred which fires with a list of `MissionInfo` instances when
+        directory is indexed.
+        """
+        self.stop()
+        if not (use_inotify and self._start_notifier()):
+            self._poller = task.LoopingCall(self._poll)
+            self._poller.clock = self._get_clock()
+            self._poller.start(self.interval, now=False).addErrback(
+                lambda failure: LOG.error(
+                    "Failed to poll mission files: {0}".format(
+                        failure.getErrorMessage())))
+        return self.index.scan(self.root)
+
+    def stop(self):
+        if self._notifier is not None:
+            self._notifier.loseConnection()
+            self._notifier = None
+        if self._poller is not None:
+            if self._poller.running:
+                self._poller.stop()
+            self._poller = None
+        if self._delayed_update is not None:
+            if self._delayed_update.active():
+                self._delayed_update.cancel()
+            self._delayed_update = None
+        self._pending.clear()
+
+    def _start_notifier(self):
+        try:
+            from twisted.internet import inotify
+            from twisted.python.filepath import FilePath
+            notifier = inotify.INotify()
+            notifier.startReading()
+        except (ImportError, NotImplementedError, OSError):
+            return False
+
+        mask = (inotify.IN_CLOSE_WRITE | inotify.IN_CREATE |
+                inotify.IN_DELETE | inotify.IN_MOVED_FROM |
+                inotify.IN_MOVED_TO)
+        try:
+            notifier.watch(FilePath(self.root), mask=mask, autoAdd=True,
+                           callbacks=[self._on_notified, ], recursive=True)
+        except Exception as e:
+            LOG.error("Failed to watch mission files: {0}".format(unicode(e)))
+            notifier.loseConnection()
+            return False
+
+        self._notifier = notifier
+        return True
+
+    def _on_notified(self, unused, file_path, mask):
+        from twisted.internet import inotify
+
+        if mask & inotify.IN_ISDIR:
+            # Files of moved or removed directories are not reported
+            # separately, so the whole tree is checked
+            self._schedule_update(None)
+        elif file_path.path.lower().endswith('.mis'):
+            if mask & inotify.IN_CREATE:
+                # File will be indexed when it is written
+                return
+            self._schedule_update(file_path.path)
+
+    def _schedule_update(self, path):
+        """
+        Index file at given path or the whole directory if path is `None`.
+        """
+        self._pending.add(path)
+        if self._delayed_update is None:
+            self._delayed_update = self._get_clock().callLater(
+                self.delay, self._update)
+
+    def _update(self):
+        self._delayed_update = None
+        paths, self._pending = self._pending, set()
+        if None in paths:
+            d = self.index.scan(self.root)
+        else:
+            d = self.index.update(sorted(paths))
+        return d.addErrback(lambda failure: LOG.error(
+            "Failed to update mission files: {0}".format(
+                failure.getErrorMessage())))
+
+    def _poll(self):
+        return self.index.scan(self.root)
+
+
+#: Index of mission files shared by all servers
+mission_index = MissionIndex(os.path.join(SETTINGS_ROOT, 'missions.index'))
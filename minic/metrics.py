@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight metrics which are updated by services and can be served as plain
+text over HTTP by the same reactor (see `minic.web`). Text format is
+compatible with Prometheus.
+"""
+import bisect
+import time
+
+from twisted.internet import defer
+
+
+#: Default buckets of histograms in seconds
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0,
+)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape_label_value(value):
+    """
+    Escape label value as text format requires.
+    """
+    if not isinstance(value, basestring):
+        value = str(value)
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _sample_name(name, labels_key):
+    if not labels_key:
+        return name
+    return "{0}{{{1}}}".format(name, ','.join(
+        '{0}="{1}"'.format(key, _escape_label_value(value))
+        for key, value in labels_key))
+
+
+class Counter(object):
+    """
+    Monotonically increasing value.
+    """
+    kind = 'counter'
+
+    def __init__(self, name, description=None, labels=None):
+        self.name = name
+        self.description = description
+        self.labels = _labels_key(labels)
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        return [(_sample_name(self.name, self.labels), self.value), ]
+
+
+class Gauge(Counter):
+    """
+    Value which can go up and down.
+    """
+    kind = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram(object):
+    """
+    Distribution of observed values with fixed buckets.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, description=None, buckets=DEFAULT_BUCKETS,
+                 labels=None):
+        self.name = name
+        self.description = description
+        self.labels = _labels_key(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0, ] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """
+        Get a context manager which observes duration of its block.
+        """
+        return _Timer(self)
+
+    def observe_deferred(self, d):
+        """
+        Observe time passed until given deferred fires.
+        """
+        start = time.time()
+
+        def observe(result):
+            self.observe(time.time() - start)
+            return result
+
+        return d.addBoth(observe)
+
+    def timed(self, func):
+        """
+        Decorator which observes duration of function calls. If function
+        returns a deferred, time until deferred fires is observed.
+        """
+        def decorator(*args, **kwargs):
+            start = time.time()
+            result = func(*args, **kwargs)
+            if isinstance(result, defer.Deferred):
+
+                def observe(value):
+                    self.observe(time.time() - start)
+                    return value
+
+                return result.addBoth(observe)
+            self.observe(time.time() - start)
+            return result
+
+        decorator.__name__ = func.__name__
+        decorator.__doc__ = func.__doc__
+        return decorator
+
+    def samples(self):
+        bucket_name = '{0}_bucket'.format(self.name)
+        results = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            results.append((_sample_name(
+                bucket_name, self.labels + (('le', bound), )), total))
+        results.append((_sample_name(
+            bucket_name, self.labels + (('le', '+Inf'), )), self.count))
+        results.append((_sample_name(
+            '{0}_sum'.format(self.name), self.labels), self.sum))
+        results.append((_sample_name(
+            '{0}_count'.format(self.name), self.labels), self.count))
+        return results
+
+
+class _Timer(object):
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.time() - self.start)
+
+
+class MetricsRegistry(object):
+    """
+    Container of metrics. Metrics are created on first request and shared
+    afterwards. Metrics with the same name and different labels, e.g. one
+    per server, are rendered together. Collectors are called only while
+    rendering, so values which are already counted elsewhere cost nothing
+    per event.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+
+    def _get_or_create(self, cls, name, labels, *args):
+        family = self._metrics.setdefault(name, {})
+        other = next(family.itervalues(), None)
+        if other is not None and type(other) is not cls:
+            raise ValueError("Metric '{0}' is already registered as {1}"
+                             .format(name, other.kind))
+        key = _labels_key(labels)
+        metric = family.get(key)
+        if metric is None:
+            metric = family[key] = cls(name, *args, labels=labels)
+        return metric
+
+    def counter(self, name, description=None, labels=None):
+        return self._get_or_create(Counter, name, labels, description)
+
+    def gauge(self, name, description=None, labels=None):
+        return self._get_or_create(Gauge, name, labels, description)
+
+    def histogram(self, name, description=None, buckets=DEFAULT_BUCKETS,
+                  labels=None):
+        return self._get_or_create(Histogram, name, labels, description,
+                                   buckets)
+
+    def register_collector(self, name, func, kind='gauge', description=None,
+                           labels=None):
+        """
+        Register function which returns a value of metric on demand. Several
+        functions can be registered under the same name with different
+        labels, e.g. one per server.
+        """
+        kind, description, funcs = self._collectors.get(
+            name, (kind, description, {}))
+        funcs[_labels_key(labels)] = func
+        self._collectors[name] = (kind, description, funcs)
+
+    def unregister_collector(self, name, labels=None):
+        funcs = self._collectors.get(name, (None, None, {}))[2]
+        funcs.pop(_labels_key(labels), None)
+        if not funcs:
+            self._collectors.pop(name, None)
+
+    def unregister_labels(self, labels):
+        """
+        Remove all metrics and collectors with given labels, e.g. ones of a
+        server which is not managed anymore.
+        """
+        key = _labels_key(labels)
+        for name, family in self._metrics.items():
+            family.pop(key, None)
+            if not family:
+                del self._metrics[name]
+        for name, (kind, description, funcs) in self._collectors.items():
+            funcs.pop(key, None)
+            if not funcs:
+                del self._collectors[name]
+
+    def get(self, name, labels=None):
+        return self._metrics.get(name, {}).get(_labels_key(labels))
+
+    def render(self):
+        """
+        Render all metrics in plain text format.
+        """
+        lines = []
+
+        def describe(name, kind, description):
+            if description:
+                lines.append("# HELP {0} {1}".format(name, description))
+            lines.append("# TYPE {0} {1}".format(name, kind))
+
+        for name in sorted(self._metrics):
+            family = self._metrics[name]
+            first = family[min(family)]
+            describe(name, first.kind, first.description)
+            for labels in sorted(family):
+                for sample_name, value in family[labels].samples():
+                    lines.append("{0} {1}".format(sample_name, value))
+
+        for name in sorted(self._collectors):
+            kind, description, funcs = self._collectors[name]
+            describe(name, kind, description)
+            for labels in sorted(funcs):
+                lines.append("{0} {1}".format(_sample_name(name, labels),
+                                              funcs[labels]()))
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+class ServerMetric(object):
+    """
+    Metric which is kept per server. It is declared as an attribute of a
+    class whose instances have `metric_labels` and is created with these
+    labels on first access from each instance.
+    """
+
+    def __init__(self, kind, name, description=None, **kwargs):
+        self.kind = kind
+        self.name = name
+        self.description = description
+        self.kwargs = kwargs
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        attr_name = '_metric_' + self.name
+        metric = instance.__dict__.get(attr_name)
+        if metric is None:
+            metric = getattr(metrics, self.kind)(
+                self.name, self.description, labels=instance.metric_labels,
+                **self.kwargs)
+            instance.__dict__[attr_name] = metric
+        return metric
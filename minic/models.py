@@ -12,116 +12,199 @@ LOG = tx_logging.getLogger(__name__)
 
 Mission = namedtuple('Mission',
                      field_names=['id', 'name', 'relative_path', 'duration'])
+RotationRule = namedtuple('RotationRule', field_names=[
+    'weight', 'hours', 'min_pilots', 'max_pilots',
+])
+
+#: Rule of missions which have no rules of their own
+DEFAULT_ROTATION_RULE = RotationRule(weight=1, hours=None, min_pilots=0,
+                                     max_pilots=None)
+
+
+class MissionRegistry(object):
+    """
+    In-memory index over the list of missions. Keeps missions by their IDs
+    along with their positions within the list, so lookups do not need to walk
+    the whole list.
+    """
+
+    def __init__(self):
+        self._missions = None
+        self._by_id = {}
+        self._positions = {}
+
+    def bind(self, raw_list):
+        """
+        Rebuild indexes if given list is not the one which is indexed already.
+        """
+        if raw_list is not self._missions:
+            self.rebuild(raw_list)
+
+    def rebuild(self, raw_list):
+        """
+        Index given list of missions. Raw items are converted to `Mission`
+        instances in place, so they are wrapped only once.
+        """
+        raw_list[:] = [
+            x if isinstance(x, Mission) else Mission(*x) for x in raw_list
+        ]
+        self._missions = raw_list
+        self._by_id = dict((m.id, m) for m in raw_list)
+        self._positions = dict((m.id, i) for i, m in enumerate(raw_list))
+
+    def clear(self):
+        self._missions = None
+        self._by_id.clear()
+        self._positions.clear()
+
+    def all(self):
+        return self._missions
+
+    def get(self, mission_id):
+        return self._by_id.get(mission_id)
+
+    def index_of(self, mission_id):
+        return self._positions.get(mission_id, -1)
+
+    def id_at(self, index):
+        try:
+            return self._missions[index].id
+        except IndexError:
+            return None
+
+    def max_id(self):
+        return max(self._by_id) if self._by_id else 0
 
+    def __len__(self):
+        return len(self._missions)
 
-class MissionManager(object):
+    def __contains__(self, mission_id):
+        return mission_id in self._by_id
 
-    _id_generator = None
-    _first_load_flag = True
+
+class MissionList(object):
+    """
+    List of missions of a single server and ID of its current mission. Both
+    are stored in given user settings.
+    """
     dogfight_subpath = os.path.join('Net', 'dogfight')
 
-    @classmethod
-    def _get_raw(cls):
-        value = user_settings.missions
+    def __init__(self, settings):
+        self.settings = settings
+        self._id_generator = None
+        self._registry = MissionRegistry()
+
+    def _get_raw(self):
+        value = self.settings.missions
         if value is None:
             value = {
                 'list': [],
                 'current_id': None,
             }
-            user_settings.missions = value
+            self.settings.missions = value
         return value
 
-    @classmethod
-    def _get_raw_list(cls):
-        return cls._get_raw().setdefault('list', [])
+    def _get_raw_list(self):
+        return self._get_raw().setdefault('list', [])
 
-    @classmethod
-    def _set_raw_list(cls, value):
-        cls._get_raw()['list'] = value
+    def _set_raw_list(self, value):
+        self._get_raw()['list'] = value
 
-    @classmethod
-    def all(cls):
-        missions = cls._get_raw_list()
-        if cls._first_load_flag:
-            return list(map(lambda x: Mission(*x), missions))
-            cls._first_load_flag = False
-        else:
-            return missions
+    def _get_registry(self):
+        self._registry.bind(self._get_raw_list())
+        return self._registry
+
+    def all(self):
+        return self._get_registry().all()
+
+    def update(self, missions):
+        self._set_raw_list([Mission(*x) for x in missions])
+        self.settings.sync()
 
-    @classmethod
-    def update(cls, missions):
-        cls._set_raw_list([Mission(*x) for x in missions])
-        user_settings.sync()
+    def count(self):
+        return len(self._get_registry())
 
-    @classmethod
-    def count(cls):
-        return len(cls.all())
+    def get_scheduler_name(self):
+        """
+        Get name of policy which chooses missions to rotate.
+        """
+        return self._get_raw().get('scheduler')
 
-    @classmethod
-    def get_current_id(cls):
-        return cls._get_raw().setdefault('current_id', None)
+    def set_scheduler_name(self, value):
+        self._get_raw()['scheduler'] = value
+        self.settings.sync()
 
-    @classmethod
-    def set_current_id(cls, value):
-        cls._get_raw()['current_id'] = value
-        user_settings.sync()
+    def get_rule(self, mission_id):
+        """
+        Get rule which tells when mission can be chosen by rotation.
+        """
+        value = self._get_raw().get('rules', {}).get(str(mission_id))
+        if value is None:
+            return DEFAULT_ROTATION_RULE
+        return DEFAULT_ROTATION_RULE._replace(**dict(
+            (k, v) for k, v in value.iteritems()
+            if k in RotationRule._fields))
+
+    def set_rule(self, mission_id, rule):
+        rules = self._get_raw().setdefault('rules', {})
+        if rule is None:
+            rules.pop(str(mission_id), None)
+        else:
+            rules[str(mission_id)] = rule._asdict()
+        self.settings.sync()
 
-    @classmethod
-    def generate_id(cls):
-        if cls._id_generator is None:
+    def get_current_id(self):
+        return self._get_raw().setdefault('current_id', None)
+
+    def set_current_id(self, value):
+        self._get_raw()['current_id'] = value
+        self.settings.sync()
+
+    def generate_id(self):
+        if self._id_generator is None:
 
             def id_generator():
-                number = max([m.id for m in cls.all()] or [0, ])
+                number = self._get_registry().max_id()
                 while True:
                     number += 1
                     yield number
 
-            cls._id_generator = id_generator()
-        return next(cls._id_generator)
+            self._id_generator = id_generator()
+        return next(self._id_generator)
+
+    def get(self, mission_id):
+        return self._get_registry().get(mission_id)
 
-    @classmethod
-    def get_current_mission(cls):
-        current_id = cls.get_current_id()
+    def get_current_mission(self):
+        current_id = self.get_current_id()
         if current_id is not None:
-            for m in cls.all():
-                if m.id == current_id:
-                    return m
-
-    @classmethod
-    def get_index_by_id(cls, mission_id):
-        index = -1
-        for i, m in enumerate(cls.all()):
-            if m.id == mission_id:
-                index = i
-                break
-        return index
-
-    @classmethod
-    def get_id_by_index(cls, index):
-        try:
-            return cls.all()[index].id
-        except ValueError:
-            return None
+            return self._get_registry().get(current_id)
 
-    @classmethod
-    def get_root_path(cls):
+    def get_index_by_id(self, mission_id):
+        return self._get_registry().index_of(mission_id)
+
+    def get_id_by_index(self, index):
+        return self._get_registry().id_at(index)
+
+    def get_root_path(self):
         return os.path.join(
-            os.path.dirname(user_settings.server_path),
+            os.path.dirname(self.settings.server_path),
             'Missions',
-            cls.dogfight_subpath)
+            self.dogfight_subpath)
 
-    @classmethod
-    def absolute_path(cls, short_relative_path):
-        return os.path.join(cls.get_root_path(), short_relative_path)
+    def absolute_path(self, short_relative_path):
+        return os.path.join(self.get_root_path(), short_relative_path)
 
-    @classmethod
-    def short_relative_path(cls, absolute_path):
-        root_path = cls.get_root_path()
+    def short_relative_path(self, absolute_path):
+        root_path = self.get_root_path()
         if absolute_path.startswith(root_path):
             return absolute_path[len(root_path) + len(os.path.sep):]
         raise ValueError(_("Missions must be placed within '{0}' directory.")
                          .format(root_path))
 
-    @classmethod
-    def full_relative_path(cls, short_relative_path):
-        return os.path.join(cls.dogfight_subpath, short_relative_path)
+    def full_relative_path(self, short_relative_path):
+        return os.path.join(self.dogfight_subpath, short_relative_path)
+
+
+#: Missions of the server managed by GUI
+MissionManager = MissionList(user_settings)
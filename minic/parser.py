@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Commander's parsers.
+"""
+import il2ds_log_parser.content_processor as lpcp
+import il2ds_log_parser.parser as lp
+import il2ds_log_parser.regex as lpre
+
+from collections import defaultdict
+
+from il2ds_middleware.interface.parser import ILineParser
+from il2ds_middleware.service import (
+    MutedMissionsService, MutedObjectsService, MutedPilotsService,
+)
+from zope.interface import implementer
+
+
+_TIME_POSITION = [
+    lpcp.process_time, lpcp.process_position,
+]
+_TIME_TOGGLE_POSITION = [
+    lpcp.process_time, lpcp.process_toggle_value, lpcp.process_position,
+]
+_TIME_SEAT_POSITION = [
+    lpcp.process_time, lpcp.process_seat, lpcp.process_position,
+]
+
+#: Events which can be found in events log. Each event is described by a name
+#: of handler's method, regex, content processors and a keyword. Keyword is a
+#: word which is always present in a line of such event, so regex is not even
+#: tried for lines without it. Order matters: more specific events go first.
+EVENT_LOG_EVENTS = (
+    # Mission flow events
+    (
+        'was_won', lpre.RX_MISSION_WON,
+        [lpcp.process_time, lpcp.process_date, lpcp.process_army, ],
+        'WON',
+    ),
+    (
+        'target_end', lpre.RX_TARGET_RESULT,
+        [
+            lpcp.process_time, lpcp.process_number,
+            lpcp.process_target_result,
+        ],
+        'Target',
+    ),
+    # User state events
+    ('went_to_menu', lpre.RX_WENT_TO_MENU, [lpcp.process_time, ], 'refly'),
+    ('selected_army', lpre.RX_SELECTED_ARMY, _TIME_POSITION, 'army'),
+    # Destruction events
+    (
+        'building_destroyed_by_user', lpre.RX_DESTROYED_BLD, _TIME_POSITION,
+        'destroyed',
+    ),
+    (
+        'tree_destroyed_by_user', lpre.RX_DESTROYED_TREE, _TIME_POSITION,
+        'destroyed',
+    ),
+    (
+        'bridge_destroyed_by_user', lpre.RX_DESTROYED_BRIDGE, _TIME_POSITION,
+        'destroyed',
+    ),
+    (
+        'static_destroyed_by_user', lpre.RX_DESTROYED_STATIC, _TIME_POSITION,
+        'destroyed',
+    ),
+    # Lightning effect events
+    (
+        'toggle_landing_lights', lpre.RX_TOGGLE_LANDING_LIGHTS,
+        _TIME_TOGGLE_POSITION, 'landing',
+    ),
+    (
+        'toggle_wingtip_smokes', lpre.RX_TOGGLE_WINGTIP_SMOKES,
+        _TIME_TOGGLE_POSITION, 'wingtip',
+    ),
+    # Aircraft events
+    (
+        'weapons_loaded', lpre.RX_WEAPONS_LOADED,
+        [lpcp.process_time, lpcp.process_fuel, lpcp.process_position, ],
+        'weapons',
+    ),
+    ('took_off', lpre.RX_TOOK_OFF, _TIME_POSITION, 'flight'),
+    ('crashed', lpre.RX_CRASHED, _TIME_POSITION, 'crashed'),
+    ('landed', lpre.RX_LANDED, _TIME_POSITION, 'landed'),
+    (
+        'was_damaged_on_ground', lpre.RX_DAMAGED_ON_GROUND, _TIME_POSITION,
+        'ground',
+    ),
+    ('damaged_self', lpre.RX_DAMAGED_SELF, _TIME_POSITION, 'landscape'),
+    (
+        'was_damaged_by_user', lpre.RX_DAMAGED_BY_USER,
+        [
+            lpcp.process_time, lpcp.process_attacking_user,
+            lpcp.process_position,
+        ],
+        'damaged',
+    ),
+    ('shot_down_self', lpre.RX_SHOT_DOWN_SELF, _TIME_POSITION, 'landscape'),
+    (
+        'was_shot_down_by_static', lpre.RX_SHOT_DOWN_BY_STATIC,
+        _TIME_POSITION, 'shot',
+    ),
+    (
+        'was_shot_down_by_user', lpre.RX_SHOT_DOWN_BY_USER,
+        [
+            lpcp.process_time, lpcp.process_attacking_user,
+            lpcp.process_position,
+        ],
+        'shot',
+    ),
+    # Crew member events
+    ('seat_occupied', lpre.RX_SEAT_OCCUPIED, _TIME_SEAT_POSITION, 'seat'),
+    ('was_killed', lpre.RX_KILLED, _TIME_SEAT_POSITION, 'killed'),
+    (
+        'was_killed_by_user', lpre.RX_KILLED_BY_USER,
+        [
+            lpcp.process_time, lpcp.process_seat,
+            lpcp.process_attacking_user, lpcp.process_position,
+        ],
+        'killed',
+    ),
+    ('bailed_out', lpre.RX_BAILED_OUT, _TIME_SEAT_POSITION, 'bailed'),
+    (
+        'parachute_opened', lpre.RX_SUCCESSFULLY_BAILED_OUT,
+        _TIME_SEAT_POSITION, 'successfully',
+    ),
+    ('was_wounded', lpre.RX_WOUNDED, _TIME_SEAT_POSITION, 'wounded'),
+    (
+        'was_heavily_wounded', lpre.RX_HEAVILY_WOUNDED, _TIME_SEAT_POSITION,
+        'heavily',
+    ),
+    ('was_captured', lpre.RX_CAPTURED, _TIME_SEAT_POSITION, 'captured'),
+)
+
+#: Services which methods do nothing. Services do not subscribe to events
+#: which are handled by methods inherited from these ones.
+MUTED_SERVICES = (
+    MutedMissionsService, MutedObjectsService, MutedPilotsService,
+)
+
+
+def is_subscribed(service, event_name):
+    """
+    Check whether service really handles given event, i.e. it has own
+    handler method instead of a muted one.
+    """
+    method = getattr(service, event_name, None)
+    if method is None:
+        return False
+    func = getattr(method, '__func__', method)
+    for muted in MUTED_SERVICES:
+        muted_method = muted.__dict__.get(event_name)
+        if muted_method is not None and muted_method is func:
+            return False
+    return True
+
+
+@implementer(ILineParser)
+class EventLogParser(object):
+    """
+    Parser of events log which routes parsed events to subscribed callbacks
+    only. Dispatch table is precomputed and contains only events which have
+    subscribers, so lines of other events are not matched against any regex.
+    Regexes are compiled on first subscription to their events.
+    """
+
+    def __init__(self, services=None):
+        """
+        Input:
+        `services`      # a sequence of services which handle events. Every
+                        # service is subscribed to events it has own handler
+                        # methods for.
+        """
+        self._events = dict(
+            (name, (rx, processors))
+            for name, rx, processors, keyword in EVENT_LOG_EVENTS)
+        self._parsers = {}
+        self._subscribers = defaultdict(list)
+        self._table = []
+        self.reset_counters()
+
+        for service in services or []:
+            for name, rx, processors, keyword in EVENT_LOG_EVENTS:
+                if is_subscribed(service, name):
+                    self._subscribers[name].append(getattr(service, name))
+        self._build_table()
+
+    def subscribe(self, event_name, callback):
+        if event_name not in self._events:
+            raise ValueError("Unknown event: {0}".format(event_name))
+        self._subscribers[event_name].append(callback)
+        self._build_table()
+
+    def unsubscribe(self, event_name, callback):
+        self._subscribers[event_name].remove(callback)
+        self._build_table()
+
+    def _get_parser(self, event_name):
+        parser = self._parsers.get(event_name)
+        if parser is None:
+            rx, processors = self._events[event_name]
+            parser = lp.RegexParser(rx, processors)
+            self._parsers[event_name] = parser
+        return parser
+
+    def _build_table(self):
+        self._table = [
+            (keyword, name, self._get_parser(name),
+             tuple(self._subscribers[name]))
+            for name, rx, processors, keyword in EVENT_LOG_EVENTS
+            if self._subscribers[name]
+        ]
+
+    @property
+    def event_names(self):
+        """
+        Names of events which have subscribers.
+        """
+        return [name for keyword, name, parser, callbacks in self._table]
+
+    def parse_line(self, line):
+        """
+        Parse string line and pass parsed event to subscribers.
+
+        Input:
+        `line`      # a string to parse.
+
+        Output:
+        Parsed event or `None` if line was not recognized.
+        """
+        self.lines_count += 1
+        for keyword, name, parser, callbacks in self._table:
+            if keyword not in line:
+                continue
+            event = parser(line)
+            if event:
+                self.events_count[name] += 1
+                for callback in callbacks:
+                    callback(event)
+                return event
+        return None
+
+    def reset_counters(self):
+        #: Total number of lines passed to parser
+        self.lines_count = 0
+        #: Number of parsed events by their names
+        self.events_count = defaultdict(int)
+
+    @property
+    def counters(self):
+        """
+        Get snapshot of parsing counters.
+        """
+        return {
+            'lines': self.lines_count,
+            'events': sum(self.events_count.values()),
+            'by_event': dict(self.events_count),
+        }
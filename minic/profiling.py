@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Startup profiling: time spent in importing of each module and time passed
+until key points of startup (e.g. connection with server). Profiler must be
+installed before anything else is imported to see all modules, so this module
+must not import anything heavy.
+"""
+import __builtin__
+import sys
+import time
+
+
+#: Command line option which enables startup profiling
+PROFILE_STARTUP_OPTION = '--profile-startup'
+
+
+class ImportProfiler(object):
+    """
+    Measures time spent in importing of modules. Time of nested imports is
+    included into cumulative time of parent module, but not into its own time.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.imports = {}
+        self.marks = []
+        self._stack = []
+        self._original_import = None
+
+    @property
+    def is_installed(self):
+        return self._original_import is not None
+
+    def install(self):
+        if not self.is_installed:
+            self._original_import = __builtin__.__import__
+            __builtin__.__import__ = self._import
+
+    def uninstall(self):
+        if self.is_installed:
+            __builtin__.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=None,
+                level=-1):
+        if name in sys.modules:
+            # Do not spend time on modules which are already imported
+            return self._original_import(name, globals, locals, fromlist,
+                                         level)
+
+        self._stack.append(0)
+        start = time.time()
+        try:
+            return self._original_import(name, globals, locals, fromlist,
+                                         level)
+        finally:
+            duration = time.time() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += duration
+
+            own, cumulative = self.imports.get(name, (0, 0))
+            self.imports[name] = (own + duration - nested,
+                                  cumulative + duration)
+
+    def mark(self, name):
+        """
+        Remember time passed since profiler was created.
+        """
+        self.marks.append((name, time.time() - self.started_at))
+
+    def report(self, stream=None, limit=30):
+        """
+        Write marks and the slowest imports sorted by cumulative time.
+        """
+        stream = stream or sys.stderr
+        stream.write("Startup profile:\n")
+        for name, passed in self.marks:
+            stream.write("  {0:<40}{1:>10.1f} ms\n".format(name,
+                                                           passed * 1000))
+
+        total = sum(own for own, cumulative in self.imports.values())
+        stream.write("Imports: {0} modules, {1:.1f} ms\n".format(
+                     len(self.imports), total * 1000))
+        stream.write("  {0:<40}{1:>13}{2:>13}\n".format(
+                     "module", "own, ms", "total, ms"))
+
+        rows = sorted(self.imports.items(), key=lambda x: x[1][1],
+                      reverse=True)
+        for name, (own, cumulative) in rows[:limit]:
+            stream.write("  {0:<40}{1:>13.1f}{2:>13.1f}\n".format(
+                         name, own * 1000, cumulative * 1000))
+
+
+#: Profiler of current process. It is installed only if startup profiling is
+#: requested.
+startup_profiler = ImportProfiler()
+
+
+def install_from_argv(argv=None):
+    """
+    Install startup profiler if it is requested by command line option.
+
+    :returns: ``True`` if profiler was installed.
+    """
+    argv = sys.argv if argv is None else argv
+    if PROFILE_STARTUP_OPTION in argv:
+        startup_profiler.install()
+    return startup_profiler.is_installed
+
+
+def mark(name):
+    """
+    Mark point of startup if profiler is installed.
+    """
+    if startup_profiler.is_installed:
+        startup_profiler.mark(name)
+
+
+def report():
+    """
+    Stop profiling and report results. Results are reported only once.
+    """
+    if startup_profiler.is_installed:
+        startup_profiler.uninstall()
+        startup_profiler.report()
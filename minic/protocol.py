@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+Commander's client protocols for game server.
+"""
+import random
+import tx_logging
+
+from collections import deque
+
+from twisted.internet import defer
+
+from il2ds_middleware.constants import DEVICE_LINK_OPCODE as DL_OPCODE
+from il2ds_middleware.protocol import (
+    ConsoleClient as BaseConsoleClient,
+    DeviceLinkClient as BaseDeviceLinkClient, DeviceLinkRequest,
+    ReconnectingConsoleClientFactory as BaseReconnectingConsoleClientFactory,
+)
+from il2ds_middleware.requests import (
+    REQ_MISSION_BEGIN, REQ_MISSION_DESTROY, REQ_MISSION_END, REQ_MISSION_LOAD,
+)
+
+from minic.metrics import ServerMetric
+from minic.settings import (
+    CONSOLE_TIMEOUTS, RECONNECT_FAST_DELAY, RECONNECT_INITIAL_DELAY,
+    RECONNECT_MAX_DELAY, RECONNECT_FACTOR, RECONNECT_JITTER,
+    RECONNECT_PROBE_LIMIT,
+)
+from minic.util import ClockMixin
+
+
+LOG = tx_logging.getLogger(__name__)
+
+#: Device Link commands which server does not answer
+NO_ANSWER_OPCODES = frozenset([DL_OPCODE.RADAR_REFRESH.value, ])
+
+
+class ConsoleCommand(object):
+    """
+    A command sent to server's console and waiting for server's output.
+    """
+
+    def __init__(self, rid, line, timeout):
+        self.rid = rid
+        self.line = line
+        self.timeout = timeout
+        self.results = []
+        self.deferred = defer.Deferred()
+        self.watchdog = None
+        self.started = None
+        self.timed_out = False
+
+
+class ConsoleClient(BaseConsoleClient):
+    """
+    Console client which pipelines commands: any number of commands can be
+    sent without waiting for output of previous ones and output is correlated
+    with commands by request IDs.
+
+    Server executes commands one after another, so command's timeout is
+    counted from the moment previous commands are done or timed out. This way
+    a quick command queued behind a slow one does not time out. Output of a
+    timed out command is discarded if it arrives later.
+    """
+    factory = None
+
+    command_time = ServerMetric(
+        'histogram', 'minic_console_command_seconds',
+        "Time server spends in executing console commands")
+    timeout_count = ServerMetric(
+        'counter', 'minic_console_timeouts_total',
+        "Number of timed out console commands")
+
+    def __init__(self, parser=None, timeout=None, timeouts=None):
+        """
+        Input:
+        `parser`        # an object implementing IConsoleParser interface.
+        `timeout`       # default timeout of commands in seconds.
+        `timeouts`      # a dict of timeouts keyed by command prefix.
+        """
+        BaseConsoleClient.__init__(self, parser, timeout)
+        self.timeouts = CONSOLE_TIMEOUTS if timeouts is None else timeouts
+
+    @property
+    def pending(self):
+        """
+        Number of commands waiting for output.
+        """
+        return len(self._requests)
+
+    @property
+    def metric_labels(self):
+        return getattr(self.factory, 'metric_labels', None)
+
+    def get_timeout(self, line):
+        """
+        Get timeout for the longest command prefix which matches given line or
+        the default timeout.
+        """
+        prefixes = [
+            x for x in self.timeouts
+            if line == x or line.startswith(x + ' ')
+        ]
+        if prefixes:
+            return self.timeouts[max(prefixes, key=len)]
+        return self.timeout
+
+    def connectionLost(self, reason):
+        commands, self._requests = self._requests, deque()
+        self._request = None
+        for command in commands:
+            self._cancel_watchdog(command)
+            if not command.timed_out:
+                command.deferred.errback(reason)
+
+    def send_request(self, line, timeout=None):
+        command = ConsoleCommand(self._generate_request_id(), line,
+                                 timeout or self.get_timeout(line))
+        self._requests.append(command)
+
+        wrapper = "rid|{0}".format(command.rid)
+        self.sendLine(wrapper)
+        self.sendLine(line)
+        self.sendLine(wrapper)
+
+        self._start_watchdog()
+        return command.deferred
+
+    def _process_request_id(self, rid):
+        if self._request is None:
+            self._begin_command(rid)
+        elif self._request.rid == rid:
+            self._end_command()
+        else:
+            LOG.error("Unexpected RID {0} in output of command #{1}".format(
+                      rid, self._request.rid))
+
+    def _begin_command(self, rid):
+        for i, command in enumerate(self._requests):
+            if command.rid == rid:
+                break
+        else:
+            LOG.error("Unexpected RID: {0}".format(rid))
+            return
+
+        # Server executes commands in order, so there will be no output for
+        # commands which were sent before this one
+        for unused in range(i):
+            command = self._requests.popleft()
+            self._cancel_watchdog(command)
+            if not command.timed_out:
+                command.deferred.errback(defer.TimeoutError(
+                    "Output of console command #{0} is lost".format(
+                        command.rid)))
+
+        self._request = self._requests[0]
+
+    def _end_command(self):
+        command, self._request = self._request, None
+        self._requests.popleft()
+        self._cancel_watchdog(command)
+        self._start_watchdog()
+
+        if command.timed_out:
+            LOG.debug("Discarding output of timed out console command #{0}"
+                      .format(command.rid))
+            return
+
+        if command.started is not None:
+            self.command_time.observe(self.clock.seconds() - command.started)
+        command.deferred.callback(command.results)
+
+    def _start_watchdog(self):
+        """
+        Start counting time of the first command which is not timed out.
+        """
+        for command in self._requests:
+            if command.timed_out:
+                continue
+            if command.watchdog is None:
+                command.started = self.clock.seconds()
+                command.watchdog = self.clock.callLater(
+                    command.timeout, self._on_timeout, command)
+            break
+
+    def _cancel_watchdog(self, command):
+        if command.watchdog is not None and command.watchdog.active():
+            command.watchdog.cancel()
+        command.watchdog = None
+
+    def _on_timeout(self, command):
+        command.watchdog = None
+        command.timed_out = True
+        self.timeout_count.inc()
+        LOG.error("Console command #{0} '{1}' is timed out".format(
+                  command.rid, command.line))
+        self._start_watchdog()
+        command.deferred.errback(defer.TimeoutError(
+            "Console command '{0}' is timed out".format(command.line)))
+
+    def _request_with_status(self, line, timeout=None):
+        """
+        Send command and request mission status right after it without
+        waiting for command's output.
+
+        Output:
+        Deferred which fires with mission status.
+        """
+        d = defer.gatherResults([
+            self.send_request(line, timeout),
+            self.mission_status(),
+        ], consumeErrors=True)
+        return d.addCallbacks(lambda results: results[1],
+                              lambda failure: failure.value.subFailure)
+
+    def mission_load(self, mission, timeout=None):
+        return self.send_request(
+            REQ_MISSION_LOAD.format(mission), timeout).addCallback(
+            self.parser.mission_status)
+
+    def mission_begin(self, timeout=None):
+        return self._request_with_status(REQ_MISSION_BEGIN, timeout)
+
+    def mission_end(self, timeout=None):
+        return self._request_with_status(REQ_MISSION_END, timeout)
+
+    def mission_destroy(self, timeout=None):
+        return self._request_with_status(REQ_MISSION_DESTROY, timeout)
+
+
+class DeviceLinkClient(BaseDeviceLinkClient, ClockMixin):
+    """
+    Device Link client which packs any number of commands into datagrams of
+    at most `cmd_group_max_size` commands. Commands which server does not
+    answer (e.g. radar refreshing) can be packed together with other ones.
+    Requests time out on `clock`, so they can be tested without reactor.
+    """
+    #: Labels of metrics, e.g. name of server
+    metric_labels = None
+
+    datagram_count = ServerMetric(
+        'counter', 'minic_device_link_datagrams_total',
+        "Number of datagrams sent to server's Device Link")
+    timeout_count = ServerMetric(
+        'counter', 'minic_device_link_timeouts_total',
+        "Number of timed out Device Link requests")
+
+    @property
+    def pending(self):
+        """
+        Number of commands waiting for answers.
+        """
+        return len(self._requests)
+
+    def _make_request(self, opcode, timeout):
+
+        def on_timeout():
+            self.timeout_count.inc()
+            LOG.error("Device Link request \"{0}\" is timed out".format(
+                      opcode))
+            self._requests.remove(request)
+            deferred.errback(defer.TimeoutError(
+                "Device Link request \"{0}\" is timed out".format(opcode)))
+
+        def clean_up(value):
+            if watchdog.active():
+                watchdog.cancel()
+            return value
+
+        deferred = defer.Deferred()
+        deferred.addBoth(clean_up).addErrback(
+            lambda failure: failure.trap(defer.CancelledError))
+        watchdog = self._get_clock().callLater(
+            timeout, lambda: deferred.called or on_timeout())
+
+        request = DeviceLinkRequest(opcode, deferred, watchdog)
+        self._requests.append(request)
+        return request
+
+    def send_requests(self, requests, address=None):
+        self.datagram_count.inc()
+        BaseDeviceLinkClient.send_requests(self, requests, address)
+
+    @defer.inlineCallbacks
+    def deferred_requests(self, commands, timeout=None):
+        """
+        Send commands in as few datagrams as possible. The next datagram is
+        sent after the previous one is answered, so server is never flooded.
+
+        Output:
+        Deferred which fires with a list of answers to commands which have
+        them, in order of commands.
+        """
+        timeout = timeout or self.timeout
+        step = self.cmd_group_max_size
+        results = []
+
+        for start in xrange(0, len(commands), step):
+            group = commands[start:start + step]
+            dlist = [
+                self._make_request(command.opcode, timeout).deferred
+                for command in group
+                if command.opcode not in NO_ANSWER_OPCODES
+            ]
+            self.send_requests(group)
+            answers = yield defer.gatherResults(
+                dlist, consumeErrors=True).addErrback(
+                lambda failure: failure.value.subFailure)
+            results.extend(answers)
+
+        defer.returnValue(results)
+
+
+class ReconnectingConsoleClientFactory(BaseReconnectingConsoleClientFactory,
+                                       ClockMixin):
+    """
+    Factory of pipelining console clients with support of reconnection.
+
+    The first reconnection attempt is made after `fast_delay`, later delays
+    grow by `factor` from `initialDelay` up to `maxDelay`. If `probe` is set,
+    it is called before every attempt and console connection is attempted
+    only if probe succeeds or if `probe_limit` probes in a row failed.
+    """
+    fast_delay = RECONNECT_FAST_DELAY
+    initialDelay = RECONNECT_INITIAL_DELAY
+    maxDelay = RECONNECT_MAX_DELAY
+    factor = RECONNECT_FACTOR
+    jitter = RECONNECT_JITTER
+    probe_limit = RECONNECT_PROBE_LIMIT
+
+    #: A callable which returns deferred. Deferred must fire if server is
+    #: reachable and fail otherwise
+    probe = None
+
+    #: Labels of metrics, e.g. name of server
+    metric_labels = None
+
+    reconnect_time = ServerMetric(
+        'histogram', 'minic_reconnect_seconds',
+        "Time from loss of connection with console until it is restored")
+    probe_failure_count = ServerMetric(
+        'counter', 'minic_reconnect_probe_failures_total',
+        "Number of probes of server which were not answered")
+
+    def __init__(self, parser=None, timeout=None, timeouts=None):
+        BaseReconnectingConsoleClientFactory.__init__(self, parser, timeout)
+        self.timeouts = timeouts
+        self.lost_at = None
+        self._probe_failures = 0
+
+    def buildProtocol(self, addr):
+        client = ConsoleClient(self.parser, self.timeout, self.timeouts)
+        client.factory = self
+        return client
+
+    def clientConnectionMade(self, client):
+        if self.lost_at is not None:
+            duration = self._get_clock().seconds() - self.lost_at
+            self.lost_at = None
+            self.reconnect_time.observe(duration)
+            LOG.info("Connection with server is restored in {0:.1f} s".format(
+                     duration))
+        BaseReconnectingConsoleClientFactory.clientConnectionMade(self, client)
+
+    def clientConnectionLost(self, connector, reason):
+        if self.continueTrying:
+            self.lost_at = self._get_clock().seconds()
+        BaseReconnectingConsoleClientFactory.clientConnectionLost(
+            self, connector, reason)
+
+    def resetDelay(self):
+        BaseReconnectingConsoleClientFactory.resetDelay(self)
+        self._probe_failures = 0
+
+    def get_delay(self, retries):
+        """
+        Get delay before connection attempt which follows given number of
+        failed attempts.
+        """
+        if retries == 0:
+            delay = self.fast_delay
+        else:
+            exponent = min(retries - 1, 64)
+            delay = min(self.initialDelay * self.factor ** exponent,
+                        self.maxDelay)
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+    def retry(self, connector=None):
+        if not self.continueTrying:
+            return
+        connector = connector or self.connector
+
+        self.delay = self.get_delay(self.retries)
+        self.retries += 1
+        if self.maxRetries is not None and self.retries > self.maxRetries:
+            LOG.error("Giving up reconnection after {0} attempts".format(
+                      self.maxRetries))
+            return
+
+        LOG.info("Reconnecting in {0:.1f} s".format(self.delay))
+        self._callID = self._get_clock().callLater(self.delay, self._reconnect,
+                                                   connector)
+
+    def _reconnect(self, connector):
+        self._callID = None
+        if self.probe is None or self._probe_failures >= self.probe_limit:
+            self._probe_failures = 0
+            connector.connect()
+        else:
+            self.probe().addCallbacks(
+                self._on_probe_succeeded, self._on_probe_failed,
+                callbackArgs=(connector, ), errbackArgs=(connector, ))
+
+    def _on_probe_succeeded(self, unused, connector):
+        self._probe_failures = 0
+        if self.continueTrying:
+            connector.connect()
+
+    def _on_probe_failed(self, failure, connector):
+        self._probe_failures += 1
+        self.probe_failure_count.inc()
+        LOG.debug("Server did not answer to probe: {0}".format(
+                  failure.getErrorMessage()))
+        self.retry(connector)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Policies which choose missions to rotate.
+"""
+import random
+import tx_logging
+
+from collections import namedtuple
+
+from minic.settings import ROTATION_NO_REPEAT, ROTATION_SCHEDULER
+
+
+LOG = tx_logging.getLogger(__name__)
+
+RotationContext = namedtuple('RotationContext', field_names=[
+    'now', 'pilots', 'recent_ids',
+])
+
+
+def is_rule_matched(rule, context):
+    """
+    Check whether mission with given rule can be played in given context.
+    Conditions which cannot be checked (e.g. pilots count is unknown) are
+    ignored.
+    """
+    if rule.weight <= 0:
+        return False
+
+    if rule.hours is not None and context.now is not None:
+        start, end = rule.hours
+        hour = context.now.hour + context.now.minute / 60.0
+        if start <= end:
+            if not start <= hour < end:
+                return False
+        elif end <= hour < start:
+            # Window crosses midnight, e.g. from 22 to 6
+            return False
+
+    if context.pilots is not None:
+        if context.pilots < rule.min_pilots:
+            return False
+        if rule.max_pilots is not None and context.pilots > rule.max_pilots:
+            return False
+    return True
+
+
+class RoundRobinScheduler(object):
+    """
+    Missions are played in order of the list.
+    """
+
+    def candidates(self, missions, current_id, context):
+        """
+        Get missions which can follow current one in order of preference.
+        The first one which file can be read is played.
+
+        Input:
+        `missions`      # `MissionList` instance.
+        `current_id`    # ID of current mission.
+        `context`       # `RotationContext` instance.
+
+        Output:
+        An iterable of `Mission` instances.
+        """
+        count = missions.count()
+        index = missions.get_index_by_id(current_id)
+        for i in xrange(1, count + 1):
+            yield missions.get(missions.get_id_by_index((index + i) % count))
+
+
+class WeightedScheduler(RoundRobinScheduler):
+    """
+    Missions are chosen randomly in proportion to weights of their rules
+    among ones which rules allow to play them at current time and with
+    current number of pilots. Recently played missions are not repeated
+    while there are others to choose from. If no mission matches, missions
+    are played in order of the list.
+    """
+    no_repeat = ROTATION_NO_REPEAT
+
+    def __init__(self, random_generator=None):
+        self.random = random_generator or random.Random()
+
+    def candidates(self, missions, current_id, context):
+        recent_ids = set(context.recent_ids[-self.no_repeat:]
+                         if self.no_repeat else [])
+        recent_ids.add(current_id)
+
+        matched = []
+        for mission in missions.all():
+            rule = missions.get_rule(mission.id)
+            if is_rule_matched(rule, context):
+                matched.append((mission, rule.weight))
+
+        fresh = [x for x in matched if x[0].id not in recent_ids]
+        ordered = self._shuffle(fresh) + self._shuffle(
+            [x for x in matched if x[0].id in recent_ids])
+
+        seen = set()
+        for mission in ordered:
+            seen.add(mission.id)
+            yield mission
+
+        # Fall back to the list order to play at least something
+        for mission in RoundRobinScheduler.candidates(
+            self, missions, current_id, context
+        ):
+            if mission.id not in seen:
+                yield mission
+
+    def _shuffle(self, items):
+        """
+        Order items randomly so that items with greater weights tend to come
+        first (weighted sampling without replacement).
+        """
+        keys = [
+            (self.random.random() ** (1.0 / weight), mission)
+            for mission, weight in items
+        ]
+        keys.sort(key=lambda x: x[0], reverse=True)
+        return [mission for unused, mission in keys]
+
+
+#: Available schedulers keyed by names
+SCHEDULERS = {
+    'round_robin': RoundRobinScheduler,
+    'weighted': WeightedScheduler,
+}
+
+
+def get_scheduler(name=None):
+    """
+    Create scheduler with given name. Default one is created if name is not
+    set or is unknown.
+    """
+    name = name or ROTATION_SCHEDULER
+    if name not in SCHEDULERS:
+        LOG.error("Unknown rotation scheduler: {0}".format(name))
+        name = ROTATION_SCHEDULER
+    return SCHEDULERS[name]()
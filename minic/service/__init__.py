@@ -1,25 +1,28 @@
 # -*- coding: utf-8 -*-
+import functools
+import os
 import tx_logging
 
 from collections import namedtuple
 
-from il2ds_middleware.parser import (
-    ConsoleParser, DeviceLinkParser, EventLogParser,
-)
-from il2ds_middleware.protocol import (
-    DeviceLinkClient, ReconnectingConsoleClientFactory,
-)
 from il2ds_middleware.service import (
-    LogWatchingService, ClientServiceMixin as BaseClientServiceMixin,
+    ClientServiceMixin as BaseClientServiceMixin,
 )
 
 from twisted.application.service import MultiService, Service
-from twisted.internet import defer
+from twisted.internet import defer, task
 
+from minic import profiling
+from minic.bus import EventBus
+from minic.constants import BUS_TOPIC, CHAT_PRIORITY, CONNECTION_STATE
+from minic.metrics import ServerMetric, metrics
+from minic.models import MissionList, MissionManager
 from minic.settings import (
-    server_settings, CONSOLE_TIMEOUT, DEVICE_LINK_TIMEOUT,
+    server_settings, user_settings, ServerSettings, CONSOLE_TIMEOUT,
+    CONSOLE_TIMEOUTS, DEVICE_LINK_TIMEOUT, RECONNECT_PROBE_TIMEOUT,
+    SERVER_SETTINGS_WATCH_INTERVAL, STATS_FILE_NAME,
 )
-from minic.util import ugettext_lazy as _
+from minic.util import ClockMixin, ugettext_lazy as _
 
 
 LOG = tx_logging.getLogger(__name__)
@@ -27,10 +30,28 @@ LOG = tx_logging.getLogger(__name__)
 
 class ClientServiceMixin(BaseClientServiceMixin):
 
+    @staticmethod
+    def radar_refresher(func):
+        """
+        Decorator which asks radar service to refresh radar after some method
+        is called. Requests are coalesced, so bursts of calls cause a single
+        refresh.
+        """
+        @functools.wraps(func)
+        def decorator(self, *args, **kwargs):
+            result = func(self, *args, **kwargs)
+            self.radar.request_refresh()
+            return result
+        return decorator
+
     @property
     def cl_client(self):
         return self.parent.cl_client
 
+    @property
+    def metric_labels(self):
+        return getattr(self.parent, 'metric_labels', None)
+
     @property
     def dl_client(self):
         return self.parent.dl_client
@@ -39,72 +60,280 @@ class ClientServiceMixin(BaseClientServiceMixin):
     def connection_was_lost(self):
         return self.parent.connection_was_lost
 
+    @property
+    def bus(self):
+        return self.parent.bus
+
+    @property
+    def chat(self):
+        return self.parent.services.chat
+
+    @property
+    def pilots(self):
+        return self.parent.services.pilots
+
+    @property
+    def stats(self):
+        return self.parent.services.stats
+
+    @property
+    def radar(self):
+        return self.parent.services.radar
+
+    @property
+    def user_settings(self):
+        return self.parent.user_settings
+
+    @property
+    def server_settings(self):
+        return self.parent.server_settings
+
+    @property
+    def mission_manager(self):
+        return self.parent.mission_manager
+
 
 class CommanderService(MultiService, ClientServiceMixin):
 
-    def __init__(self):
+    def __init__(self, clock=None):
+        """
+        Input:
+        `clock`     # reactor-like object for all services to schedule calls
+                    # with. Reactor is used if not set.
+        """
         MultiService.__init__(self)
 
+        # Init chat service ----------------------------------------------------
+        # Must be started before and stopped after other services, so they can
+        # chat while starting and stopping
+        from minic.service.chat import ChatService
+        chat = ChatService()
+        chat.setServiceParent(self)
+
         # Init pilots service --------------------------------------------------
         from minic.service.pilots import PilotsService
         pilots = PilotsService()
         pilots.setServiceParent(self)
 
+        # Init statistics service ----------------------------------------------
+        from minic.service.stats import StatsService
+        stats = StatsService()
+        stats.setServiceParent(self)
+
+        # Init radar service ---------------------------------------------------
+        from minic.service.radar import RadarService
+        radar = RadarService()
+        radar.setServiceParent(self)
+
         # Init objects service -------------------------------------------------
         from minic.service.objects import ObjectsService
         objects = ObjectsService()
         objects.setServiceParent(self)
 
         # Init missions service ------------------------------------------------
+        from minic.service.eventlog import EventLogWatchingService
         from minic.service.missions import MissionsService
-        log_watcher = LogWatchingService()
+        log_watcher = EventLogWatchingService()
         missions = MissionsService(log_watcher)
-        log_parser = EventLogParser((pilots, objects, missions, ))
-        log_watcher.set_parser(log_parser)
         missions.setServiceParent(self)
 
-        # Init console and DeviceLink parsers ----------------------------------
+        # Init parsers ---------------------------------------------------------
+        from il2ds_middleware.parser import ConsoleParser, DeviceLinkParser
+        from minic.parser import EventLogParser
         console_parser = ConsoleParser((pilots, missions, ))
         device_link_parser = DeviceLinkParser()
-        log_parser = EventLogParser((pilots, objects, missions, ))
+        log_parser = EventLogParser((pilots, stats, objects, missions, ))
+        log_watcher.set_parser(log_parser)
 
         # Group parsers and services -------------------------------------------
         self.parsers = namedtuple(
             'commander_parsers', ['console', 'device_link', 'log'])(
             console_parser, device_link_parser, log_parser)
         self.services = namedtuple(
-            'commander_services', ['pilots', 'objects', 'missions'])(
-            pilots, objects, missions)
+            'commander_services',
+            ['chat', 'pilots', 'stats', 'radar', 'objects', 'missions'])(
+            chat, pilots, stats, radar, objects, missions)
+
+        # Share clock ----------------------------------------------------------
+        for service in self:
+            if isinstance(service, ClockMixin):
+                service.clock = clock
+        log_watcher.clock = clock
+
+    def register_collectors(self, labels=None):
+        """
+        Export counters of parsers and services as metrics.
+        """
+        log_parser = self.parsers.log
+        chat = self.services.chat
+        pilots = self.services.pilots
+        stats = self.services.stats
+        radar = self.services.radar
+        metrics.register_collector(
+            'minic_eventlog_lines_total', lambda: log_parser.lines_count,
+            kind='counter', description="Number of parsed events log lines",
+            labels=labels)
+        metrics.register_collector(
+            'minic_eventlog_events_total',
+            lambda: sum(log_parser.events_count.values()),
+            kind='counter', description="Number of recognized events",
+            labels=labels)
+        metrics.register_collector(
+            'minic_chat_queue_size', lambda: chat.size,
+            description="Number of chat messages waiting to be sent",
+            labels=labels)
+        metrics.register_collector(
+            'minic_pilots_online', lambda: pilots.count,
+            description="Number of pilots on server", labels=labels)
+        metrics.register_collector(
+            'minic_pilots_in_flight', lambda: pilots.in_flight_count,
+            description="Number of pilots in flight", labels=labels)
+        metrics.register_collector(
+            'minic_stats_pending_events', lambda: len(stats.store),
+            description="Number of events not written to statistics yet",
+            labels=labels)
+        metrics.register_collector(
+            'minic_radar_period_seconds', lambda: radar.period,
+            description="Current period between polls of positions",
+            labels=labels)
+        metrics.register_collector(
+            'minic_radar_snapshot_version', lambda: radar.snapshot.version,
+            description="Number of polls of positions since connection",
+            labels=labels)
+        metrics.register_collector(
+            'minic_radar_age_seconds', lambda: radar.age or 0,
+            description="Seconds since positions were polled last time",
+            labels=labels)
+        metrics.register_collector(
+            'minic_radar_refresh_requests_total',
+            lambda: radar.refresh_requests, kind='counter',
+            description="Number of requests to refresh radar", labels=labels)
+        metrics.register_collector(
+            'minic_radar_refreshes_saved_total',
+            lambda: radar.refreshes_saved, kind='counter',
+            description="Number of radar refresh requests served by polls "
+                        "made for other ones", labels=labels)
 
     def startService(self):
-        self.services.missions.log_watcher.log_path = server_settings.log_path
+        log_watcher = self.services.missions.log_watcher
+        log_watcher.log_path = self.server_settings.get('log_path')
+        log_watcher.settings = self.user_settings
         MultiService.startService(self)
-        self.cl_client.chat_all(
-            _("Hello! Minicommander takes control over this server."))
+        self.services.chat.chat_all(
+            _("Hello! Minicommander takes control over this server."),
+            priority=CHAT_PRIORITY.INFO)
+
+    @defer.inlineCallbacks
+    def set_log_path(self, log_path):
+        """
+        Watch events log at given path. Watching is restarted if it is in
+        progress.
+        """
+        log_watcher = self.services.missions.log_watcher
+        if log_watcher.log_path == log_path:
+            return
+        watching = log_watcher.log_file is not None
+        if watching:
+            yield log_watcher.stopService()
+        log_watcher.log_path = log_path
+        if watching:
+            log_watcher.startService()
 
     @defer.inlineCallbacks
     def stopService(self):
         if self.parent.is_connected:
-            self.cl_client.chat_all(_("Minicommander quits. Good bye!"))
+            self.services.chat.chat_all(_("Minicommander quits. Good bye!"),
+                                        priority=CHAT_PRIORITY.INFO)
         yield MultiService.stopService(self)
 
 
-class RootService(Service):
+class RootService(Service, ClockMixin):
+    """
+    Connection with a single game server. Any number of root services can
+    run on the same reactor, each with its own user settings.
+    """
 
     dl_client = None
     cl_client = None
     connection_was_lost = False
+    settings_watch_interval = SERVER_SETTINGS_WATCH_INTERVAL
+
+    connection_count = ServerMetric(
+        'counter', 'minic_connections_total',
+        "Number of established connections with server's console")
+    lost_connection_count = ServerMetric(
+        'counter', 'minic_connections_lost_total',
+        "Number of unexpectedly lost connections with server's console")
+    settings_reload_count = ServerMetric(
+        'counter', 'minic_server_settings_reloads_total',
+        "Number of times changed server's config was applied")
+
+    def __init__(self, settings=None, name=None, clock=None):
+        """
+        Input:
+        `settings`      # user settings which hold path to server and its
+                        # missions. Global user settings are used by default.
+        `name`          # name of server which tells it apart from others in
+                        # logs and metrics.
+        `clock`         # reactor-like object to schedule calls with, e.g.
+                        # a virtual clock of replay. Reactor is used if not
+                        # set.
+        """
+        self.name = name
+        self.clock = clock
+        if settings is None:
+            self.user_settings = user_settings
+            self.server_settings = server_settings
+            self.mission_manager = MissionManager
+        else:
+            self.user_settings = settings
+            self.server_settings = ServerSettings(settings)
+            self.mission_manager = MissionList(settings)
+        self.metric_labels = {'server': name, } if name else None
+        #: Event bus which services of this server publish their state to
+        self.bus = EventBus()
+        self.bus.clock = clock
+        self.bus.metric_labels = self.metric_labels
 
-    def __init__(self):
         self.cl_connector = None
         self.dl_connector = None
+        self._settings_watcher = None
 
         self.cb_connection_done = None
         self.cb_connection_closed = None
         self.cb_connection_lost = None
 
-        self.commander = CommanderService()
+        self.commander = CommanderService(clock)
         self.commander.parent = self
+        self.commander.register_collectors(self.metric_labels)
+
+    @property
+    def stats_path(self):
+        """
+        Path to database with statistics of this server.
+        """
+        file_name = STATS_FILE_NAME
+        if self.name:
+            file_name = "{0}-{1}".format(self.name, file_name)
+        return os.path.join(self.user_settings.root, file_name)
+
+    def unregister_metrics(self):
+        """
+        Remove metrics and collectors of this server, e.g. when it is not
+        managed anymore.
+        """
+        metrics.unregister_labels(self.metric_labels)
+
+    @property
+    def pilots_count(self):
+        """
+        Number of pilots on server as it is known without asking server.
+        """
+        return self.commander.services.pilots.count
+
+    @property
+    def pilots_in_flight_count(self):
+        return self.commander.services.pilots.in_flight_count
 
     def set_callbacks(self,
                       on_connection_done=None,
@@ -117,25 +346,54 @@ class RootService(Service):
         self.cb_connection_lost = on_connection_lost
 
     def startService(self):
+        # Clients are not needed until connection is requested
+        from minic.protocol import (
+            DeviceLinkClient, ReconnectingConsoleClientFactory,
+        )
+
+        server_settings = self.server_settings
         server_settings.load()
+        self.commander.services.stats.store.path = self.stats_path
 
         # Prepare Device Link client -------------------------------------------
         self.dl_client = DeviceLinkClient(
             address=(server_settings.dl_host, server_settings.dl_port),
             parser=self.commander.parsers.device_link,
-            timeout=CONSOLE_TIMEOUT)
+            timeout=DEVICE_LINK_TIMEOUT)
+        self.dl_client.clock = self.clock
+        self.dl_client.metric_labels = self.metric_labels
         self.dl_client.on_start.addCallback(self.start_console_connection)
 
         # Prepare for connection with server -----------------------------------
         self.client_factory = ReconnectingConsoleClientFactory(
             parser=self.commander.parsers.console,
-            timeout=DEVICE_LINK_TIMEOUT)
+            timeout=CONSOLE_TIMEOUT, timeouts=CONSOLE_TIMEOUTS)
+        self.client_factory.probe = self.probe_server
+        self.client_factory.clock = self.clock
+        self.client_factory.metric_labels = self.metric_labels
+        metrics.register_collector(
+            'minic_reconnect_retries', lambda: self.client_factory.retries,
+            description="Number of current reconnection attempts",
+            labels=self.metric_labels)
+        metrics.register_collector(
+            'minic_console_pending_commands',
+            lambda: self.cl_client.pending if self.cl_client else 0,
+            description="Number of console commands waiting for output",
+            labels=self.metric_labels)
+
+        self.listen_device_link()
+
+        # Apply changes of server's config while running -----------------------
+        self._settings_watcher = task.LoopingCall(self.reload_server_settings)
+        self._settings_watcher.clock = self._get_clock()
+        self._settings_watcher.start(self.settings_watch_interval, now=False)
+
+        Service.startService(self)
 
+    def listen_device_link(self):
         from twisted.internet import reactor
         self.dl_connector = reactor.listenUDP(0, self.dl_client)
 
-        Service.startService(self)
-
     def start_console_connection(self, dl_client):
         """
         Start reliable connection to game server's console with reconnectinon
@@ -144,10 +402,17 @@ class RootService(Service):
         self._update_connection_callbacks()
 
         from twisted.internet import reactor
-        self.cl_connector = reactor.connectTCP(server_settings.cl_host,
-                                               server_settings.cl_port,
+        self.cl_connector = reactor.connectTCP(self.server_settings.cl_host,
+                                               self.server_settings.cl_port,
                                                self.client_factory)
 
+    def probe_server(self):
+        """
+        Check whether server is up by requesting pilots count via Device Link,
+        which is cheaper than connecting to server's console.
+        """
+        return self.dl_client.pilot_count(RECONNECT_PROBE_TIMEOUT)
+
     @defer.inlineCallbacks
     def stopService(self):
         """
@@ -157,6 +422,11 @@ class RootService(Service):
         if not self.running:
             defer.returnValue(None)
 
+        if self._settings_watcher is not None:
+            if self._settings_watcher.running:
+                self._settings_watcher.stop()
+            self._settings_watcher = None
+
         # Stop commander service if running ------------------------------------
         if self.commander.running:
             yield self.commander.stopService()
@@ -170,8 +440,85 @@ class RootService(Service):
             self.client_factory.stopTrying()
             self.cl_connector.disconnect()
 
+        # Write pending changes of user settings -------------------------------
+        self.user_settings.flush()
+
         yield Service.stopService(self)
 
+    def reload_server_settings(self):
+        """
+        Apply changes of server's config. Only parts which depend on changed
+        settings are restarted: Device Link listener, console connection or
+        events log watcher.
+
+        Output:
+        Deferred which fires with a set of names of changed settings.
+        """
+        try:
+            changed = self.server_settings.load()
+        except Exception as e:
+            LOG.error("Failed to reload server settings: {0}".format(
+                      unicode(e)))
+            return defer.succeed(set())
+        if not changed:
+            return defer.succeed(changed)
+
+        self.settings_reload_count.inc()
+        LOG.info("Server settings have changed: {0}".format(
+                 ", ".join(sorted(changed))))
+
+        results = []
+        if changed & {'dl_host', 'dl_port', }:
+            results.append(self._restart_device_link())
+        if changed & {'cl_host', 'cl_port', }:
+            self._restart_console_connection()
+        if 'log_path' in changed:
+            results.append(self.commander.set_log_path(
+                           self.server_settings.log_path))
+
+        d = defer.gatherResults(results, consumeErrors=True)
+        d.addErrback(lambda failure: LOG.error(
+            "Failed to apply server settings: {0}".format(
+                failure.value.subFailure.getErrorMessage())))
+        return d.addCallback(lambda unused: changed)
+
+    @defer.inlineCallbacks
+    def _restart_device_link(self):
+        """
+        Bind Device Link client to a new UDP port and send its requests to a
+        new address. Pending requests are cancelled. Address is not changed if
+        new host cannot be resolved.
+        """
+        server_settings = self.server_settings
+        host = yield self._resolve(server_settings.dl_host)
+        self.dl_client.address = (host, server_settings.dl_port)
+        # Protocol must be stopped by old port before new port starts it
+        yield defer.maybeDeferred(self.dl_connector.stopListening)
+        if self.running:
+            self.listen_device_link()
+            self.commander.services.radar.request_refresh()
+
+    def _resolve(self, host):
+        """
+        Get IP address of given host without blocking the reactor.
+
+        Output:
+        Deferred which fires with IP address.
+        """
+        from twisted.internet import reactor
+        return reactor.resolve(host)
+
+    def _restart_console_connection(self):
+        """
+        Drop connection with server's console, so it is reestablished with
+        a new address.
+        """
+        if self.cl_connector is None:
+            return
+        self.cl_connector.host = self.server_settings.cl_host
+        self.cl_connector.port = self.server_settings.cl_port
+        self.cl_connector.disconnect()
+
     def _update_connection_callbacks(self):
         """
         Update callbacks which are called after the connection with game
@@ -203,12 +550,18 @@ class RootService(Service):
         This method is called after the connection with server's console is
         established. Main work starts from here.
         """
+        self.connection_count.inc()
         self.cl_client = client
         self.commander.startService()
+        self.bus.publish(BUS_TOPIC.CONNECTION, CONNECTION_STATE.CONNECTED)
+
+        profiling.mark("connection is established")
+        profiling.report()
 
     def on_connection_closed(self, unused):
         self.cl_client = None
         self.connection_was_lost = False
+        self.bus.publish(BUS_TOPIC.CONNECTION, CONNECTION_STATE.CLOSED)
 
     @defer.inlineCallbacks
     def on_connection_lost(self, reason):
@@ -216,10 +569,12 @@ class RootService(Service):
         This method is called after the connection with server's console is
         lost. Stop every work and clean up resources.
         """
+        self.lost_connection_count.inc()
         self.cl_client = None
         self.connection_was_lost = True
         self._update_connection_callbacks()
         yield self.commander.stopService()
+        self.bus.publish(BUS_TOPIC.CONNECTION, CONNECTION_STATE.LOST)
         defer.returnValue(reason)
 
     @property
@@ -227,4 +582,15 @@ class RootService(Service):
         return self.cl_client is not None
 
 
-root_service = RootService()
+_root_service = None
+
+
+def get_root_service():
+    """
+    Get connection with the default server. It is created on first call, so
+    importing this module does not build the whole commander.
+    """
+    global _root_service
+    if _root_service is None:
+        _root_service = RootService()
+    return _root_service
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Commander's outbound chat.
+"""
+import math
+import tx_logging
+
+from collections import deque, namedtuple
+
+from il2ds_middleware.constants import CHAT_MAX_LENGTH
+
+from twisted.application.service import Service
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+from minic.constants import CHAT_PRIORITY
+from minic.metrics import ServerMetric
+from minic.service import ClientServiceMixin
+from minic.settings import CHAT_BURST, CHAT_MAX_QUEUE_SIZE, CHAT_RATE
+from minic.util import ClockMixin
+
+
+LOG = tx_logging.getLogger(__name__)
+
+
+ChatMessage = namedtuple('ChatMessage',
+                         field_names=['text', 'key', 'created'])
+
+
+@implementer(IPushProducer)
+class ChatService(Service, ClientServiceMixin, ClockMixin):
+    """
+    Queue of chat messages for all users. Messages are sent to server's
+    console no faster than `rate` lines per second with bursts of up to
+    `burst` lines (token bucket). While messages wait in queue:
+
+    - messages with higher priority overtake ones with lower priority;
+    - a message replaces a queued one with the same key;
+    - consecutive messages with the same priority are merged into a single
+      line if they fit into it;
+    - the oldest messages with the lowest priority are dropped if there are
+      more than `max_size` messages.
+
+    Sending is paused while console's transport asks producer to pause.
+    """
+    rate = CHAT_RATE
+    burst = CHAT_BURST
+    max_size = CHAT_MAX_QUEUE_SIZE
+
+    send_time = ServerMetric(
+        'histogram', 'minic_chat_send_latency_seconds',
+        "Time chat messages spend in queue before they are sent")
+    line_count = ServerMetric(
+        'counter', 'minic_chat_lines_total',
+        "Number of chat lines sent to server's console")
+    coalesced_count = ServerMetric(
+        'counter', 'minic_chat_coalesced_total',
+        "Number of chat messages merged into other messages or replaced by "
+        "them")
+    dropped_count = ServerMetric(
+        'counter', 'minic_chat_dropped_total',
+        "Number of chat messages dropped due to queue overflow or "
+        "disconnection")
+
+    def __init__(self):
+        self._queues = dict(
+            (priority, deque())
+            for priority in (CHAT_PRIORITY.STATUS, CHAT_PRIORITY.INFO))
+        self._tokens = self.burst
+        self._updated = None
+        self._delayed_drain = None
+        self._paused = False
+        self._transport = None
+
+    def startService(self):
+        self._tokens = self.burst
+        self._updated = self._get_clock().seconds()
+        self._paused = False
+
+        transport = getattr(self.cl_client, 'transport', None)
+        if transport is not None:
+            try:
+                transport.registerProducer(self, True)
+            except RuntimeError as e:
+                LOG.error("Failed to register chat as console producer: "
+                          "{0}".format(unicode(e)))
+            else:
+                self._transport = transport
+        Service.startService(self)
+
+    def stopService(self):
+        """
+        Send everything what is left ignoring rate limit.
+        """
+        self._cancel_drain()
+        if self.cl_client is not None:
+            self._tokens = float('inf')
+            self._paused = False
+            self._drain()
+        self.clear()
+
+        if self._transport is not None:
+            self._transport.unregisterProducer()
+            self._transport = None
+        return Service.stopService(self)
+
+    def chat_all(self, message, priority=CHAT_PRIORITY.STATUS, key=None):
+        """
+        Put message to queue.
+
+        Input:
+        `message`       # a string to send.
+        `priority`      # one of `CHAT_PRIORITY` values.
+        `key`           # key of message, e.g. 'mission_status'. Queued message
+                        # with the same key is replaced with the new one.
+        """
+        queue = self._queues[priority]
+        if key is not None:
+            for i, queued in enumerate(queue):
+                if queued.key == key:
+                    del queue[i]
+                    self.coalesced_count.inc()
+                    break
+
+        queue.append(ChatMessage(unicode(message), key,
+                                 self._get_clock().seconds()))
+        self._trim()
+        self._drain()
+
+    @property
+    def size(self):
+        return sum(len(queue) for queue in self._queues.itervalues())
+
+    def clear(self):
+        dropped = self.size
+        if dropped:
+            self.dropped_count.inc(dropped)
+        for queue in self._queues.itervalues():
+            queue.clear()
+
+    def _trim(self):
+        while self.size > self.max_size:
+            for priority in sorted(self._queues, reverse=True):
+                if self._queues[priority]:
+                    self._queues[priority].popleft()
+                    self.dropped_count.inc()
+                    break
+
+    def _refill(self):
+        now = self._get_clock().seconds()
+        if self._updated is not None:
+            self._tokens = min(
+                self._tokens + (now - self._updated) * self.rate,
+                max(self.burst, self._tokens))
+        self._updated = now
+        return now
+
+    def _pop_line(self):
+        """
+        Pop the next line to send. Consecutive messages of the same priority
+        are merged while they fit into a single chat line.
+        """
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            if not queue:
+                continue
+
+            messages = [queue.popleft(), ]
+            length = len(messages[0].text)
+            while queue and length + 1 + len(queue[0].text) <= CHAT_MAX_LENGTH:
+                messages.append(queue.popleft())
+                length += 1 + len(messages[-1].text)
+            self.coalesced_count.inc(len(messages) - 1)
+            return messages
+
+    def _drain(self):
+        if self._delayed_drain is not None or self._paused:
+            return
+
+        client = self.cl_client
+        if client is None:
+            self.clear()
+            return
+
+        now = self._refill()
+        while self.size:
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self._delayed_drain = self._get_clock().callLater(
+                    delay, self._on_delayed_drain)
+                return
+
+            messages = self._pop_line()
+            text = u' '.join(m.text for m in messages)
+            client.chat_all(text)
+
+            lines = int(math.ceil(len(text) / float(CHAT_MAX_LENGTH))) or 1
+            self._tokens -= lines
+            self.line_count.inc(lines)
+            for message in messages:
+                self.send_time.observe(now - message.created)
+
+            if self._paused:
+                return
+
+    def _on_delayed_drain(self):
+        self._delayed_drain = None
+        self._drain()
+
+    def _cancel_drain(self):
+        if self._delayed_drain is not None:
+            if self._delayed_drain.active():
+                self._delayed_drain.cancel()
+            self._delayed_drain = None
+
+    # IPushProducer ------------------------------------------------------------
+
+    def pauseProducing(self):
+        self._paused = True
+        self._cancel_drain()
+
+    def resumeProducing(self):
+        self._paused = False
+        self._drain()
+
+    def stopProducing(self):
+        self._paused = True
+        self._cancel_drain()
+        self.clear()
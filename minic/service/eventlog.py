@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Commander's events log watcher.
+"""
+import io
+import os
+import time
+import tx_logging
+
+from il2ds_middleware.service import LogWatchingService
+
+from twisted.application.internet import TimerService
+
+from minic.settings import (
+    user_settings, EVENT_LOG_CHUNK_SIZE, EVENT_LOG_MAX_CHUNKS,
+    EVENT_LOG_SAVE_PERIOD,
+)
+
+
+LOG = tx_logging.getLogger(__name__)
+
+
+class EventLogWatchingService(LogWatchingService):
+    """
+    Events log watcher which reads new data in large chunks starting from the
+    last known position. Position is kept in user settings, so it survives
+    reconnections and restarts. Truncation and rotation of log file are
+    detected by comparing its inode and size with known ones.
+    """
+    chunk_size = EVENT_LOG_CHUNK_SIZE
+    max_chunks = EVENT_LOG_MAX_CHUNKS
+    save_period = EVENT_LOG_SAVE_PERIOD
+    #: User settings to keep position in. Global user settings are used if
+    #: not set
+    settings = None
+
+    def __init__(self, log_path=None, period=1, parser=None):
+        self.inode = None
+        self._tail = ''
+        self._saved_state = None
+        self._last_save_time = 0
+        LogWatchingService.__init__(self, log_path, period, parser)
+
+    def startService(self):
+        if self.log_file is not None or self.log_path is None:
+            return
+        if not self._open():
+            return
+        self.log_file.seek(self._get_start_offset())
+        TimerService.startService(self)
+
+    def stopService(self):
+        if self.log_file is not None:
+            self._save_state()
+        return LogWatchingService.stopService(self)
+
+    def do_watch(self):
+        """
+        Log reading callback. Reads at most `max_chunks` chunks, so huge
+        amount of new data does not block reactor for too long.
+        """
+        if self._is_rotated():
+            LOG.info("Events log was rotated or truncated, reopening it.")
+            self.log_file.close()
+            if not self._open():
+                return
+
+        for i in xrange(self.max_chunks):
+            chunk = self.log_file.read(self.chunk_size)
+            if chunk:
+                self._got_chunk(chunk)
+            if len(chunk) < self.chunk_size:
+                break
+
+        if time.time() - self._last_save_time >= self.save_period:
+            self._save_state()
+
+    def _open(self):
+        try:
+            self.log_file = io.open(self.log_path, 'rb')
+        except IOError as e:
+            LOG.error("Failed to open events log: {0}.".format(e))
+            self.log_file = None
+            return False
+        self.inode = os.fstat(self.log_file.fileno()).st_ino
+        self._tail = ''
+        return True
+
+    def _get_start_offset(self):
+        """
+        Get position to start reading from. It is the saved one if it belongs
+        to the same file, or the end of file otherwise. Old events are never
+        re-read.
+        """
+        size = os.fstat(self.log_file.fileno()).st_size
+        state = self._load_state() or {}
+        if (
+            state.get('path') == self.log_path
+            and state.get('inode') == self.inode
+            and state.get('offset', 0) <= size
+        ):
+            return state['offset']
+        return size
+
+    def _is_rotated(self):
+        try:
+            stat = self._stat()
+        except OSError:
+            # File may be missing for a while during rotation
+            return False
+        if stat.st_size < self.log_file.tell():
+            return True
+        inode = stat.st_ino
+        if not inode:
+            # Python 2 does not get inode by path on Windows, but it gets one
+            # of open file, so the path is opened to compare the same values
+            inode = self._get_path_inode()
+        return inode != self.inode
+
+    def _stat(self):
+        return os.stat(self.log_path)
+
+    def _get_path_inode(self):
+        try:
+            with io.open(self.log_path, 'rb') as f:
+                return os.fstat(f.fileno()).st_ino
+        except IOError:
+            return self.inode
+
+    def _got_chunk(self, chunk):
+        lines = (self._tail + chunk).split('\n')
+        self._tail = lines.pop()
+        for line in lines:
+            self.got_line(line)
+
+    @property
+    def offset(self):
+        """
+        Position of the end of the last complete line which was read.
+        """
+        if self.log_file is None:
+            return None
+        return self.log_file.tell() - len(self._tail)
+
+    def _save_state(self):
+        self._last_save_time = time.time()
+        state = {
+            'path': self.log_path,
+            'inode': self.inode,
+            'offset': self.offset,
+        }
+        if state != self._saved_state:
+            self._saved_state = state
+            self._store_state(state)
+
+    def _get_settings(self):
+        return user_settings if self.settings is None else self.settings
+
+    def _load_state(self):
+        return self._get_settings().event_log
+
+    def _store_state(self, state):
+        settings = self._get_settings()
+        settings.event_log = state
+        settings.sync()
@@ -2,45 +2,109 @@
 """
 Commander's missions service.
 """
+import datetime
 import time
 import tx_logging
 
+from collections import deque
 from copy import copy
 
 from twisted.internet import defer
-from twisted.internet.task import LoopingCall
 
 from il2ds_middleware.constants import MISSION_STATUS
+from il2ds_middleware.requests import REQ_MISSION_BEGIN, REQ_MISSION_DESTROY
 from il2ds_middleware.service import MissionsService as DefaultMissionsService
 
-from minic.models import MissionManager
+from minic.constants import BUS_TOPIC, MISSION_FILE_STATE
+from minic.library import MissionPreloader, MissionWatcher, mission_index
+from minic.metrics import ServerMetric
+from minic.rotation import RotationContext, get_scheduler
 from minic.service import ClientServiceMixin
-from minic.util import ugettext_lazy as _
+from minic.settings import (
+    MISSION_EMPTY_DELAY, MISSION_EMPTY_TIME_LEFT, MISSION_EXTEND_MINUTES,
+    MISSION_EXTEND_PILOTS, MISSION_MAX_EXTENSIONS, MISSION_PRELOAD_AHEAD,
+)
+from minic.timer import CountdownTimer
+from minic.util import ClockMixin, monotonic, ugettext_lazy as _
 
 
 LOG = tx_logging.getLogger(__name__)
 
 
-class MissionsService(DefaultMissionsService, ClientServiceMixin):
+class MissionsService(DefaultMissionsService, ClientServiceMixin,
+                      ClockMixin):
     """
     Custom service for missions flow management.
+
+    Duration of missions depends on number of pilots: when server stays
+    empty for `empty_delay` seconds, mission which was played by someone is
+    cut to `empty_time_left` seconds, so a fresh one waits for newcomers, and
+    countdown of mission nobody played is paused until somebody joins.
+    Mission is extended by `extend_minutes` up to `max_extensions` times if at
+    least `extend_pilots` pilots are in flight when its time is over.
     """
     mission_was_running = False
     current_mission = None
-    time_left = 0
-
-    _status_changed_cb = None
-    _timer_tick_cb = None
+    preload_ahead = MISSION_PRELOAD_AHEAD
+    index = mission_index
+
+    empty_delay = MISSION_EMPTY_DELAY
+    empty_time_left = MISSION_EMPTY_TIME_LEFT
+    extend_minutes = MISSION_EXTEND_MINUTES
+    extend_pilots = MISSION_EXTEND_PILOTS
+    max_extensions = MISSION_MAX_EXTENSIONS
+
+    load_time = ServerMetric(
+        'histogram', 'minic_mission_load_seconds',
+        "Console round-trip time of mission loading")
+    begin_time = ServerMetric(
+        'histogram', 'minic_mission_begin_seconds',
+        "Console round-trip time of mission beginning")
+    destroy_time = ServerMetric(
+        'histogram', 'minic_mission_destroy_seconds',
+        "Console round-trip time of mission destroying")
+    tick_time = ServerMetric(
+        'histogram', 'minic_mission_timer_tick_seconds',
+        "Time spent in mission timer ticks")
+    rotation_time = ServerMetric(
+        'histogram', 'minic_mission_rotation_seconds',
+        "Time from request to stop mission until the next one is playing")
+
+    _next_mission = None
+    _deadline = None
+    _watcher = None
+    _empty_call = None
+    _was_played = False
+    _extensions = 0
+    _ticking = False
 
     def __init__(self, log_watcher=None):
-        self._timer = LoopingCall(self._timer_tick)
+        self._timer = CountdownTimer(self._on_time_is_over)
+        self.preloader = MissionPreloader()
+        self.recent_ids = deque(maxlen=10)
+        self._scheduler = None
         DefaultMissionsService.__init__(self, log_watcher)
 
-    def register_callbacks(self,
-                           on_status_changed=None,
-                           on_timer_tick=None):
-        self._status_changed_cb = on_status_changed
-        self._timer_tick_cb = on_timer_tick
+    @property
+    def clock(self):
+        return self._timer.clock
+
+    @clock.setter
+    def clock(self, clock):
+        # Countdown runs on the same clock as everything else
+        self._timer.clock = clock
+        self._timer.now = monotonic if clock is None else clock.seconds
+
+    @property
+    def scheduler(self):
+        """
+        Policy which chooses the next mission. It is created again if server
+        is told to use another one.
+        """
+        name = self.mission_manager.get_scheduler_name()
+        if self._scheduler is None or self._scheduler[0] != name:
+            self._scheduler = (name, get_scheduler(name))
+        return self._scheduler[1]
 
     @ClientServiceMixin.radar_refresher
     def began(self, info=None):
@@ -48,125 +112,446 @@ class MissionsService(DefaultMissionsService, ClientServiceMixin):
         if self.current_mission is None:
             return
 
-        self.time_left = self.current_mission.duration * 60
-        self._timer.start(interval=1, now=False)
+        self._start_countdown(self.current_mission.duration * 60)
         self._set_status(MISSION_STATUS.PLAYING)
+        self.recent_ids.append(self.current_mission.id)
+        self.stats.begin_run(self.current_mission)
+        self._extensions = 0
+        self._was_played = False
+        self._cancel_empty_call()
+        self._on_pilots_changed()
 
-        self.cl_client.chat_all(unicode(_("Mission '{0}' is playing.")
-                                .format(self.current_mission.name)))
-        self.cl_client.chat_all(unicode(self.time_left_verbose_str))
+        self._announce(_("Mission '{0}' is playing.").format(
+                       self.current_mission.name))
+        self.chat.chat_all(unicode(self.time_left_verbose_str))
 
     @ClientServiceMixin.radar_refresher
     def ended(self, info=None):
         DefaultMissionsService.ended(self, info)
         if self.current_mission is None:
             return
-        self.cl_client.chat_all(unicode(_("Mission '{0}' was stopped.")
-                                .format(self.current_mission.name)))
+        self._announce(_("Mission '{0}' was stopped.").format(
+                       self.current_mission.name))
         self._on_ended()
 
     def startService(self):
         DefaultMissionsService.startService(self)
+        self.pilots.subscribe(self._on_pilots_changed)
+        self.bus.set_demand_callback(BUS_TOPIC.MISSION_TIME_LEFT,
+                                     self._on_time_left_demand)
+        self.watch_missions()
         if self.connection_was_lost and self.mission_was_running:
-            return self.mission_run()
+            return self.mission_resume()
 
     @defer.inlineCallbacks
     def stopService(self):
         self.mission_was_running = self.is_mission_playing
+        self._deadline = self._timer.deadline
+        if self._timer.paused:
+            self._deadline = self._timer.now() + self._timer.seconds_left
+        self.pilots.unsubscribe(self._on_pilots_changed)
+        self.bus.set_demand_callback(BUS_TOPIC.MISSION_TIME_LEFT, None)
+        self._on_time_left_demand(False)
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
         yield DefaultMissionsService.stopService(self)
         self._on_ended()
 
+    def _start_countdown(self, duration):
+        self._timer.start(duration)
+        self._timer.schedule(self.preload_ahead, self.preload_next_mission)
+
+    def watch_missions(self):
+        """
+        Index mission files within dogfight directory and keep index up to
+        date while service is running.
+        """
+        missions = self.mission_manager
+        if not missions.settings.server_path:
+            return defer.succeed([])
+
+        self._watcher = MissionWatcher(self.index, missions.get_root_path())
+        self._watcher.clock = self.clock
+        d = self._watcher.start()
+        d.addCallback(lambda unused: self.check_missions())
+        return d.addErrback(lambda failure: LOG.error(
+            "Failed to index missions: {0}".format(
+                failure.getErrorMessage())))
+
+    @defer.inlineCallbacks
+    def index_missions(self):
+        """
+        Check all mission files within dogfight directory.
+
+        Output:
+        Deferred which fires with the result of `check_missions`.
+        """
+        missions = self.mission_manager
+        if not missions.settings.server_path:
+            defer.returnValue([])
+
+        yield self.index.scan(missions.get_root_path())
+        defer.returnValue(self.check_missions())
+
+    def check_missions(self):
+        """
+        Find missions in the list which files are known to be invalid or
+        missing.
+
+        Output:
+        A list of `(mission, problem)` tuples.
+        """
+        missions = self.mission_manager
+        results = []
+        for mission in missions.all():
+            if not mission.relative_path:
+                continue
+            path = missions.absolute_path(mission.relative_path)
+            state = self.index.get_state(path)
+            if state == MISSION_FILE_STATE.INVALID:
+                problem = self.index.get(path).error
+            elif state == MISSION_FILE_STATE.MISSING:
+                problem = unicode(_("File is missing"))
+            else:
+                continue
+            LOG.error("Mission '{0}' is invalid: {1}".format(
+                      mission.name, problem))
+            results.append((mission, problem))
+        return results
+
+    @defer.inlineCallbacks
+    def mission_resume(self):
+        """
+        Continue mission which was playing before connection with server was
+        lost. If server kept playing it, countdown continues to the old
+        deadline. Otherwise mission is run again.
+        """
+        mission = copy(self.mission_manager.get_current_mission())
+        deadline, self._deadline = self._deadline, None
+        if mission is None:
+            defer.returnValue(None)
+
+        try:
+            info = yield self.cl_client.mission_status()
+        except Exception as e:
+            LOG.error("Failed to get mission status: {0}".format(unicode(e)))
+            info = None
+
+        relative_path = self.mission_manager.full_relative_path(
+            mission.relative_path)
+        if info == (MISSION_STATUS.PLAYING, relative_path):
+            LOG.info("Mission '{0}' is still playing".format(mission.name))
+            self.current_mission = mission
+            self._start_countdown(
+                mission.duration * 60 if deadline is None
+                else max(deadline - self._timer.now(), 0))
+            self._set_status(MISSION_STATUS.PLAYING)
+        elif self.is_mission_playing:
+            yield self.mission_replace(mission)
+        else:
+            yield self.mission_run()
+
     def _on_ended(self):
-        if self._timer.running:
-            self._timer.stop()
+        self._timer.stop()
+        self._cancel_empty_call()
 
         self.current_mission = None
-        self.time_left = 0
+        self._next_mission = None
         self._set_status(MISSION_STATUS.NOT_LOADED)
 
     @defer.inlineCallbacks
     def mission_run(self):
-        mission = copy(MissionManager.get_current_mission())
+        """
+        Load and begin current mission. Request to begin mission is sent
+        without waiting for mission to load, so server executes it right after
+        loading. If loading or beginning fails, mission is destroyed, so server
+        does not play a mission commander does not know about.
+        """
+        mission = copy(self.mission_manager.get_current_mission())
         if mission is None:
             LOG.error("Failed to run mission: current mission is not set")
             self._set_status(MISSION_STATUS.NOT_LOADED)
             defer.returnValue(None)
 
         self._set_status(MISSION_STATUS.LOADING)
-        self.cl_client.chat_all(
-            unicode(_("Loading mission '{0}'...").format(mission.name)))
-        relative_path = MissionManager.full_relative_path(mission.relative_path)
+        self._announce(
+            _("Loading mission '{0}'...").format(mission.name))
+        relative_path = self.mission_manager.full_relative_path(
+            mission.relative_path)
 
-        try:
-            yield self.cl_client.mission_load(relative_path)
-            self._set_status(MISSION_STATUS.LOADED)
-        except Exception as e:
-            LOG.error("Failed to load mission '{0}': {1}".format(
-                      mission.name, unicode(e)))
-            self.cl_client.chat_all(unicode(_("Failed to load mission.")))
-            self._set_status(MISSION_STATUS.NOT_LOADED)
-            defer.returnValue(None)
+        load = self.cl_client.mission_load(relative_path)
+        begin = self.cl_client.send_request(REQ_MISSION_BEGIN)
+        status = self.cl_client.mission_status()
 
-        self._set_status(MISSION_STATUS.STARTING)
-        self.current_mission = mission
-        self.cl_client.chat_all(
-            unicode(_("Starting mission '{0}'...").format(mission.name)))
+        def on_loaded(unused):
+            self.begin_time.observe_deferred(begin)
+            self._set_status(MISSION_STATUS.LOADED)
+            self._set_status(MISSION_STATUS.STARTING)
+            self.current_mission = mission
+            self._announce(
+                _("Starting mission '{0}'...").format(mission.name))
+
+        requests = [
+            self.load_time.observe_deferred(load).addCallback(on_loaded),
+            begin,
+            status,
+        ]
         try:
-            yield self.cl_client.mission_begin()
-        except Exception as e:
-            LOG.error("Failed to begin mission '{0}': {1}".format(
-                      mission.name, unicode(e)))
-            self.cl_client.chat_all(unicode(_("Failed to start mission.")))
+            yield defer.gatherResults(requests, consumeErrors=True)
+        except defer.FirstError as e:
+            if self.current_mission is mission:
+                LOG.error("Failed to begin mission '{0}': {1}".format(
+                          mission.name, unicode(e.subFailure.value)))
+                self.chat.chat_all(unicode(_("Failed to start mission.")))
+            else:
+                LOG.error("Failed to load mission '{0}': {1}".format(
+                          mission.name, unicode(e.subFailure.value)))
+                self.chat.chat_all(unicode(_("Failed to load mission.")))
             self.current_mission = None
             self._set_status(MISSION_STATUS.NOT_LOADED)
+            yield self._destroy_failed_mission()
 
     def mission_stop(self):
         self._set_status(MISSION_STATUS.STOPPING)
         name = self.current_mission.name
-        self.cl_client.chat_all(
-            unicode(_("Stopping mission '{0}'...").format(name)))
-        return self.cl_client.mission_destroy()
+        self._announce(
+            _("Stopping mission '{0}'...").format(name))
+        return self.destroy_time.observe_deferred(
+            self.cl_client.mission_destroy())
 
     def mission_restart(self):
         name = self.current_mission.name
-        self.cl_client.chat_all(
-            unicode(_("Restarting mission '{0}'...").format(name)))
+        self._announce(
+            _("Restarting mission '{0}'...").format(name))
         return self.update_playing_mission()
 
     @defer.inlineCallbacks
     def update_playing_mission(self):
+        mission = copy(self.mission_manager.get_current_mission())
         try:
-            yield self.mission_stop()
-            yield self.mission_run()
+            if mission is None:
+                yield self.mission_stop()
+            else:
+                yield self.mission_replace(mission)
         except Exception as e:
             LOG.error("Failed to update playing mission: {0}".format(
                       unicode(e)))
 
+    @defer.inlineCallbacks
+    def mission_replace(self, mission):
+        """
+        Replace playing mission with given one. Requests to destroy current
+        mission, to load and to begin the new one are sent at once, so server
+        executes them one after another without waiting for round trips. If
+        the new mission fails to start, it is destroyed.
+        """
+        start = time.time()
+        self._set_status(MISSION_STATUS.STOPPING)
+        self._announce(
+            _("Loading mission '{0}'...").format(mission.name))
+        relative_path = self.mission_manager.full_relative_path(
+            mission.relative_path)
+
+        def on_stopped(unused):
+            self.current_mission = mission
+            self._set_status(MISSION_STATUS.LOADING)
+
+        def on_loaded(unused):
+            self._set_status(MISSION_STATUS.STARTING)
+
+        requests = [
+            self.cl_client.send_request(REQ_MISSION_DESTROY),
+            self.cl_client.mission_status().addCallback(on_stopped),
+            self.load_time.observe_deferred(self.cl_client.mission_load(
+                relative_path)).addCallback(on_loaded),
+            self.cl_client.send_request(REQ_MISSION_BEGIN),
+            self.cl_client.mission_status(),
+        ]
+        try:
+            yield defer.gatherResults(requests, consumeErrors=True)
+        except Exception as e:
+            LOG.error("Failed to replace mission with '{0}': {1}".format(
+                      mission.name, unicode(e)))
+            self.chat.chat_all(unicode(_("Failed to start mission.")))
+            if not self.is_mission_playing:
+                self.current_mission = None
+                self._set_status(MISSION_STATUS.NOT_LOADED)
+                yield self._destroy_failed_mission()
+        else:
+            self.rotation_time.observe(time.time() - start)
+
+    def _destroy_failed_mission(self):
+        """
+        Destroy mission after failed pipeline of requests. Request to begin
+        mission reaches server even if loading fails, so server can begin
+        a mission which was loaded partially or too late.
+        """
+        d = self.cl_client.mission_destroy()
+        d.addErrback(lambda failure: LOG.error(
+            "Failed to destroy mission after failed start: {0}".format(
+                failure.getErrorMessage())))
+        return d
+
+    def preload_next_mission(self):
+        """
+        Start looking for a mission to play after current one. Its files are
+        read ahead, so server loads them from OS cache.
+        """
+        self._next_mission = self._find_next_mission(self.current_mission.id)
+        return self._next_mission
+
+    @defer.inlineCallbacks
+    def _find_next_mission(self, mission_id):
+        """
+        Get mission which follows given one according to rotation policy and
+        which file can be read. Missions with broken files and ones known to
+        be invalid are skipped.
+
+        Output:
+        Deferred which fires with a mission or with `None` if no mission can
+        be read.
+        """
+        missions = self.mission_manager
+        context = RotationContext(datetime.datetime.now(), self.pilots.count,
+                                  list(self.recent_ids))
+
+        for mission in self.scheduler.candidates(missions, mission_id,
+                                                 context):
+            try:
+                path = missions.absolute_path(mission.relative_path)
+                error = self.index.get_error(path)
+                if error is not None:
+                    raise ValueError(error)
+                yield self.preloader.preload(path)
+            except Exception as e:
+                LOG.error("Skipping mission '{0}': {1}".format(
+                          mission.name, unicode(e)))
+            else:
+                defer.returnValue(copy(mission))
+        defer.returnValue(None)
+
+    @defer.inlineCallbacks
+    def rotate(self):
+        """
+        Replace playing mission with the next one.
+        """
+        current_id = self.current_mission.id
+        if self._next_mission is None:
+            self.preload_next_mission()
+        d, self._next_mission = self._next_mission, None
+        mission = yield d
+
+        missions = self.mission_manager
+        count = missions.count()
+        if not count:
+            LOG.error("Failed to rotate missions: missions list is empty")
+            yield self.mission_stop()
+            defer.returnValue(None)
+
+        if mission is None or missions.get(mission.id) is None:
+            # Let server tell what is wrong with the next mission
+            index = (missions.get_index_by_id(current_id) + 1) % count
+            mission = copy(missions.get(
+                missions.get_id_by_index(index)))
+
+        missions.set_current_id(mission.id)
+        yield self.mission_replace(mission)
+
+    def _on_time_left_demand(self, has_subscribers):
+        """
+        Tick timer only while somebody follows time left, so reactor does not
+        wake up every second for nothing.
+        """
+        if has_subscribers and not self._ticking:
+            self._timer.subscribe(self._timer_tick)
+        elif not has_subscribers and self._ticking:
+            self._timer.unsubscribe(self._timer_tick)
+        self._ticking = has_subscribers
+
     def _timer_tick(self):
-        self.time_left -= 1
-        if self._timer_tick_cb:
-            self._timer_tick_cb()
+        with self.tick_time.time():
+            self.bus.publish(BUS_TOPIC.MISSION_TIME_LEFT, self.time_left)
+
+    def _on_pilots_changed(self):
+        """
+        Pause, continue or cut countdown of playing mission depending on
+        whether somebody is on server.
+        """
+        if not self.is_mission_playing:
+            return
 
-        if self.time_left == 0:
-            current_index = MissionManager.get_index_by_id(self.current_mission.id)
+        if self.pilots.count:
+            self._was_played = True
+            self._cancel_empty_call()
+            if self._timer.paused:
+                LOG.info("Pilots are online, countdown is continued")
+                self._start_countdown(self._timer.seconds_left)
+        elif self._empty_call is None and not self._timer.paused:
+            self._empty_call = self._get_clock().callLater(
+                self.empty_delay, self._on_server_empty)
+
+    def _on_server_empty(self):
+        self._empty_call = None
+        if not self.is_mission_playing or self.pilots.count:
+            return
+
+        if (
+            self._was_played
+            and self._timer.seconds_left > self.empty_time_left
+        ):
+            LOG.info("Server is empty, mission is cut to {0} s".format(
+                     self.empty_time_left))
+            self._was_played = False
+            self._start_countdown(self.empty_time_left)
+            self._on_pilots_changed()
+        else:
+            LOG.info("Server is empty, countdown is paused")
+            self._timer.pause()
+
+    def _cancel_empty_call(self):
+        if self._empty_call is not None:
+            if self._empty_call.active():
+                self._empty_call.cancel()
+            self._empty_call = None
+
+    def _on_time_is_over(self):
+        if (
+            self._extensions < self.max_extensions
+            and self.pilots.in_flight_count >= self.extend_pilots
+        ):
+            self._extensions += 1
+            self._start_countdown(self.extend_minutes * 60)
+            self._announce(_("Mission is extended by {0} minutes.").format(
+                           self.extend_minutes))
+            return
 
-            def on_stopped(unused):
-                new_index = (current_index + 1) % MissionManager.count()
-                new_id = MissionManager.get_id_by_index(new_index)
-                MissionManager.set_current_id(new_id)
-                return self.mission_run()
+        self.rotate().addErrback(lambda failure: LOG.error(
+            "Failed to rotate missions: {0}".format(
+                failure.getErrorMessage())))
 
-            self.mission_stop().addCallback(on_stopped)
+    def _announce(self, message):
+        """
+        Tell users about mission status. Announcement which is not sent yet
+        is replaced with the newer one.
+        """
+        self.chat.chat_all(unicode(message), key='mission_status')
 
     def _set_status(self, status):
         self.status = status
-        if self._status_changed_cb:
-            self._status_changed_cb(status)
+        self.bus.publish(BUS_TOPIC.MISSION_STATUS, status)
 
     @property
     def is_mission_playing(self):
         return self.status == MISSION_STATUS.PLAYING
 
+    @property
+    def time_left(self):
+        """
+        Seconds left until the end of playing mission.
+        """
+        return self._timer.time_left
+
     @property
     def time_left_str(self):
         return time.strftime('%H:%M:%S', time.gmtime(self.time_left))
@@ -6,6 +6,7 @@ import tx_logging
 
 from il2ds_middleware.service import MutedObjectsService
 from minic.service import ClientServiceMixin
+from minic.spatial import GridIndex
 
 
 LOG = tx_logging.getLogger(__name__)
@@ -13,5 +14,32 @@ LOG = tx_logging.getLogger(__name__)
 
 class ObjectsService(MutedObjectsService, ClientServiceMixin):
     """
-    Custom service for mission objects management.
+    Custom service for mission objects management. Positions of static
+    objects reported by radar are kept in spatial index.
     """
+
+    def __init__(self):
+        self.positions = GridIndex()
+
+    def startService(self):
+        MutedObjectsService.startService(self)
+        self.radar.subscribe(self._on_radar)
+
+    def stopService(self):
+        self.radar.unsubscribe(self._on_radar)
+        self.positions.clear()
+        return MutedObjectsService.stopService(self)
+
+    def _on_radar(self, snapshot):
+        self.positions.replace(dict(
+            (x['name'], (x['pos']['x'], x['pos']['y']))
+            for x in snapshot.statics))
+
+    def get_objects_near(self, x, y, radius):
+        """
+        Find static objects within given distance from given point.
+
+        Output:
+        A list of `(distance, name)` tuples sorted by distance.
+        """
+        return self.positions.within(x, y, radius)
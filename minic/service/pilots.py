@@ -4,14 +4,185 @@ Commander's pilots service.
 """
 import tx_logging
 
+from collections import namedtuple
+
 from il2ds_middleware.service import MutedPilotsService
+
+from minic.constants import BUS_TOPIC
 from minic.service import ClientServiceMixin
+from minic.spatial import GridIndex
 
 
 LOG = tx_logging.getLogger(__name__)
 
+Pilot = namedtuple('Pilot', field_names=['callsign', 'channel', 'ip'])
+
 
 class PilotsService(MutedPilotsService, ClientServiceMixin):
     """
-    Custom service for managing online pilots.
+    Custom service for managing online pilots. Keeps index of pilots who are
+    online and of ones who are in flight, so their numbers are known without
+    asking server. Index is filled from console when service starts and is
+    updated by console and events log events.
+
+    Positions of pilots are kept in spatial index, which is updated by radar
+    and by events log events with positions.
     """
+
+    def __init__(self):
+        self.online = {}
+        self.armies = {}
+        self.positions = GridIndex()
+        self._in_flight = set()
+        self._subscribers = []
+
+    @property
+    def count(self):
+        """
+        Number of pilots on server.
+        """
+        return len(self.online)
+
+    @property
+    def in_flight_count(self):
+        """
+        Number of pilots who took off and did not land, crash or leave yet.
+        """
+        return len(self._in_flight)
+
+    def subscribe(self, callback):
+        """
+        Call given function without arguments every time number of pilots
+        online or in flight changes.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            callback()
+        self.bus.publish(BUS_TOPIC.PILOTS, self.count)
+
+    def get_pilots_near(self, x, y, radius):
+        """
+        Find pilots within given distance from given point.
+
+        Output:
+        A list of `(distance, callsign)` tuples sorted by distance.
+        """
+        return self.positions.within(x, y, radius)
+
+    def get_nearest_enemy(self, callsign):
+        """
+        Find the closest pilot who is not in the same army as given one.
+
+        Output:
+        A `(distance, callsign)` tuple or `None` if position of pilot or
+        enemies are unknown.
+        """
+        pos = self.positions.get(callsign)
+        if pos is None:
+            return None
+        army = self.armies.get(callsign)
+        results = self.positions.nearest(
+            pos[0], pos[1], predicate=lambda x: (
+                x != callsign and self.armies.get(x) != army))
+        return results[0] if results else None
+
+    def startService(self):
+        MutedPilotsService.startService(self)
+        self.radar.subscribe(self._on_radar)
+        d = self.cl_client.users_common_info()
+        d.addCallbacks(self._on_users_received, lambda failure: LOG.error(
+            "Failed to get list of users: {0}".format(
+                failure.getErrorMessage())))
+
+    def stopService(self):
+        self.radar.unsubscribe(self._on_radar)
+        self.clear()
+        return MutedPilotsService.stopService(self)
+
+    def clear(self):
+        self.online.clear()
+        self.armies.clear()
+        self.positions.clear()
+        self._in_flight.clear()
+        self._notify()
+
+    def _on_radar(self, snapshot):
+        self.positions.replace(dict(
+            (x['callsign'], (x['pos']['x'], x['pos']['y']))
+            for x in snapshot.pilots))
+
+    def _update_position(self, info):
+        pos = info.get('pos')
+        if pos is not None:
+            self.positions.update(info['callsign'], pos['x'], pos['y'])
+
+    def _on_users_received(self, users):
+        for callsign in set(self.online) - set(users):
+            self._forget(callsign)
+        for callsign in users:
+            if callsign not in self.online:
+                self.online[callsign] = Pilot(callsign, None, None)
+        self._notify()
+
+    # Console events -----------------------------------------------------------
+
+    def user_joined(self, info):
+        callsign = info['callsign']
+        self.online[callsign] = Pilot(callsign, info.get('channel'),
+                                      info.get('ip'))
+        self._notify()
+
+    def user_left(self, info):
+        callsign = info['callsign']
+        if callsign in self.online:
+            self._forget(callsign)
+            self._notify()
+
+    def _forget(self, callsign):
+        self.online.pop(callsign)
+        self.armies.pop(callsign, None)
+        self.positions.remove(callsign)
+        self._in_flight.discard(callsign)
+
+    # Events log events --------------------------------------------------------
+
+    def selected_army(self, info):
+        self.armies[info['callsign']] = info['army']
+        self._update_position(info)
+
+    def took_off(self, info):
+        self._update_position(info)
+        self._set_in_flight(info['callsign'], True)
+
+    def landed(self, info):
+        self._update_position(info)
+        self._set_in_flight(info['callsign'], False)
+
+    def went_to_menu(self, info):
+        self._set_in_flight(info['callsign'], False)
+
+    def crashed(self, info):
+        self._set_in_flight(info['callsign'], False)
+
+    def shot_down_self(self, info):
+        self._set_in_flight(info['callsign'], False)
+
+    def was_shot_down_by_user(self, info):
+        self._set_in_flight(info['callsign'], False)
+
+    def was_shot_down_by_static(self, info):
+        self._set_in_flight(info['callsign'], False)
+
+    def _set_in_flight(self, callsign, value):
+        if value == (callsign in self._in_flight):
+            return
+        if value:
+            self._in_flight.add(callsign)
+        else:
+            self._in_flight.discard(callsign)
+        self._notify()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Commander's radar service.
+"""
+import tx_logging
+
+from collections import namedtuple
+
+from il2ds_middleware.constants import DEVICE_LINK_OPCODE as DL_OPCODE
+
+from twisted.application.service import Service
+from twisted.internet import defer
+
+from minic.constants import BUS_TOPIC
+from minic.metrics import ServerMetric
+from minic.service import ClientServiceMixin
+from minic.settings import (
+    RADAR_LOAD_FACTOR, RADAR_MAX_PERIOD, RADAR_MIN_PERIOD, RADAR_REFRESH_DELAY,
+    RADAR_STATIC_EVERY,
+)
+from minic.util import ClockMixin
+
+
+LOG = tx_logging.getLogger(__name__)
+
+#: Positions known at some moment. `pilots` and `statics` are tuples of dicts
+#: as they are returned by Device Link parser. Version grows with every poll
+RadarSnapshot = namedtuple('RadarSnapshot', field_names=[
+    'version', 'time', 'pilots', 'statics',
+])
+
+EMPTY_SNAPSHOT = RadarSnapshot(version=0, time=None, pilots=(), statics=())
+
+
+class RadarService(Service, ClientServiceMixin, ClockMixin):
+    """
+    Polls positions of pilots and static objects via Device Link and keeps
+    the latest ones in a snapshot, so any number of consumers can read them
+    without making own requests. Each poll takes one datagram for counts of
+    objects and one datagram per `cmd_group_max_size` positions.
+
+    Period between polls follows load: it is `load_factor` times longer than
+    the last poll took, within `min_period` and `max_period`. The longest
+    period is used while server is empty and after failed polls.
+
+    Radar refreshing requested by other services (e.g. when mission begins)
+    is done by an early poll. Requests are coalesced: all requests which come
+    within `refresh_delay`, while poll is in progress or when a poll is due
+    anyway are served by a single poll.
+    """
+    min_period = RADAR_MIN_PERIOD
+    max_period = RADAR_MAX_PERIOD
+    load_factor = RADAR_LOAD_FACTOR
+    static_every = RADAR_STATIC_EVERY
+    refresh_delay = RADAR_REFRESH_DELAY
+
+    poll_time = ServerMetric(
+        'histogram', 'minic_radar_poll_seconds',
+        "Time of polling positions of pilots and objects via Device Link")
+    poll_failure_count = ServerMetric(
+        'counter', 'minic_radar_poll_failures_total',
+        "Number of failed polls of positions")
+
+    def __init__(self):
+        self.snapshot = EMPTY_SNAPSHOT
+        self.period = self.min_period
+        self._polls = 0
+        self._call = None
+        self._waiters = None
+        self._subscribers = []
+        self._refresh_due = False
+        #: Number of requests to refresh radar
+        self.refresh_requests = 0
+        #: Number of requests served by polls made for other requests
+        self.refreshes_saved = 0
+
+    @property
+    def age(self):
+        """
+        Seconds since the current snapshot was taken or `None` if there is
+        no snapshot.
+        """
+        if self.snapshot.time is None:
+            return None
+        return self._get_clock().seconds() - self.snapshot.time
+
+    def subscribe(self, callback):
+        """
+        Call given function with a new snapshot every time it is taken.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def startService(self):
+        Service.startService(self)
+        self._polls = 0
+        if self.dl_client is not None:
+            self._schedule(0)
+
+    def stopService(self):
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+        self._refresh_due = False
+        self.snapshot = EMPTY_SNAPSHOT
+        return Service.stopService(self)
+
+    def _schedule(self, delay):
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = self._get_clock().callLater(delay, self.poll)
+
+    def request_refresh(self):
+        """
+        Ask to refresh radar and positions soon.
+        """
+        if not self.running or self.dl_client is None:
+            return
+        self.refresh_requests += 1
+
+        if self._waiters is not None:
+            # Poll in progress has refreshed radar before this request
+            if self._refresh_due:
+                self.refreshes_saved += 1
+            self._refresh_due = True
+            return
+
+        deadline = self._get_clock().seconds() + self.refresh_delay
+        if (
+            self._call is not None and self._call.active()
+            and self._call.getTime() <= deadline
+        ):
+            self.refreshes_saved += 1
+            return
+        self._schedule(self.refresh_delay)
+
+    def poll(self):
+        """
+        Poll positions right now. If polling is in progress already, its
+        results are waited for instead.
+
+        Output:
+        Deferred which fires with a new snapshot.
+        """
+        d = defer.Deferred()
+        if self._waiters is not None:
+            self._waiters.append(d)
+            return d
+
+        self._waiters = [d, ]
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+        started = self._get_clock().seconds()
+        self._request().addCallbacks(
+            self._on_polled, self._on_failed,
+            callbackArgs=(started, ), errbackArgs=(started, ))
+        return d
+
+    @defer.inlineCallbacks
+    def _request(self):
+        client = self.dl_client
+        with_statics = self._polls % self.static_every == 0
+        self._polls += 1
+
+        commands = [
+            DL_OPCODE.RADAR_REFRESH.make_command(),
+            DL_OPCODE.PILOT_COUNT.make_command(),
+        ]
+        if with_statics:
+            commands.append(DL_OPCODE.STATIC_COUNT.make_command())
+        counts = yield client.deferred_requests(commands)
+        pilots_count = int(counts[0])
+        statics_count = int(counts[1]) if with_statics else 0
+
+        commands = [
+            DL_OPCODE.PILOT_POS.make_command(i) for i in xrange(pilots_count)
+        ] + [
+            DL_OPCODE.STATIC_POS.make_command(i)
+            for i in xrange(statics_count)
+        ]
+        results = yield client.deferred_requests(commands) if commands else []
+
+        parser = client.parser
+        pilots = tuple(parser.all_pilots_pos(results[:pilots_count]))
+        if with_statics:
+            statics = tuple(parser.all_static_pos(results[pilots_count:]))
+        else:
+            statics = self.snapshot.statics
+        defer.returnValue((pilots, statics))
+
+    def _on_polled(self, results, started):
+        now = self._get_clock().seconds()
+        self.poll_time.observe(now - started)
+        if not self.running:
+            self._done(self.snapshot)
+            return
+
+        pilots, statics = results
+        self.snapshot = RadarSnapshot(
+            self.snapshot.version + 1, now, pilots, statics)
+
+        if not pilots and not self.pilots.count:
+            self.period = self.max_period
+        else:
+            self.period = min(max((now - started) * self.load_factor,
+                                  self.min_period), self.max_period)
+        self._done(self.snapshot)
+
+        for callback in list(self._subscribers):
+            callback(self.snapshot)
+        self.bus.publish(BUS_TOPIC.RADAR, self.snapshot)
+
+    def _on_failed(self, failure, started):
+        self.poll_failure_count.inc()
+        LOG.error("Failed to poll positions: {0}".format(
+                  failure.getErrorMessage()))
+        self.period = self.max_period
+        self._done(self.snapshot)
+
+    def _done(self, snapshot):
+        waiters, self._waiters = self._waiters, None
+        if self.running:
+            if self._refresh_due:
+                self._refresh_due = False
+                self._schedule(min(self.period, self.refresh_delay))
+            else:
+                self._schedule(self.period)
+        for d in waiters:
+            d.callback(snapshot)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Commander's statistics service.
+"""
+import tx_logging
+
+from twisted.application.service import Service
+from twisted.internet import task
+
+from minic.constants import EVENT_KIND
+from minic.service import ClientServiceMixin
+from minic.settings import STATS_FLUSH_PERIOD
+from minic.stats import EventStore
+from minic.util import ClockMixin
+
+
+LOG = tx_logging.getLogger(__name__)
+
+
+def _seconds(info):
+    time = info['time']
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+
+class StatsService(Service, ClientServiceMixin, ClockMixin):
+    """
+    Collects events of pilots from events log into event store, which is
+    flushed to database every `flush_period` seconds.
+    """
+    flush_period = STATS_FLUSH_PERIOD
+
+    def __init__(self, path=None):
+        self.store = EventStore(path)
+        self._flusher = None
+
+    def startService(self):
+        self._flusher = task.LoopingCall(self.flush)
+        self._flusher.clock = self._get_clock()
+        self._flusher.start(self.flush_period, now=False)
+        Service.startService(self)
+
+    def stopService(self):
+        if self._flusher is not None and self._flusher.running:
+            self._flusher.stop()
+        self._flusher = None
+        Service.stopService(self)
+        return self.flush()
+
+    def flush(self):
+        return self.store.flush().addErrback(lambda failure: LOG.error(
+            "Failed to save statistics: {0}".format(
+                failure.getErrorMessage())))
+
+    def begin_run(self, mission):
+        return self.store.begin_run(mission.name, self._get_clock().seconds())
+
+    def _append(self, kind, info, other=None):
+        self.store.append(kind, _seconds(info), info['callsign'],
+                          info.get('aircraft'), other, info.get('pos'))
+
+    # Events log events --------------------------------------------------------
+
+    def took_off(self, info):
+        self._append(EVENT_KIND.TOOK_OFF, info)
+
+    def landed(self, info):
+        self._append(EVENT_KIND.LANDED, info)
+
+    def crashed(self, info):
+        self._append(EVENT_KIND.CRASHED, info)
+
+    def shot_down_self(self, info):
+        self._append(EVENT_KIND.SHOT_DOWN, info)
+
+    def was_shot_down_by_static(self, info):
+        self._append(EVENT_KIND.SHOT_DOWN, info)
+
+    def was_shot_down_by_user(self, info):
+        self._append(EVENT_KIND.SHOT_DOWN, info, info['attacker']['callsign'])
+
+    def was_killed_by_user(self, info):
+        self._append(EVENT_KIND.KILLED, info, info['attacker']['callsign'])
+
+    def bailed_out(self, info):
+        self._append(EVENT_KIND.BAILED_OUT, info)
+
+    def building_destroyed_by_user(self, info):
+        self._append(EVENT_KIND.DESTROYED, info, info['building'])
+
+    def bridge_destroyed_by_user(self, info):
+        self._append(EVENT_KIND.DESTROYED, info, info['bridge'])
+
+    def static_destroyed_by_user(self, info):
+        self._append(EVENT_KIND.DESTROYED, info, info['static'])
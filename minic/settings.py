@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
 import ConfigParser
+import copy
 import json
 import os
 import shutil
+import tempfile
+import threading
+import tx_logging
 
 import minic
-from minic.util import ugettext_lazy as _
+from minic.metrics import metrics
+from minic.util import ClockMixin, ugettext_lazy as _, replace_file
+
+
+LOG = tx_logging.getLogger(__name__)
+
+SETTINGS_SYNCS = metrics.counter(
+    'minic_user_settings_syncs_total',
+    "Number of requests to write user settings")
+SETTINGS_WRITE_TIME = metrics.histogram(
+    'minic_user_settings_write_seconds',
+    "Time spent in writing user settings")
 
 
 def get_group_dir(group_name):
@@ -34,18 +49,135 @@ LOG_SETTINGS = {
 CONSOLE_TIMEOUT = 1.0
 DEVICE_LINK_TIMEOUT = 1.0
 
+#: Timeouts of console commands in seconds keyed by command prefix. The longest
+#: matching prefix is used, other commands time out after `CONSOLE_TIMEOUT`.
+#: Time is counted from the moment server starts executing the command, so
+#: commands queued behind a slow one do not time out
+CONSOLE_TIMEOUTS = {
+    'mission LOAD': 30.0,
+    'mission DESTROY': 5.0,
+    'mission END': 5.0,
+    'user STAT': 2.0,
+}
 
-class UserSettings(object):
-
+#: Reconnection to server's console. The first attempt is made quickly, then
+#: delay grows exponentially from initial value up to max value and deviates
+#: randomly by jitter share, so restarting server is not hammered
+RECONNECT_FAST_DELAY = 0.5
+RECONNECT_INITIAL_DELAY = 2.0
+RECONNECT_MAX_DELAY = 60.0
+RECONNECT_FACTOR = 2.0
+RECONNECT_JITTER = 0.2
+#: Server is probed via Device Link before connecting to its console. Console
+#: connection is attempted anyway after this number of failed probes
+RECONNECT_PROBE_LIMIT = 5
+RECONNECT_PROBE_TIMEOUT = 1.0
+
+#: Number of seconds before the end of mission to start preloading of the next
+#: one
+MISSION_PRELOAD_AHEAD = 60
+
+#: Number of processes which check mission files while they are indexed.
+#: Number of CPUs is used if not set
+MISSION_INDEX_PROCESSES = None
+#: Mission files are checked without pool of processes if there are fewer
+#: changed files than this
+MISSION_INDEX_POOL_THRESHOLD = 32
+
+#: Seconds between scans of missions directory where changes of files are
+#: not reported by OS
+MISSION_WATCH_INTERVAL = 30
+#: Seconds to wait for more changes of mission files before they are indexed
+MISSION_WATCH_DELAY = 1.0
+
+#: Seconds server must stay empty before time left of playing mission is cut
+#: or its countdown is paused
+MISSION_EMPTY_DELAY = 300
+#: Seconds left of mission which was played by someone when server became
+#: empty, so a fresh mission waits for pilots who join later
+MISSION_EMPTY_TIME_LEFT = 120
+#: Minutes mission is extended by if enough pilots are in flight at its end
+MISSION_EXTEND_MINUTES = 10
+#: Number of pilots in flight needed to extend mission
+MISSION_EXTEND_PILOTS = 4
+#: Maximal number of times a single mission can be extended
+MISSION_MAX_EXTENSIONS = 2
+
+#: Name of policy which chooses the next mission if it is not set for server
+ROTATION_SCHEDULER = 'round_robin'
+#: Number of recently played missions which weighted rotation does not repeat
+ROTATION_NO_REPEAT = 1
+
+#: Seconds between writes of collected events to statistics database
+STATS_FLUSH_PERIOD = 60
+#: Name of statistics database file within settings directory
+STATS_FILE_NAME = 'stats.sqlite'
+
+#: Bounds of period in seconds between polls of positions via Device Link.
+#: Period follows duration of polls, so polling takes at most
+#: `1 / RADAR_LOAD_FACTOR` share of time. The longest period is used while
+#: server is empty or does not answer
+RADAR_MIN_PERIOD = 1.0
+RADAR_MAX_PERIOD = 30.0
+RADAR_LOAD_FACTOR = 10
+#: Positions of static objects are polled once per this number of polls
+RADAR_STATIC_EVERY = 10
+#: Seconds radar refreshing is postponed for after it is requested, so
+#: requests which come in the meantime are served by the same refresh
+RADAR_REFRESH_DELAY = 0.5
+
+#: Side of cells of spatial index of positions in meters
+SPATIAL_CELL_SIZE = 10000
+
+#: Chat lines per second which are sent to server's console
+CHAT_RATE = 2.0
+#: Number of chat lines which can be sent at once before rate limit applies
+CHAT_BURST = 5
+#: Max number of chat messages waiting to be sent
+CHAT_MAX_QUEUE_SIZE = 50
+
+#: Number of seconds to wait for more changes before writing user settings
+USER_SETTINGS_SYNC_DELAY = 1.0
+#: Seconds between checks of server's config for changes
+SERVER_SETTINGS_WATCH_INTERVAL = 5
+
+#: Size of a single chunk of data read from events log
+EVENT_LOG_CHUNK_SIZE = 64 * 1024  # 64 KiB
+#: Max number of chunks read from events log during one watching period
+EVENT_LOG_MAX_CHUNKS = 16
+#: Number of seconds between savings of events log reading position
+EVENT_LOG_SAVE_PERIOD = 30
+
+
+class UserSettings(ClockMixin):
+    """
+    User settings stored as JSON. Changes are written behind: bursts of
+    `sync` calls are coalesced into a single write which is performed in a
+    thread from reactor's pool. Call `flush` to write pending changes
+    immediately.
+    """
+
+    root = SETTINGS_ROOT
     file_name = 'minic.conf'
+    sync_delay = USER_SETTINGS_SYNC_DELAY
+
     __container = None
+    _delayed_write = None
+    _write_lock = None
+    _generation = 0
+    _written_generation = 0
 
-    def __init__(self):
+    def __init__(self, root=None, file_name=None):
         self.__container = {}
+        self._write_lock = threading.Lock()
+        if root is not None:
+            self.root = root
+        if file_name is not None:
+            self.file_name = file_name
 
     @property
     def file_path(self):
-        return os.path.join(SETTINGS_ROOT, self.file_name)
+        return os.path.join(self.root, self.file_name)
 
     def load(self):
         """
@@ -79,11 +211,77 @@ class UserSettings(object):
 
     def sync(self):
         """
+        Schedule writing of settings to disk. Writing is postponed for
+        `sync_delay` seconds and all calls made in the meantime are served by
+        the same write.
+        """
+        SETTINGS_SYNCS.inc()
+        self._generation += 1
+        if self._delayed_write is None:
+            self._delayed_write = self._get_clock().callLater(
+                self.sync_delay, self._on_delayed_write)
+
+    def flush(self):
+        """
+        Write pending changes to disk right now. Does nothing if there are no
+        pending changes.
+
         .. todo:: may raise some exception
         """
-        with open(self.file_path, 'w') as f:
-            self.version = minic.VERSION
-            json.dump(self.__container, f, indent=2)
+        if self._delayed_write is not None:
+            if self._delayed_write.active():
+                self._delayed_write.cancel()
+            self._delayed_write = None
+        if self.has_pending_changes:
+            self._write(self._snapshot(), self._generation)
+
+    @property
+    def has_pending_changes(self):
+        return self._generation > self._written_generation
+
+    def _on_delayed_write(self):
+        self._delayed_write = None
+
+        def errback(failure):
+            LOG.error("Failed to write user settings: {0}".format(
+                      unicode(failure.value)))
+
+        return self._write_in_thread(
+            self._snapshot(), self._generation).addErrback(errback)
+
+    def _write_in_thread(self, data, generation):
+        from twisted.internet import threads
+        return threads.deferToThread(self._write, data, generation)
+
+    def _snapshot(self):
+        self.version = minic.VERSION
+        return copy.deepcopy(self.__container)
+
+    def _write(self, data, generation):
+        """
+        Serialize settings and write them to a temporary file which replaces
+        the original one afterwards, so settings file is never left truncated.
+        Writes of outdated snapshots are skipped.
+        """
+        with self._write_lock, SETTINGS_WRITE_TIME.time():
+            if generation <= self._written_generation:
+                return
+
+            dir_name = os.path.dirname(self.file_path)
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=self.file_name, suffix='.tmp', dir=dir_name)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                replace_file(tmp_path, self.file_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._written_generation = generation
 
     def __getattr__(self, name):
         """
@@ -118,18 +316,18 @@ class UserSettings(object):
         if self.version is not None:
             return
 
-        from minic.models import MissionManager
+        from minic.models import MissionList
+        missions = MissionList(self)
 
         def fix_mission(mission):
             file_name = mission['file_name'].lstrip(os.path.sep)
-            if file_name.startswith(MissionManager.dogfight_subpath):
-                start = len(MissionManager.dogfight_subpath)
+            if file_name.startswith(missions.dogfight_subpath):
+                start = len(missions.dogfight_subpath)
                 file_name = file_name[start:].lstrip(os.path.sep)
             mission['file_name'] = file_name
             return mission
 
-        MissionManager._set_raw_list(map(
-            fix_mission, MissionManager._get_raw_list()))
+        missions._set_raw_list(map(fix_mission, missions._get_raw_list()))
         self.version = (0, 1, 8)
 
     def _upgrade_to_0_1_9(self):
@@ -138,14 +336,15 @@ class UserSettings(object):
         """
         version = (0, 1, 9)
         if minic.version_lt(self.version, version):
-            from minic.models import Mission, MissionManager
-            MissionManager.update(map(
+            from minic.models import Mission, MissionList
+            missions = MissionList(self)
+            missions.update(map(
                 lambda x: Mission(
                     id=x['id'],
                     name=x['name'],
                     relative_path=x['file_name'],
                     duration=x['duration']),
-                MissionManager._get_raw_list()))
+                missions._get_raw_list()))
             self.version = version
 
 
@@ -153,46 +352,83 @@ user_settings = UserSettings()
 
 
 class ServerSettings(dict):
+    """
+    Settings of game server read from its config. Path to server is taken
+    from given user settings. Config is parsed again only if its path,
+    modification time or size have changed since it was read last time.
+    """
 
     file_name = 'confs.ini'
 
-    def __init__(self, *args, **kwargs):
-        super(ServerSettings, self).__init__(*args, **kwargs)
+    def __init__(self, settings=None):
+        super(ServerSettings, self).__init__()
+        self.settings = user_settings if settings is None else settings
         self.config = ConfigParser.ConfigParser()
+        self._stamp = None
 
     def load(self):
+        """
+        Read server's config if it has changed. Settings are left untouched
+        if config is invalid.
+
+        Output:
+        A set of names of settings which have changed their values.
+        """
+        file_path = self._file_path()
+        stat = os.stat(file_path)
+        stamp = (file_path, stat.st_mtime, stat.st_size)
+        if stamp == self._stamp:
+            return set()
+
+        config = ConfigParser.ConfigParser()
+        config.read(file_path)
+        values = self._parse(config)
+
+        old_values = dict(self)
         self.clear()
-        self.config.read(self._file_path())
+        self.update(values)
+        self.config, self._stamp = config, stamp
+        return set(
+            key for key in set(old_values) | set(values)
+            if old_values.get(key) != values.get(key)
+        )
+
+    def _parse(self, config):
+        values = {}
+
+        def get_value(section_name, attr_name, default=None):
+            return self._get_value(section_name, attr_name, default, config)
 
         # Path to events log
-        self['log_path'] = self._get_log_path()
+        values['log_path'] = self._get_log_path(config)
 
         # Max number of network channels
-        self['max_channels'] = int(self._get_value('NET', 'serverChannels', 32))
+        values['max_channels'] = int(get_value('NET', 'serverChannels', 32))
         # Difficulty value
-        self['difficulty'] = int(self._get_value('NET', 'difficulty', 0))
+        values['difficulty'] = int(get_value('NET', 'difficulty', 0))
 
         # Console host
-        self['cl_host'] = self._get_console_host()
+        values['cl_host'] = self._get_console_host(config)
         # Console port
-        self['cl_port'] = int(self._get_value('Console', 'IP', 20000))
+        values['cl_port'] = int(get_value('Console', 'IP', 20000))
 
         # Device Link host
-        self['dl_host'] = self._get_value('DeviceLink', 'host', self['cl_host'])
+        values['dl_host'] = get_value('DeviceLink', 'host', values['cl_host'])
         # Device Link port
-        self['dl_port'] = int(self._get_value('DeviceLink', 'port', 10000))
+        values['dl_port'] = int(get_value('DeviceLink', 'port', 10000))
 
         # Server name
-        self['name'] = self._get_value(
+        values['name'] = get_value(
             'NET', 'serverName').decode('unicode-escape')
         # Server description
-        self['description'] = self._get_value(
+        values['description'] = get_value(
             'NET', 'serverDescription').decode('unicode-escape')
+        return values
 
-    def _get_console_host(self):
+    def _get_console_host(self, config=None):
         section = 'NET'
         attr_name = 'localHost'
-        value = self._get_value(section, attr_name)
+        value = self._get_value(section, attr_name, config=config)
         if value is None:
             raise ValueError(
                 _("Please, explicitly specify your local address as "
@@ -200,25 +436,26 @@ class ServerSettings(dict):
                   attr_name, section, self.file_name))
         return value
 
-    def _get_log_path(self):
+    def _get_log_path(self, config=None):
         section = 'game'
         attr_name = 'eventlog'
-        value = self._get_value(section, attr_name)
+        value = self._get_value(section, attr_name, config=config)
         if value is None:
             raise ValueError(
                 _("Please, specify path to events log as "
                   "'{0}' attribute in '{1}' secton in '{2}' file.").format(
                   attr_name, section, self.file_name))
-        return os.path.join(os.path.dirname(user_settings.server_path), value)
+        return os.path.join(os.path.dirname(self.settings.server_path),
+                            value)
 
-    def _get_value(self, section_name, attr_name, default=None):
+    def _get_value(self, section_name, attr_name, default=None, config=None):
         try:
-            return self.config.get(section_name, attr_name)
+            return (config or self.config).get(section_name, attr_name)
         except:
             return default
 
     def _file_path(self):
-        server_path = user_settings.server_path
+        server_path = self.settings.server_path
         if server_path is None:
             raise ValueError(_("Path to server is not set"))
         server_path = os.path.dirname(server_path)
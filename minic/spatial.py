@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial index of positions on map.
+"""
+import math
+
+from minic.settings import SPATIAL_CELL_SIZE
+
+
+class GridIndex(object):
+    """
+    Index of points on map which are kept in square cells of uniform grid.
+    Queries look only at cells which can contain matching points. Moving a
+    point within its cell costs a single dict update.
+    """
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        """
+        Input:
+        `cell_size`     # length of side of grid's cell in meters.
+        """
+        self.cell_size = float(cell_size)
+        self._points = {}
+        self._cells = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _get_cell(self, x, y):
+        size = self.cell_size
+        return (int(math.floor(x / size)), int(math.floor(y / size)))
+
+    def get(self, key):
+        """
+        Get `(x, y)` coordinates of point or `None` if it is unknown.
+        """
+        point = self._points.get(key)
+        return point and point[:2]
+
+    def update(self, key, x, y):
+        """
+        Add point or move it to new coordinates.
+        """
+        cell = self._get_cell(x, y)
+        point = self._points.get(key)
+        if point is None or point[2] != cell:
+            if point is not None:
+                self._discard(key, point[2])
+            self._cells.setdefault(cell, set()).add(key)
+        self._points[key] = (x, y, cell)
+
+    def remove(self, key):
+        point = self._points.pop(key, None)
+        if point is not None:
+            self._discard(key, point[2])
+
+    def _discard(self, key, cell):
+        keys = self._cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
+
+    def replace(self, points):
+        """
+        Make index hold given points only. Points which did not move are
+        not touched.
+
+        Input:
+        `points`    # a dict of `(x, y)` tuples keyed by keys of points.
+        """
+        for key in [x for x in self._points if x not in points]:
+            self.remove(key)
+        for key, (x, y) in points.iteritems():
+            point = self._points.get(key)
+            if point is None or point[0] != x or point[1] != y:
+                self.update(key, x, y)
+
+    def clear(self):
+        self._points.clear()
+        self._cells.clear()
+
+    def _get_cells_around(self, x, y, radius):
+        """
+        Get keys of points in cells which intersect with square around given
+        circle.
+        """
+        min_cx, min_cy = self._get_cell(x - radius, y - radius)
+        max_cx, max_cy = self._get_cell(x + radius, y + radius)
+        cells = self._cells
+
+        if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(cells):
+            # Circle covers more cells than there are, check them all
+            return [
+                keys for (cx, cy), keys in cells.iteritems()
+                if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy
+            ]
+        return [
+            cells[(cx, cy)]
+            for cx in xrange(min_cx, max_cx + 1)
+            for cy in xrange(min_cy, max_cy + 1)
+            if (cx, cy) in cells
+        ]
+
+    def within(self, x, y, radius):
+        """
+        Find points within given distance from given point.
+
+        Output:
+        A list of `(distance, key)` tuples sorted by distance.
+        """
+        return self.within_many([(x, y), ], radius)[0]
+
+    def within_many(self, centers, radius):
+        """
+        Find points within given distance from each of given points. Cells
+        are looked up once for all centers which share a cell.
+
+        Input:
+        `centers`   # a sequence of `(x, y)` tuples.
+        `radius`    # distance in meters.
+
+        Output:
+        A list of results of `within` for each center.
+        """
+        points = self._points
+        radius_sq = radius * radius
+        candidates = {}
+        results = []
+
+        for x, y in centers:
+            cell = self._get_cell(x, y)
+            keys = candidates.get(cell)
+            if keys is None:
+                # Look around the whole cell, so candidates fit any center
+                # within it
+                size = self.cell_size
+                keys = candidates[cell] = [
+                    (key, points[key]) for cell_keys in self._get_cells_around(
+                        (cell[0] + 0.5) * size, (cell[1] + 0.5) * size,
+                        radius + size)
+                    for key in cell_keys
+                ]
+
+            found = []
+            for key, (px, py, unused) in keys:
+                dx, dy = px - x, py - y
+                distance_sq = dx * dx + dy * dy
+                if distance_sq <= radius_sq:
+                    found.append((math.sqrt(distance_sq), key))
+            found.sort()
+            results.append(found)
+        return results
+
+    def nearest(self, x, y, count=1, predicate=None):
+        """
+        Find points closest to given point. Cells are looked at in rings
+        around point's cell until enough points are found.
+
+        Input:
+        `count`         # max number of points to find.
+        `predicate`     # a function which tells whether point with given
+                        # key can be found. Any point can be found if not
+                        # set.
+
+        Output:
+        A list of `(distance, key)` tuples sorted by distance.
+        """
+        if not self._cells:
+            return []
+
+        size = self.cell_size
+        cx, cy = self._get_cell(x, y)
+        max_ring = max(
+            max(abs(cell[0] - cx), abs(cell[1] - cy)) for cell in self._cells)
+        points = self._points
+        found = []
+
+        if (2 * max_ring + 1) ** 2 > 4 * len(self._cells):
+            # Points are sparse, rings would be mostly empty
+            rings = [self._cells.iterkeys(), ]
+        else:
+            rings = (self._get_ring(cx, cy, i) for i in xrange(max_ring + 1))
+
+        for ring, cells in enumerate(rings):
+            for cell in cells:
+                for key in self._cells.get(cell, ()):
+                    if predicate is not None and not predicate(key):
+                        continue
+                    dx, dy = points[key][0] - x, points[key][1] - y
+                    found.append((math.sqrt(dx * dx + dy * dy), key))
+
+            # Points beyond this ring are farther than `ring * size`
+            if len(found) >= count:
+                found.sort()
+                if found[count - 1][0] <= ring * size:
+                    break
+        found.sort()
+        return found[:count]
+
+    @staticmethod
+    def _get_ring(cx, cy, ring):
+        if ring == 0:
+            return [(cx, cy), ]
+        side = xrange(-ring, ring + 1)
+        cells = [(cx + i, cy - ring) for i in side]
+        cells.extend((cx + i, cy + ring) for i in side)
+        side = xrange(-ring + 1, ring)
+        cells.extend((cx - ring, cy + i) for i in side)
+        cells.extend((cx + ring, cy + i) for i in side)
+        return cells
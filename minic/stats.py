@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Storage of mission events for statistics.
+"""
+import tx_logging
+
+from array import array
+from itertools import izip
+
+from twisted.internet import defer, threads
+
+from minic.constants import EVENT_KIND
+
+
+LOG = tx_logging.getLogger(__name__)
+
+#: Columns of events with type codes of arrays which hold them
+EVENT_COLUMNS = (
+    ('run', 'L'),
+    ('kind', 'B'),
+    ('time', 'l'),
+    ('pilot', 'L'),
+    ('aircraft', 'L'),
+    ('other', 'L'),
+    ('x', 'f'),
+    ('y', 'f'),
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS names ("
+    "id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "id INTEGER PRIMARY KEY, mission TEXT, started REAL)",
+    "CREATE TABLE IF NOT EXISTS events ("
+    "run INTEGER, kind INTEGER, time INTEGER, pilot INTEGER, "
+    "aircraft INTEGER, other INTEGER, x REAL, y REAL)",
+    "CREATE INDEX IF NOT EXISTS events_run ON events (run)",
+)
+
+
+def _to_unicode(value):
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class EventStore(object):
+    """
+    Append-only store of mission events. New events are kept in typed arrays,
+    one per column, with names of pilots, aircraft and objects interned into
+    integer IDs. Events are flushed to SQLite database and removed from
+    memory, so memory use does not grow with uptime.
+    """
+
+    def __init__(self, path=None):
+        """
+        Input:
+        `path`      # path to database file. Database is kept in memory if
+                    # not set.
+        """
+        self.path = path or ':memory:'
+        self.run_id = 0
+        self._names = {}
+        self._new_names = []
+        self._new_runs = []
+        self._columns = self._create_columns()
+        self._connection = None
+        self._db_ids = {}
+        self._lock = defer.DeferredLock()
+
+    @staticmethod
+    def _create_columns():
+        return dict((name, array(code)) for name, code in EVENT_COLUMNS)
+
+    def __len__(self):
+        """
+        Number of events which are not flushed yet.
+        """
+        return len(self._columns['kind'])
+
+    def intern(self, name):
+        """
+        Get ID of given name. `None` has ID 0.
+        """
+        if name is None:
+            return 0
+        name_id = self._names.get(name)
+        if name_id is None:
+            name_id = self._names[name] = len(self._names) + 1
+            self._new_names.append((name_id, _to_unicode(name)))
+        return name_id
+
+    def begin_run(self, mission_name, started):
+        """
+        Start new run of mission. Events appended later belong to it.
+
+        Input:
+        `mission_name`      # name of mission.
+        `started`           # time of start in seconds since epoch.
+
+        Output:
+        ID of run.
+        """
+        # Seconds fit into an unsigned long of 32 bits until 2106
+        self.run_id = max(int(started), self.run_id + 1)
+        self._new_runs.append((self.run_id, _to_unicode(mission_name),
+                               started))
+        return self.run_id
+
+    def append(self, kind, time, pilot, aircraft=None, other=None, pos=None):
+        """
+        Add event of given kind to the current run.
+
+        Input:
+        `kind`      # one of `EVENT_KIND` values.
+        `time`      # time of event in seconds since midnight.
+        `pilot`     # callsign of pilot the event happened to.
+        `aircraft`  # aircraft of pilot.
+        `other`     # callsign of attacker or name of destroyed object.
+        `pos`       # a dict with 'x' and 'y' coordinates.
+        """
+        columns = self._columns
+        columns['run'].append(self.run_id)
+        columns['kind'].append(kind)
+        columns['time'].append(time)
+        columns['pilot'].append(self.intern(pilot))
+        columns['aircraft'].append(self.intern(aircraft))
+        columns['other'].append(self.intern(other))
+        columns['x'].append(pos['x'] if pos else 0)
+        columns['y'].append(pos['y'] if pos else 0)
+
+    def flush(self):
+        """
+        Write collected events to database. If writing fails, events are
+        kept and are written by the next flush.
+
+        Output:
+        Deferred which fires with number of written events.
+        """
+        return self._lock.run(self._flush)
+
+    def _flush(self):
+        columns, self._columns = self._columns, self._create_columns()
+        names, self._new_names = self._new_names, []
+        runs, self._new_runs = self._new_runs, []
+        d = self._call_in_thread(self._write, columns, names, runs)
+        return d.addErrback(self._on_write_failed, columns, names, runs)
+
+    def _on_write_failed(self, failure, columns, names, runs):
+        """
+        Put events which failed to be written back before ones which were
+        collected meanwhile.
+        """
+        for name, column in columns.iteritems():
+            column.extend(self._columns[name])
+            self._columns[name] = column
+        self._new_names[:0] = names
+        self._new_runs[:0] = runs
+        return failure
+
+    def get_run_stats(self, run_id=None):
+        """
+        Get number of events of each kind per pilot within run of mission.
+        Pending events are flushed first.
+
+        Input:
+        `run_id`    # ID of run. The current run is used by default.
+
+        Output:
+        Deferred which fires with a dict of dicts keyed by callsigns and
+        by names of kinds of events (see `EVENT_KIND.NAMES`). Number of
+        aircraft shot down by pilot is keyed by 'kills'.
+        """
+        run_id = self.run_id if run_id is None else run_id
+        d = self.flush()
+        d.addCallback(lambda unused: self._lock.run(
+            self._call_in_thread, self._query_run, run_id))
+        return d
+
+    def get_runs(self, limit=10):
+        """
+        Get the latest runs of missions.
+
+        Output:
+        Deferred which fires with a list of `(run_id, mission, started)`
+        tuples, the latest run goes first.
+        """
+        d = self.flush()
+        d.addCallback(lambda unused: self._lock.run(
+            self._call_in_thread, self._query_runs, limit))
+        return d
+
+    def close(self):
+        d = self.flush()
+        d.addCallback(lambda unused: self._lock.run(
+            self._call_in_thread, self._close))
+        return d
+
+    def _call_in_thread(self, func, *args):
+        return threads.deferToThread(func, *args)
+
+    # Methods below are called in a thread one at a time ----------------------
+
+    def _connect(self):
+        if self._connection is None:
+            import sqlite3
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _write(self, columns, names, runs):
+        connection = self._connect()
+        # IDs of new names are known for sure only after commit
+        db_ids = dict(self._db_ids)
+        try:
+            for name_id, name in names:
+                connection.execute(
+                    "INSERT OR IGNORE INTO names (name) VALUES (?)", (name, ))
+                db_ids[name_id] = connection.execute(
+                    "SELECT id FROM names WHERE name = ?",
+                    (name, )).fetchone()[0]
+            connection.executemany(
+                "INSERT OR REPLACE INTO runs (id, mission, started) "
+                "VALUES (?, ?, ?)", runs)
+
+            rows = izip(
+                columns['run'], columns['kind'], columns['time'],
+                (db_ids.get(x) for x in columns['pilot']),
+                (db_ids.get(x) for x in columns['aircraft']),
+                (db_ids.get(x) for x in columns['other']),
+                columns['x'], columns['y'],
+            )
+            connection.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        self._db_ids = db_ids
+        return len(columns['kind'])
+
+    def _query_run(self, run_id):
+        connection = self._connect()
+        results = {}
+        rows = connection.execute(
+            "SELECT n.name, e.kind, COUNT(*) FROM events e "
+            "JOIN names n ON n.id = e.pilot WHERE e.run = ? "
+            "GROUP BY e.pilot, e.kind", (run_id, ))
+        for callsign, kind, count in rows:
+            results.setdefault(callsign, {})[EVENT_KIND.NAMES[kind]] = count
+
+        rows = connection.execute(
+            "SELECT n.name, COUNT(*) FROM events e "
+            "JOIN names n ON n.id = e.other WHERE e.run = ? AND e.kind = ? "
+            "GROUP BY e.other", (run_id, EVENT_KIND.SHOT_DOWN))
+        for callsign, count in rows:
+            results.setdefault(callsign, {})['kills'] = count
+        return results
+
+    def _query_runs(self, limit):
+        return self._connect().execute(
+            "SELECT id, mission, started FROM runs ORDER BY id DESC "
+            "LIMIT ?", (limit, )).fetchall()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from minic.benchmarks import Recorder, compare, percentile
+
+
+class BenchmarksTestCase(unittest.TestCase):
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([5, ], 99), 5)
+        self.assertIsNone(percentile([], 50))
+
+    def test_recorder(self):
+        recorder = Recorder()
+        recorder.add('foo', 1.0, units=10)
+        recorder.add('foo', 3.0, units=10)
+
+        results = recorder.results()['foo']
+        self.assertEqual(results['count'], 2)
+        self.assertEqual(results['mean'], 2.0)
+        self.assertEqual(results['max'], 3.0)
+        self.assertEqual(results['throughput'], 5.0)
+
+    def test_compare(self):
+        baseline = {
+            'foo': {'p90': 1.0, },
+            'bar': {'p90': 1.0, },
+        }
+        results = {
+            'foo': {'p90': 1.125, },
+            'bar': {'p90': 1.5, },
+            'baz': {'p90': 1.0, },
+        }
+        self.assertEqual(compare(results, baseline, tolerance=0.2), [
+            ('bar', 1.0, 1.5, 1.5, True),
+            ('foo', 1.0, 1.125, 1.125, False),
+        ])
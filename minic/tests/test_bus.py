@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet.task import Clock
+
+from minic.bus import EventBus
+from minic.constants import DELIVERY
+
+
+class EventBusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.bus.clock = Clock()
+
+    def test_every(self):
+        first, second = [], []
+        self.bus.subscribe('topic', first.append)
+        subscription = self.bus.subscribe('topic', second.append)
+        self.bus.publish('topic', 1)
+        self.bus.publish('other', 2)
+        self.bus.unsubscribe(subscription)
+        self.bus.publish('topic', 3)
+
+        self.assertEqual(first, [1, 3, ])
+        self.assertEqual(second, [1, ])
+
+    def test_latest(self):
+        values = []
+        subscription = self.bus.subscribe('topic', values.append,
+                                          DELIVERY.LATEST)
+        for i in xrange(5):
+            self.bus.publish('topic', i)
+        self.assertEqual(values, [])
+
+        self.bus.clock.advance(0)
+        self.assertEqual(values, [4, ])
+
+        self.bus.publish('topic', 5)
+        self.bus.unsubscribe(subscription)
+        self.bus.clock.advance(0)
+        self.assertEqual(values, [4, ])
+
+    def test_throttled(self):
+        values = []
+        self.bus.subscribe('topic', values.append, DELIVERY.THROTTLED, rate=2)
+        self.bus.publish('topic', 0)
+        self.bus.clock.advance(0)
+        self.assertEqual(values, [0, ])
+
+        # Events are published 8 times per second, delivered twice
+        for i in xrange(1, 9):
+            self.bus.clock.advance(0.125)
+            self.bus.publish('topic', i)
+        self.assertEqual(values, [0, 3, 7, ])
+
+        self.bus.clock.advance(0.5)
+        self.assertEqual(values, [0, 3, 7, 8, ])
+
+        self.bus.clock.advance(10)
+        self.bus.publish('topic', 9)
+        self.bus.clock.advance(0)
+        self.assertEqual(values, [0, 3, 7, 8, 9, ])
+
+        self.assertRaises(ValueError, self.bus.subscribe, 'topic',
+                          values.append, DELIVERY.THROTTLED)
+        self.assertRaises(ValueError, self.bus.subscribe, 'topic',
+                          values.append, 'unknown')
+
+    def test_failing_subscriber(self):
+        values = []
+        self.bus.subscribe('topic', lambda value: 1 / value)
+        self.bus.subscribe('topic', values.append)
+        self.bus.publish('topic', 0)
+        self.assertEqual(values, [0, ])
+
+    def test_demand(self):
+        demand = []
+        self.bus.set_demand_callback('topic', demand.append)
+        first = self.bus.subscribe('topic', lambda value: None)
+        second = self.bus.subscribe('topic', lambda value: None)
+        self.bus.unsubscribe(first)
+        self.bus.unsubscribe(first)
+        self.bus.unsubscribe(second)
+        self.bus.set_demand_callback('topic', None)
+        self.bus.subscribe('topic', lambda value: None)
+
+        self.assertEqual(demand, [False, True, False, ])
+        self.assertTrue(self.bus.has_subscribers('topic'))
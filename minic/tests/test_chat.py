@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet.task import Clock
+
+from minic.constants import CHAT_PRIORITY
+from minic.service.chat import ChatService
+
+
+class FakeTransport(object):
+
+    producer = None
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+
+class FakeConsoleClient(object):
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.messages = []
+
+    def chat_all(self, message):
+        self.messages.append(message)
+
+
+class FakeParent(object):
+
+    def __init__(self):
+        self.cl_client = FakeConsoleClient()
+
+
+class ChatServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parent = FakeParent()
+        self.client = self.parent.cl_client
+        self.chat = ChatService()
+        self.chat.clock = self.clock = Clock()
+        self.chat.rate = 1
+        self.chat.burst = 2
+        self.chat.parent = self.parent
+        self.chat.startService()
+
+    def tearDown(self):
+        if self.chat.running:
+            self.chat.stopService()
+
+    def test_rate_limit(self):
+        for i in range(4):
+            self.chat.chat_all("x" * 60 + str(i))
+        self.assertEqual(len(self.client.messages), 2)
+        self.assertEqual(self.chat.size, 2)
+
+        self.clock.advance(1)
+        self.assertEqual(len(self.client.messages), 3)
+        self.clock.advance(1)
+        self.assertEqual(self.client.messages[-1], "x" * 60 + "3")
+        self.assertEqual(self.chat.size, 0)
+
+    def test_coalescing(self):
+        self.chat.chat_all("a" * 70)
+        self.chat.chat_all("a" * 70)
+        for text in ("b", "c", "d"):
+            self.chat.chat_all(text)
+
+        self.clock.advance(1)
+        self.assertEqual(self.client.messages[-1], "b c d")
+        self.assertEqual(self.chat.size, 0)
+
+    def test_key_replacement_and_priority(self):
+        self.chat.chat_all("a" * 70)
+        self.chat.chat_all("b" * 70)
+        self.chat.chat_all("Hello", priority=CHAT_PRIORITY.INFO)
+        self.chat.chat_all("Loading", key='status')
+        self.chat.chat_all("Starting", key='status')
+
+        self.clock.advance(1)
+        self.assertEqual(self.client.messages[-1], "Starting")
+        self.clock.advance(1)
+        self.assertEqual(self.client.messages[-1], "Hello")
+
+    def test_trim(self):
+        self.chat.max_size = 2
+        self.client.transport.producer.pauseProducing()
+        self.chat.chat_all("info", priority=CHAT_PRIORITY.INFO)
+        self.chat.chat_all("first")
+        self.chat.chat_all("second")
+        self.assertEqual(self.chat.size, 2)
+
+        self.client.transport.producer.resumeProducing()
+        self.assertEqual(self.client.messages, ["first second", ])
+
+    def test_pause_and_flush_on_stop(self):
+        self.assertIs(self.client.transport.producer, self.chat)
+        self.chat.pauseProducing()
+        for i in range(5):
+            self.chat.chat_all("x" * 70)
+        self.clock.advance(10)
+        self.assertEqual(self.client.messages, [])
+
+        self.chat.stopService()
+        self.assertEqual(len(self.client.messages), 5)
+        self.assertIsNone(self.client.transport.producer)
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import tempfile
+import shutil
+import unittest
+
+from il2ds_middleware.constants import MISSION_STATUS
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+from twisted.test.proto_helpers import StringTransport
+
+from minic.headless import ControlFactory, Daemon
+from minic.models import Mission, MissionManager
+from minic.service.objects import ObjectsService
+from minic.service.pilots import PilotsService
+from minic.service.radar import RadarSnapshot
+from minic.settings import user_settings
+
+
+class FakeMissionsService(object):
+
+    def __init__(self):
+        self.status = MISSION_STATUS.NOT_LOADED
+        self.time_left_str = '00:00:00'
+        self.calls = []
+
+    @property
+    def is_mission_playing(self):
+        return self.status == MISSION_STATUS.PLAYING
+
+    def mission_run(self):
+        self.calls.append(('run', MissionManager.get_current_id()))
+        self.status = MISSION_STATUS.PLAYING
+        return defer.succeed(None)
+
+    def mission_stop(self):
+        self.calls.append(('stop', ))
+        self.status = MISSION_STATUS.NOT_LOADED
+        return defer.succeed(None)
+
+    def update_playing_mission(self):
+        self.calls.append(('update', MissionManager.get_current_id()))
+        return defer.succeed(None)
+
+    def index_missions(self):
+        return defer.succeed([
+            (MissionManager.get(5), "Map is not specified"),
+        ])
+
+
+class FakeEventStore(object):
+
+    def get_run_stats(self, run_id=None):
+        return defer.succeed({
+            "user1": {'took_off': 2, 'kills': 1, },
+        })
+
+
+class FakeRootService(object):
+
+    is_connected = True
+    pilots_count = 3
+    pilots_in_flight_count = 1
+
+    def __init__(self, name=None):
+        self.name = name
+        self.mission_manager = MissionManager
+        missions = FakeMissionsService()
+        pilots = PilotsService()
+        pilots.positions.update("user1", 1000, 0)
+        objects = ObjectsService()
+        objects.positions.update("0_Static", 0, 3000)
+        self.commander = type('Commander', (object, ), {
+            'services': type('Services', (object, ), {
+                'missions': missions,
+                'pilots': pilots,
+                'objects': objects,
+                'stats': type('Stats', (object, ), {
+                    'store': FakeEventStore(),
+                }),
+                'radar': type('Radar', (object, ), {
+                    'snapshot': RadarSnapshot(3, 0, ({
+                        'id': 0, 'callsign': "user1",
+                        'pos': {'x': 1, 'y': 2, 'z': 3, },
+                    }, ), ()),
+                    'age': 1.25,
+                    'refresh_requests': 5,
+                    'refreshes_saved': 3,
+                }),
+            }),
+        })
+
+    def set_callbacks(self, *args):
+        self.callbacks = args
+
+
+class DaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.old_values = (user_settings.root, user_settings.clock,
+                           user_settings.missions)
+        user_settings.root = self.root
+        user_settings.clock = Clock()
+        user_settings.missions = {
+            'list': [
+                Mission(3, "first", "first.mis", 60),
+                Mission(5, "second", "second.mis", 30),
+            ],
+            'current_id': None,
+        }
+
+        self.service = FakeRootService()
+        self.missions = self.service.commander.services.missions
+        self.daemon = Daemon(self.service)
+
+        self.other = Daemon(FakeRootService("other"))
+
+        factory = ControlFactory([self.daemon, self.other])
+        self.protocol = factory.buildProtocol(None)
+        self.transport = StringTransport()
+        self.protocol.makeConnection(self.transport)
+
+    def tearDown(self):
+        user_settings.root, user_settings.clock, user_settings.missions = (
+            self.old_values)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def send(self, line):
+        self.transport.clear()
+        self.protocol.dataReceived(line + '\n')
+        return self.transport.value().splitlines()
+
+    def test_autorun_on_first_connection(self):
+        self.daemon.on_connection_done()
+        self.assertEqual(self.missions.calls, [('run', 3), ])
+
+        self.missions.status = MISSION_STATUS.NOT_LOADED
+        self.daemon.on_connection_done()
+        self.assertEqual(len(self.missions.calls), 1)
+
+    def test_commands(self):
+        self.assertEqual(self.send("run"), ["OK", ])
+        self.assertEqual(self.send("run"),
+                         ["ERROR Mission is already playing", ])
+
+        lines = self.send("status")
+        self.assertIn("mission: 3 first", lines)
+        self.assertIn("status: PLAYING", lines)
+        self.assertIn("pilots: 3 (1 in flight)", lines)
+
+        self.assertEqual(self.send("next"), ["OK", ])
+        self.assertEqual(self.missions.calls[-1], ('update', 5))
+        self.assertEqual(self.send("select 3"), ["OK", ])
+        self.assertEqual(self.send("select 4"),
+                         ["ERROR Unknown mission: 4", ])
+
+        lines = self.send("missions")
+        self.assertTrue(lines[0].startswith("*    3 first"))
+        self.assertEqual(lines[-1], "OK")
+
+        self.assertEqual(self.send("check"), [
+            "   5 second: Map is not specified", "OK",
+        ])
+
+        self.assertEqual(self.send("rotation"), ["round_robin", "OK", ])
+        self.assertEqual(self.send("rotation weighted"), ["OK", ])
+        self.assertEqual(self.send("rotation"), ["weighted", "OK", ])
+        self.assertEqual(self.send("rotation foo"),
+                         ["ERROR Unknown rotation policy: foo", ])
+
+        self.assertEqual(self.send("stats"),
+                         ["user1: kills 1, took_off 2", "OK", ])
+
+        self.assertEqual(self.send("radar"), [
+            "version: 3, pilots: 1, objects: 0", "age: 1.2 s",
+            "refreshes: 5 requested, 3 saved", "user1: 1 2 3", "OK",
+        ])
+
+        self.assertEqual(self.send("near 0 0 2000"),
+                         ["pilot user1: 1000 m", "OK", ])
+        self.assertEqual(self.send("near 0 0"), [
+            "pilot user1: 1000 m", "object 0_Static: 3000 m", "OK",
+        ])
+        self.assertEqual(self.send("near 0 foo"),
+                         ["ERROR Invalid coordinates: 0 foo 10000", ])
+
+        self.assertEqual(self.send("stop"), ["OK", ])
+        self.assertEqual(self.send("foo"), ["ERROR Unknown command: foo", ])
+
+    def test_quit(self):
+        self.assertEqual(self.send("quit"), ["OK", ])
+        self.assertTrue(self.transport.disconnecting)
+
+    def test_servers(self):
+        lines = self.send("servers")
+        self.assertEqual(lines, [
+            "* default (connected, NOT_LOADED)",
+            "  other (connected, NOT_LOADED)",
+            "OK",
+        ])
+
+        self.assertEqual(self.send("server other"), ["OK", ])
+        self.assertEqual(self.send("run"), ["OK", ])
+        self.assertEqual(self.other.missions.calls, [('run', 3), ])
+        self.assertEqual(self.missions.calls, [])
+        self.assertIn("server: other", self.send("status"))
+
+        self.assertEqual(self.send("server foo"),
+                         ["ERROR Unknown server: foo", ])
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet.task import Clock
+
+from minic.service.eventlog import EventLogWatchingService
+
+
+class FakeParser(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def parse_line(self, line):
+        self.lines.append(line)
+
+
+class FakeEventLogWatchingService(EventLogWatchingService):
+
+    chunk_size = 8
+
+    def __init__(self, log_path, state=None):
+        EventLogWatchingService.__init__(self, log_path, parser=FakeParser())
+        self.clock = Clock()
+        self.state = state
+
+    def _load_state(self):
+        return self.state
+
+    def _store_state(self, state):
+        self.state = state
+
+
+class ZeroInodeStat(object):
+    """
+    Result of `os.stat` as it is on Windows under Python 2: inode is always 0.
+    """
+
+    def __init__(self, path):
+        self.st_ino = 0
+        self.st_size = os.stat(path).st_size
+
+
+class WindowsEventLogWatchingService(FakeEventLogWatchingService):
+
+    def _stat(self):
+        return ZeroInodeStat(self.log_path)
+
+
+class EventLogWatchingServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.root, 'eventlog.lst')
+        self.write("[0:00:00] old event\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, data, mode='ab'):
+        with open(self.log_path, mode) as f:
+            f.write(data)
+
+    def test_old_events_are_skipped(self):
+        service = FakeEventLogWatchingService(self.log_path)
+        service.startService()
+        self.write("[0:00:01] new event\n[0:00:02] partial")
+        service.do_watch()
+
+        self.assertEqual(service.parser.lines, ["[0:00:01] new event", ])
+        self.write(" event\n")
+        service.do_watch()
+        self.assertEqual(service.parser.lines[-1],
+                         "[0:00:02] partial event")
+        service.stopService()
+
+    def test_resume_from_saved_offset(self):
+        service = FakeEventLogWatchingService(self.log_path)
+        service.startService()
+        self.write("[0:00:01] first\n[0:00:02] sec")
+        service.do_watch()
+        service.stopService()
+
+        self.write("ond\n[0:00:03] third\n")
+
+        service = FakeEventLogWatchingService(self.log_path, service.state)
+        service.startService()
+        service.do_watch()
+        self.assertEqual(service.parser.lines,
+                         ["[0:00:02] second", "[0:00:03] third", ])
+        service.stopService()
+
+    def test_saved_offset_of_other_file_is_ignored(self):
+        state = {
+            'path': self.log_path,
+            'inode': -1,
+            'offset': 0,
+        }
+        service = FakeEventLogWatchingService(self.log_path, state)
+        service.startService()
+        self.assertEqual(service.parser.lines, [])
+        service.stopService()
+
+    def test_truncation(self):
+        service = FakeEventLogWatchingService(self.log_path)
+        service.startService()
+        self.write("[0:00:01] new\n", mode='wb')
+        service.do_watch()
+        self.assertEqual(service.parser.lines, ["[0:00:01] new", ])
+        service.stopService()
+
+    def test_rotation(self):
+        for cls in (FakeEventLogWatchingService,
+                    WindowsEventLogWatchingService):
+            self.write("[0:00:00] old event\n", mode='wb')
+            service = cls(self.log_path)
+            service.startService()
+            os.rename(self.log_path, self.log_path + '.old')
+            self.write("[0:00:01] new\n[0:00:02] newer event\n")
+            service.do_watch()
+            service.do_watch()
+            self.assertEqual(service.parser.lines,
+                             ["[0:00:01] new", "[0:00:02] newer event", ])
+            service.stopService()
+
+    def test_zero_inode_of_path(self):
+        service = WindowsEventLogWatchingService(self.log_path)
+        service.startService()
+        self.write("[0:00:01] new\n[0:00:02] newer\n")
+        for i in xrange(4):
+            service.do_watch()
+        self.assertEqual(service.parser.lines,
+                         ["[0:00:01] new", "[0:00:02] newer", ])
+        service.stopService()
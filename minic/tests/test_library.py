@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from minic.constants import MISSION_FILE_STATE
+
+from minic.library import (
+    MissionFileError, MissionIndex, MissionPreloader, MissionWatcher,
+    get_resource_paths, index_mission_file, read_mission_file,
+)
+
+
+MISSION_CONTENT = """\
+[MAIN]
+  MAP Moscow/load.ini
+  TIME 12.0
+[Wing]
+  r0100
+[r0100]
+  Planes 1
+[NStationary]
+  1_Static vehicles.artillery.Artillery$Flak18_37mm 1 0.0 0.0 0.0 0.0
+"""
+
+
+class SynchronousPreloader(MissionPreloader):
+
+    reads = 0
+
+    def _read(self, path):
+        self.reads += 1
+        return defer.maybeDeferred(read_mission_file, path)
+
+
+class SynchronousIndex(MissionIndex):
+
+    def _call_in_thread(self, func, *args):
+        return defer.maybeDeferred(func, *args)
+
+
+class LibraryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = self.write('foo.mis', MISSION_CONTENT)
+        self.write('foo.properties', "Name Foo")
+        self.write('foo_ru.properties', "Name Foo")
+        self.write('foobar.properties', "Name Foobar")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_read_mission_file(self):
+        self.assertEqual(
+            [os.path.basename(x) for x in get_resource_paths(self.path)],
+            ['foo.properties', 'foo_ru.properties', ])
+
+        mission_file = read_mission_file(self.path)
+        self.assertEqual(mission_file.map_name, "Moscow/load.ini")
+        self.assertEqual(mission_file.size, len(MISSION_CONTENT))
+
+        path = self.write('bar.mis', "[Wing]\n  r0100\n")
+        self.assertRaises(MissionFileError, read_mission_file, path)
+        self.assertRaises(MissionFileError, read_mission_file,
+                          os.path.join(self.root, 'missing.mis'))
+
+    def test_preloader_cache(self):
+        preloader = SynchronousPreloader()
+        results = []
+        preloader.preload(self.path).addCallback(results.append)
+        preloader.preload(self.path).addCallback(results.append)
+        self.assertEqual(preloader.reads, 1)
+        self.assertEqual(len(results), 2)
+
+        self.write('foo.mis', MISSION_CONTENT + "  r0101\n")
+        preloader.preload(self.path)
+        self.assertEqual(preloader.reads, 2)
+
+        failures = []
+        preloader.preload(os.path.join(self.root, 'missing.mis')).addErrback(
+            failures.append)
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(MissionFileError)
+
+    def test_index_mission_file(self):
+        info = index_mission_file(self.path)
+        self.assertIsNone(info.error)
+        self.assertEqual(info.map_name, "Moscow/load.ini")
+        self.assertEqual(info.objects['wings'], 1)
+        self.assertEqual(info.objects['stationary'], 1)
+        self.assertEqual(info.objects['chiefs'], 0)
+
+        path = self.write('bar.mis', "[MAIN]\n  MAP Moscow/load.ini\n"
+                                     "[Wing]\n  r0100\n")
+        self.assertIn("r0100", index_mission_file(path).error)
+        path = self.write('bar.mis', "[Wing]\n  r0100\n")
+        self.assertIsNotNone(index_mission_file(path).error)
+        self.assertIsNotNone(
+            index_mission_file(os.path.join(self.root, 'missing.mis')).error)
+
+    def test_index_scan(self):
+        os.mkdir(os.path.join(self.root, 'sub'))
+        self.write(os.path.join('sub', 'bar.mis'), "[Wing]\n  r0100\n")
+        cache_path = os.path.join(self.root, 'missions.index')
+        index = SynchronousIndex(cache_path)
+        index.pool_threshold = 1
+        index.processes = 2
+
+        results = []
+        index.scan(self.root).addCallback(results.append)
+        self.assertEqual(len(results[0]), 2)
+        bar_path = os.path.join(self.root, 'sub', 'bar.mis')
+        self.assertEqual([x.path for x in index.invalid()], [bar_path, ])
+        self.assertIsNotNone(index.get_error(bar_path))
+        self.assertIsNone(index.get_error(self.path))
+
+        # Pool of processes is kept for later checks
+        pool = index._pool
+        self.assertIsNotNone(pool)
+        index.update([self.path, bar_path])
+        self.assertIs(index._pool, pool)
+        index.close()
+        self.assertIsNone(index._pool)
+
+        # Unchanged files are not checked again, even after restart
+        checked = []
+        index = SynchronousIndex(cache_path)
+        index._index_files = lambda paths, pool=None: (
+            checked.extend(paths) or map(index_mission_file, paths))
+        self.write(os.path.join('sub', 'bar.mis'), MISSION_CONTENT)
+        os.remove(self.path)
+        index.scan(self.root)
+        self.assertEqual(checked, [bar_path, ])
+        self.assertEqual(index.invalid(), [])
+        self.assertIsNone(index.get(self.path))
+
+    def test_index_update(self):
+        index = SynchronousIndex()
+        missing_path = os.path.join(self.root, 'missing.mis')
+        self.assertEqual(index.get_state(self.path), MISSION_FILE_STATE.UNKNOWN)
+
+        changes = []
+        index.subscribe(changes.append)
+        index.scan(self.root)
+        self.assertEqual(changes, [[self.path, ], ])
+        self.assertEqual(index.get_state(self.path), MISSION_FILE_STATE.OK)
+        self.assertEqual(index.get_state(missing_path),
+                         MISSION_FILE_STATE.MISSING)
+
+        self.write('foo.mis', "[Wing]\n")
+        index.update([self.path, missing_path])
+        self.assertEqual(changes[-1], [self.path, ])
+        self.assertEqual(index.get_state(self.path),
+                         MISSION_FILE_STATE.INVALID)
+
+        os.remove(self.path)
+        index.update([self.path, ])
+        self.assertEqual(index.get_state(self.path),
+                         MISSION_FILE_STATE.MISSING)
+
+        # Nothing is reported if nothing is changed
+        index.scan(self.root)
+        self.assertEqual(len(changes), 3)
+
+    def test_watcher_polling(self):
+        index = SynchronousIndex()
+        watcher = MissionWatcher(index, self.root)
+        watcher.clock = clock = Clock()
+        watcher.interval = 10
+        watcher.start(use_inotify=False)
+        self.assertEqual(index.get_state(self.path), MISSION_FILE_STATE.OK)
+
+        path = self.write('bar.mis', MISSION_CONTENT)
+        self.assertEqual(index.get_state(path), MISSION_FILE_STATE.MISSING)
+        clock.advance(10)
+        self.assertEqual(index.get_state(path), MISSION_FILE_STATE.OK)
+
+        watcher.stop()
+        self.assertFalse(watcher.running)
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    def test_watcher_batches_changes(self):
+        index = SynchronousIndex()
+        watcher = MissionWatcher(index, self.root)
+        watcher.clock = clock = Clock()
+        updates = []
+
+        def update(paths):
+            updates.append(paths)
+            return defer.succeed([])
+
+        index.update = update
+
+        watcher._schedule_update(self.path)
+        watcher._schedule_update(self.path)
+        self.assertEqual(updates, [])
+        clock.advance(watcher.delay)
+        self.assertEqual(updates, [[self.path, ], ])
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet import defer
+
+from minic.metrics import MetricsRegistry, ServerMetric, metrics
+from minic.web import MetricsResource
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_get_or_create(self):
+        counter = self.registry.counter('foo_total')
+        self.assertIs(self.registry.counter('foo_total'), counter)
+        self.assertRaises(ValueError, self.registry.gauge, 'foo_total')
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('foo_seconds', buckets=(1, 5, ))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.samples(), [
+            ('foo_seconds_bucket{le="1"}', 2),
+            ('foo_seconds_bucket{le="5"}', 3),
+            ('foo_seconds_bucket{le="+Inf"}', 4),
+            ('foo_seconds_sum', 14.5),
+            ('foo_seconds_count', 4),
+        ])
+
+    def test_timed(self):
+        histogram = self.registry.histogram('foo_seconds')
+
+        @histogram.timed
+        def func(value):
+            return value
+
+        self.assertEqual(func(1), 1)
+        self.assertEqual(histogram.count, 1)
+
+        d = defer.Deferred()
+        self.assertIs(func(d), d)
+        self.assertEqual(histogram.count, 1)
+        d.callback(None)
+        self.assertEqual(histogram.count, 2)
+
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 3)
+
+    def test_labeled_collectors(self):
+        self.registry.register_collector('bar', lambda: 1,
+                                          description="Bars",
+                                          labels={'server': 'a', })
+        self.registry.register_collector('bar', lambda: 2,
+                                          labels={'server': 'b', })
+        self.assertEqual(self.registry.render(), (
+            "# HELP bar Bars\n"
+            "# TYPE bar gauge\n"
+            "bar{server=\"a\"} 1\n"
+            "bar{server=\"b\"} 2\n"
+        ))
+
+        self.registry.unregister_collector('bar', labels={'server': 'a', })
+        self.registry.unregister_collector('bar', labels={'server': 'b', })
+        self.assertEqual(self.registry.render(), "\n")
+
+    def test_labeled_metrics(self):
+        first = {'server': 'a', }
+        self.registry.counter('foo_total', "Foos", labels=first).inc(2)
+        self.registry.counter('foo_total', labels={'server': 'b', }).inc()
+        self.assertIs(self.registry.counter('foo_total', labels=first),
+                      self.registry.get('foo_total', first))
+        self.assertRaises(ValueError, self.registry.gauge, 'foo_total')
+        self.registry.histogram('foo_seconds', buckets=(1, ),
+                                labels=first).observe(2)
+        self.registry.register_collector('bar', lambda: 1, labels=first)
+        self.assertEqual(self.registry.render(), (
+            "# TYPE foo_seconds histogram\n"
+            "foo_seconds_bucket{server=\"a\",le=\"1\"} 0\n"
+            "foo_seconds_bucket{server=\"a\",le=\"+Inf\"} 1\n"
+            "foo_seconds_sum{server=\"a\"} 2\n"
+            "foo_seconds_count{server=\"a\"} 1\n"
+            "# HELP foo_total Foos\n"
+            "# TYPE foo_total counter\n"
+            "foo_total{server=\"a\"} 2\n"
+            "foo_total{server=\"b\"} 1\n"
+            "# TYPE bar gauge\n"
+            "bar{server=\"a\"} 1\n"
+        ))
+
+        self.registry.unregister_labels(first)
+        self.assertEqual(self.registry.render(), (
+            "# TYPE foo_total counter\n"
+            "foo_total{server=\"b\"} 1\n"
+        ))
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('foo_total', labels={
+            'server': 'a "b"\\c\nd',
+        }).inc()
+        self.assertEqual(self.registry.render(), (
+            "# TYPE foo_total counter\n"
+            "foo_total{server=\"a \\\"b\\\"\\\\c\\nd\"} 1\n"
+        ))
+
+    def test_server_metric(self):
+        first, second = FakeServer('a'), FakeServer('b')
+        first.foo_count.inc()
+        self.assertIs(first.foo_count, first.foo_count)
+        self.assertEqual(first.foo_count.value, 1)
+        self.assertEqual(second.foo_count.value, 0)
+        self.assertIs(metrics.get('test_foo_total', {'server': 'a', }),
+                      first.foo_count)
+        for server in (first, second):
+            metrics.unregister_labels(server.metric_labels)
+        self.assertIsNone(metrics.get('test_foo_total', {'server': 'a', }))
+
+    def test_render(self):
+        self.registry.counter('foo_total', "Number of foos").inc(2)
+        values = [1, ]
+        self.registry.register_collector('bar', lambda: values[0])
+        values[0] = 5
+
+        self.assertEqual(self.registry.render(), (
+            "# HELP foo_total Number of foos\n"
+            "# TYPE foo_total counter\n"
+            "foo_total 2\n"
+            "# TYPE bar gauge\n"
+            "bar 5\n"))
+        self.assertEqual(MetricsResource(self.registry).render_GET(
+            FakeRequest()), self.registry.render())
+
+        self.registry.unregister_collector('bar')
+        self.assertNotIn('bar', self.registry.render())
+
+
+class FakeServer(object):
+
+    foo_count = ServerMetric('counter', 'test_foo_total', "Foos")
+
+    def __init__(self, name):
+        self.metric_labels = {'server': name, }
+
+
+class FakeRequest(object):
+
+    def setHeader(self, name, value):
+        pass
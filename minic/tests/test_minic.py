@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import sys
 import unittest
 
 import minic
 
+from minic.app import start_metrics_service
+
 
 class CommonsTestCase(unittest.TestCase):
 
@@ -43,3 +46,18 @@ class CommonsTestCase(unittest.TestCase):
         self.assertFalse(minic.version_lt((1, 0, 1), (1, 0, 0)))
         self.assertFalse(minic.version_lt((1, 1, 0), (1, 0, 0)))
         self.assertFalse(minic.version_lt((1, 1, 1), (1, 0, 0)))
+
+
+class AppTestCase(unittest.TestCase):
+
+    def test_metrics_endpoint_is_optional(self):
+        # Frozen build may lack modules needed by `twisted.web`
+        module = sys.modules.get('minic.web')
+        sys.modules['minic.web'] = None
+        try:
+            self.assertIsNone(start_metrics_service(20200))
+        finally:
+            if module is None:
+                del sys.modules['minic.web']
+            else:
+                sys.modules['minic.web'] = module
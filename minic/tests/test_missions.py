@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from il2ds_middleware.constants import MISSION_STATUS
+from il2ds_middleware.parser import ConsoleParser
+from il2ds_middleware.service import MutedPilotsService
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from minic.bus import EventBus
+from minic.constants import BUS_TOPIC
+from minic.library import MissionFileError, MissionIndex, MissionInfo
+from minic.models import Mission, MissionManager
+from minic.service.chat import ChatService
+from minic.service.missions import MissionsService
+from minic.service.pilots import PilotsService
+from minic.service.radar import RadarService
+from minic.service.stats import StatsService
+from minic.settings import user_settings
+
+
+class FakeConsoleClient(object):
+
+    timeout = 1
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.requests = []
+        self.messages = []
+
+    def send_request(self, line, timeout=None):
+        d = defer.Deferred()
+        self.requests.append((line, timeout, d))
+        return d
+
+    def mission_status(self, timeout=None):
+        return self.send_request("mission", timeout).addCallback(
+            self.parser.mission_status)
+
+    def mission_load(self, mission, timeout=None):
+        return self.send_request("mission LOAD " + mission, timeout)\
+            .addCallback(self.parser.mission_status)
+
+    def mission_destroy(self, timeout=None):
+        self.send_request("mission DESTROY", timeout)
+        return self.mission_status(timeout)
+
+    def chat_all(self, message):
+        self.messages.append(message)
+
+
+class FakeParent(object):
+
+    dl_client = None
+    connection_was_lost = False
+
+    def __init__(self, cl_client):
+        self.cl_client = cl_client
+        self.mission_manager = MissionManager
+        self.bus = EventBus()
+
+        chat = ChatService()
+        chat.clock = Clock()
+        chat.parent = self
+        pilots = PilotsService()
+        pilots.parent = self
+        self.services = type('Services', (object, ), {
+            'chat': chat,
+            'pilots': pilots,
+            'stats': StatsService(),
+            'radar': RadarService(),
+        })
+
+
+class FakePreloader(object):
+
+    def preload(self, path):
+        if 'broken' in path:
+            return defer.fail(MissionFileError("broken"))
+        return defer.succeed(path)
+
+
+class MissionsServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.old_values = (user_settings.root, user_settings.clock,
+                           user_settings.missions, user_settings.server_path)
+        user_settings.root = self.root
+        user_settings.clock = Clock()
+        user_settings.server_path = os.path.join(self.root, 'il2server.exe')
+        user_settings.missions = {
+            'list': [
+                Mission(1, "first", "first.mis", 60),
+                Mission(2, "broken", "broken.mis", 60),
+                Mission(3, "third", "third.mis", 30),
+            ],
+            'current_id': 1,
+        }
+
+        self.service = MissionsService()
+        self.service.clock = Clock()
+        self.service.preloader = FakePreloader()
+        self.service.index = MissionIndex()
+        self.client = FakeConsoleClient(
+            ConsoleParser((MutedPilotsService(), self.service)))
+        self.service.parent = FakeParent(self.client)
+
+    def tearDown(self):
+        (user_settings.root, user_settings.clock, user_settings.missions,
+         user_settings.server_path) = self.old_values
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_find_next_mission(self):
+        results = []
+        self.service._find_next_mission(1).addCallback(results.append)
+        self.service._find_next_mission(3).addCallback(results.append)
+        self.assertEqual([m.id for m in results], [3, 1, ])
+
+    def test_find_next_mission_skips_invalid(self):
+        path = MissionManager.absolute_path("third.mis")
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write("[Wing]\n")
+        stat = os.stat(path)
+        self.service.index._entries = {
+            path: MissionInfo(path, stat.st_size, stat.st_mtime, None, [], {},
+                              "Map is not specified"),
+        }
+
+        results = []
+        self.service._find_next_mission(1).addCallback(results.append)
+        self.assertEqual(results[0].id, 1)
+
+    def test_check_missions(self):
+        root = MissionManager.get_root_path()
+        path = os.path.join(root, "first.mis")
+        self.service.index._entries = {
+            path: MissionInfo(path, 1, 1, None, [], {}, "Map is not specified"),
+        }
+        self.service.index._roots.add(root)
+
+        self.assertEqual(
+            [(m.id, problem) for m, problem in self.service.check_missions()],
+            [(1, "Map is not specified"), (2, "File is missing"),
+             (3, "File is missing"), ])
+
+    def test_mission_run(self):
+        statuses = []
+        self.service.bus.subscribe(BUS_TOPIC.MISSION_STATUS, statuses.append)
+        d = self.service.mission_run()
+        path = os.path.join('Net', 'dogfight', 'first.mis')
+
+        # Mission is begun without waiting for it to load
+        self.assertEqual(
+            [line for line, timeout, unused in self.client.requests], [
+                "mission LOAD " + path, "mission BEGIN", "mission",
+            ])
+        self.assertEqual(self.service.status, MISSION_STATUS.LOADING)
+
+        responses = [
+            ["Mission: {0} is Loaded".format(path), ],
+            [],
+            ["Mission: {0} is Playing".format(path), ],
+        ]
+        for (line, timeout, request), response in zip(
+            self.client.requests, responses
+        ):
+            request.callback(response)
+
+        self.assertTrue(d.called)
+        self.assertEqual(self.service.status, MISSION_STATUS.PLAYING)
+        self.assertEqual(self.service.current_mission.id, 1)
+        self.assertEqual(statuses[0], MISSION_STATUS.LOADING)
+        self.assertEqual(statuses[-1], MISSION_STATUS.PLAYING)
+
+    def test_mission_run_fails_to_load(self):
+        d = self.service.mission_run()
+        path = os.path.join('Net', 'dogfight', 'first.mis')
+        self.client.requests[0][2].errback(defer.TimeoutError())
+
+        self.assertEqual(self.service.status, MISSION_STATUS.NOT_LOADED)
+        self.assertIsNone(self.service.current_mission)
+        self.assertEqual(self.client.messages[-1], "Failed to load mission.")
+
+        # Mission begun by pipelined request is destroyed
+        self.assertEqual(
+            [line for line, timeout, unused in self.client.requests], [
+                "mission LOAD " + path, "mission BEGIN", "mission",
+                "mission DESTROY", "mission",
+            ])
+        responses = [
+            [],
+            ["Mission: {0} is Playing".format(path), ],
+            [],
+            ["Mission NOT loaded", ],
+        ]
+        for (line, timeout, request), response in zip(
+            self.client.requests[1:], responses
+        ):
+            request.callback(response)
+
+        self.assertTrue(d.called)
+        self.assertEqual(self.service.status, MISSION_STATUS.NOT_LOADED)
+        self.assertIsNone(self.service.current_mission)
+
+    def test_mission_resume(self):
+        self.service._deadline = self.service._timer.now() + 100
+        d = self.service.mission_resume()
+        path = os.path.join('Net', 'dogfight', 'first.mis')
+
+        self.client.requests[0][2].callback(
+            ["Mission: {0} is Playing".format(path), ])
+
+        self.assertTrue(d.called)
+        self.assertEqual(len(self.client.requests), 1)
+        self.assertEqual(self.service.status, MISSION_STATUS.PLAYING)
+        self.assertEqual(self.service.current_mission.id, 1)
+        self.assertIn(self.service.time_left, [99, 100])
+
+    def test_mission_resume_runs_stopped_mission(self):
+        self.service._deadline = self.service._timer.now() + 100
+        self.service.mission_resume()
+        self.client.requests[0][2].callback(["Mission NOT loaded", ])
+
+        self.assertEqual(self.client.requests[1][0], "mission LOAD " +
+                         os.path.join('Net', 'dogfight', 'first.mis'))
+        self.assertEqual(self.service.status, MISSION_STATUS.LOADING)
+
+    def test_mission_replace(self):
+        self.service.status = MISSION_STATUS.PLAYING
+        self.service.current_mission = MissionManager.get(1)
+
+        d = self.service.mission_replace(MissionManager.get(3))
+        path = os.path.join('Net', 'dogfight', 'third.mis')
+
+        # All requests are sent at once
+        self.assertEqual(
+            [line for line, timeout, unused in self.client.requests], [
+                "mission DESTROY", "mission", "mission LOAD " + path,
+                "mission BEGIN", "mission",
+            ])
+
+        responses = [
+            [],
+            ["Mission NOT loaded", ],
+            ["Mission: {0} is Loaded".format(path), ],
+            [],
+            ["Mission: {0} is Playing".format(path), ],
+        ]
+        statuses = [
+            MISSION_STATUS.STOPPING, MISSION_STATUS.LOADING,
+            MISSION_STATUS.STARTING, MISSION_STATUS.STARTING,
+            MISSION_STATUS.PLAYING,
+        ]
+        for (line, timeout, request), response, status in zip(
+            self.client.requests, responses, statuses
+        ):
+            request.callback(response)
+            self.assertEqual(self.service.status, status)
+
+        self.assertTrue(d.called)
+        self.assertEqual(self.service.current_mission.id, 3)
+        self.assertEqual(self.service.time_left, 30 * 60)
+
+    def test_mission_replace_fails_to_load(self):
+        self.service.status = MISSION_STATUS.PLAYING
+        self.service.current_mission = MissionManager.get(1)
+
+        d = self.service.mission_replace(MissionManager.get(3))
+        path = os.path.join('Net', 'dogfight', 'third.mis')
+        requests = list(self.client.requests)
+        requests[0][2].callback([])
+        requests[1][2].callback(["Mission NOT loaded", ])
+        requests[2][2].errback(defer.TimeoutError())
+
+        self.assertEqual(self.service.status, MISSION_STATUS.NOT_LOADED)
+        self.assertIsNone(self.service.current_mission)
+        self.assertEqual(
+            [line for line, timeout, unused in self.client.requests], [
+                "mission DESTROY", "mission", "mission LOAD " + path,
+                "mission BEGIN", "mission", "mission DESTROY", "mission",
+            ])
+
+        for (line, timeout, request), response in zip(
+            self.client.requests[3:], [[], [], [], ["Mission NOT loaded", ]]
+        ):
+            request.callback(response)
+        self.assertTrue(d.called)
+        self.assertEqual(self.service.status, MISSION_STATUS.NOT_LOADED)
+
+    def test_empty_server(self):
+        clock = self.service.clock
+        self.service._timer.now = clock.seconds
+        pilots = self.service.parent.services.pilots
+        pilots.subscribe(self.service._on_pilots_changed)
+        self.service.current_mission = MissionManager.get(1)
+        self.service.began()
+
+        # Countdown of mission nobody plays is paused
+        clock.advance(self.service.empty_delay)
+        self.assertTrue(self.service._timer.paused)
+        clock.advance(1000)
+        self.assertEqual(self.service.time_left,
+                         3600 - self.service.empty_delay)
+
+        pilots.user_joined({'callsign': "user", })
+        self.assertTrue(self.service._timer.running)
+        clock.advance(100)
+        self.assertEqual(self.service.time_left,
+                         3500 - self.service.empty_delay)
+
+        # Mission which was played is cut when the last pilot leaves
+        pilots.user_left({'callsign': "user", })
+        clock.advance(self.service.empty_delay)
+        self.assertEqual(self.service.time_left,
+                         self.service.empty_time_left)
+
+    def test_extension(self):
+        clock = self.service.clock
+        self.service._timer.now = clock.seconds
+        self.service.max_extensions = 1
+        rotations = []
+
+        def rotate():
+            rotations.append(True)
+            return defer.succeed(None)
+
+        self.service.rotate = rotate
+
+        pilots = self.service.parent.services.pilots
+        for i in range(self.service.extend_pilots):
+            pilots.user_joined({'callsign': str(i), })
+            pilots.took_off({'callsign': str(i), })
+        self.service.current_mission = MissionManager.get(1)
+        self.service.began()
+
+        clock.advance(3600)
+        self.assertEqual(rotations, [])
+        self.assertEqual(self.service.time_left,
+                         self.service.extend_minutes * 60)
+
+        clock.advance(self.service.extend_minutes * 60)
+        self.assertEqual(rotations, [True, ])
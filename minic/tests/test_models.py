@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from minic.models import (
+    DEFAULT_ROTATION_RULE, Mission, MissionList, MissionRegistry,
+)
+
+
+class MissionRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.raw_list = [
+            [3, "first", "first.mis", 60],
+            [1, "second", "second.mis", 30],
+            [7, "third", "third.mis", 90],
+        ]
+        self.registry = MissionRegistry()
+        self.registry.bind(self.raw_list)
+
+    def test_items_are_wrapped_in_place(self):
+        self.assertIs(self.registry.all(), self.raw_list)
+        for item in self.raw_list:
+            self.assertIsInstance(item, Mission)
+
+    def test_lookups(self):
+        self.assertEqual(len(self.registry), 3)
+        self.assertEqual(self.registry.get(1).name, "second")
+        self.assertIsNone(self.registry.get(2))
+
+        self.assertEqual(self.registry.index_of(7), 2)
+        self.assertEqual(self.registry.index_of(2), -1)
+
+        self.assertEqual(self.registry.id_at(0), 3)
+        self.assertIsNone(self.registry.id_at(3))
+
+        self.assertEqual(self.registry.max_id(), 7)
+        self.assertIn(3, self.registry)
+
+    def test_bind_same_list_does_not_rebuild(self):
+        self.registry._positions[3] = 100
+        self.registry.bind(self.raw_list)
+        self.assertEqual(self.registry.index_of(3), 100)
+
+    def test_bind_reordered_list(self):
+        reordered = list(reversed(self.raw_list))
+        self.registry.bind(reordered)
+        self.assertEqual(self.registry.index_of(7), 0)
+        self.assertEqual(self.registry.index_of(3), 2)
+        self.assertEqual(self.registry.id_at(1), 1)
+
+    def test_empty(self):
+        registry = MissionRegistry()
+        registry.bind([])
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(registry.max_id(), 0)
+        self.assertIsNone(registry.id_at(0))
+
+
+class FakeSettings(object):
+
+    missions = None
+    syncs = 0
+
+    def sync(self):
+        self.syncs += 1
+
+
+class MissionListTestCase(unittest.TestCase):
+
+    def test_lists_are_independent(self):
+        first = MissionList(FakeSettings())
+        second = MissionList(FakeSettings())
+
+        first.update([(1, "first", "first.mis", 60), ])
+        first.set_current_id(1)
+
+        self.assertEqual(first.count(), 1)
+        self.assertEqual(first.get_current_mission().name, "first")
+        self.assertEqual(first.settings.syncs, 2)
+        self.assertEqual(second.count(), 0)
+        self.assertIsNone(second.get_current_mission())
+        self.assertEqual(second.generate_id(), 1)
+
+    def test_rules(self):
+        missions = MissionList(FakeSettings())
+        self.assertEqual(missions.get_rule(1), DEFAULT_ROTATION_RULE)
+
+        rule = DEFAULT_ROTATION_RULE._replace(weight=3, hours=[22, 6])
+        missions.set_rule(1, rule)
+        self.assertEqual(missions.get_rule(1), rule)
+        self.assertEqual(missions.get_rule(2), DEFAULT_ROTATION_RULE)
+
+        missions.set_rule(1, None)
+        self.assertEqual(missions.get_rule(1), DEFAULT_ROTATION_RULE)
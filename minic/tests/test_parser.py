@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import re
+import unittest
+
+from il2ds_middleware.service import MutedObjectsService, MutedPilotsService
+
+from minic.parser import EVENT_LOG_EVENTS, EventLogParser, is_subscribed
+
+
+class PilotsService(MutedPilotsService):
+
+    def __init__(self):
+        self.events = []
+
+    def took_off(self, info):
+        self.events.append(('took_off', info))
+
+    def was_shot_down_by_user(self, info):
+        self.events.append(('was_shot_down_by_user', info))
+
+
+class EventLogParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pilots = PilotsService()
+        self.parser = EventLogParser((self.pilots, MutedObjectsService(), ))
+
+    def test_keywords_belong_to_regexes(self):
+        for name, rx, processors, keyword in EVENT_LOG_EVENTS:
+            pattern = re.sub(r'#.*', '', rx)
+            self.assertIn(keyword, pattern, name)
+
+    def test_subscriptions(self):
+        self.assertTrue(is_subscribed(self.pilots, 'took_off'))
+        self.assertFalse(is_subscribed(self.pilots, 'landed'))
+        self.assertFalse(is_subscribed(self.pilots, 'unknown'))
+        self.assertEqual(self.parser.event_names,
+                         ['took_off', 'was_shot_down_by_user', ])
+        # Regexes of other events are not compiled
+        self.assertEqual(sorted(self.parser._parsers),
+                         ['took_off', 'was_shot_down_by_user', ])
+
+    def test_parse_line(self):
+        self.parser.parse_line(
+            "[8:49:32 PM] User:Pe-8 in flight at 100.0 200.99")
+        self.parser.parse_line(
+            "[8:49:32 PM] User:Pe-8 landed at 100.0 200.99")
+        self.parser.parse_line(
+            "[8:49:32 PM] User1:Pe-8 shot down by User2:Bf-109G-6_Late "
+            "at 100.0 200.99")
+
+        self.assertEqual(len(self.pilots.events), 2)
+        name, info = self.pilots.events[0]
+        self.assertEqual(name, 'took_off')
+        self.assertEqual(info['callsign'], "User")
+        self.assertEqual(info['pos'], {'x': 100.0, 'y': 200.99, })
+
+        name, info = self.pilots.events[1]
+        self.assertEqual(name, 'was_shot_down_by_user')
+        self.assertEqual(info['attacker']['callsign'], "User2")
+
+        self.assertEqual(self.parser.counters, {
+            'lines': 3,
+            'events': 2,
+            'by_event': {'took_off': 1, 'was_shot_down_by_user': 1, },
+        })
+
+    def test_subscribe(self):
+        events = []
+        self.parser.subscribe('landed', events.append)
+        self.parser.parse_line(
+            "[8:49:32 PM] User:Pe-8 landed at 100.0 200.99")
+        self.assertEqual(len(events), 1)
+
+        self.parser.unsubscribe('landed', events.append)
+        self.assertNotIn('landed', self.parser.event_names)
+        self.assertRaises(ValueError, self.parser.subscribe, 'foo', None)
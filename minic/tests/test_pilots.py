@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet import defer
+
+from minic.bus import EventBus
+from minic.service.pilots import PilotsService
+from minic.service.radar import RadarService, RadarSnapshot
+
+
+class FakeConsoleClient(object):
+
+    def __init__(self):
+        self.users = defer.Deferred()
+
+    def users_common_info(self):
+        return self.users
+
+
+class FakeParent(object):
+
+    def __init__(self):
+        self.cl_client = FakeConsoleClient()
+        self.bus = EventBus()
+        self.services = type('Services', (object, ), {
+            'radar': RadarService(),
+        })
+
+
+class PilotsServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.service = PilotsService()
+        self.service.parent = FakeParent()
+        self.changes = []
+        self.service.subscribe(lambda: self.changes.append(
+            (self.service.count, self.service.in_flight_count)))
+
+    def test_index(self):
+        self.service.user_joined({'callsign': "a", 'channel': 1, 'ip': "ip"})
+        self.service.user_joined({'callsign': "b", 'channel': 2, 'ip': "ip"})
+        self.service.took_off({'callsign': "a", })
+        self.service.took_off({'callsign': "a", })
+        self.assertEqual(self.changes, [(1, 0), (2, 0), (2, 1), ])
+        self.assertEqual(self.service.online["b"].channel, 2)
+
+        self.service.user_left({'callsign': "a", })
+        self.assertEqual(self.changes[-1], (1, 0))
+        self.service.landed({'callsign': "b", })
+        self.service.user_left({'callsign': "c", })
+        self.assertEqual(len(self.changes), 4)
+
+    def test_users_on_start(self):
+        self.service.startService()
+        self.service.user_joined({'callsign': "a", })
+        self.service.user_joined({'callsign': "old", })
+        self.service.took_off({'callsign': "old", })
+        self.service.parent.cl_client.users.callback({"a": {}, "b": {}, })
+
+        self.assertEqual(sorted(self.service.online), ["a", "b", ])
+        self.assertEqual(self.service.in_flight_count, 0)
+
+        self.service.stopService()
+        self.assertEqual(self.service.count, 0)
+
+    def test_positions(self):
+        self.service.startService()
+        radar = self.service.parent.services.radar
+        for callsign, army in (("a", "Red"), ("b", "Red"), ("c", "Blue")):
+            self.service.user_joined({'callsign': callsign, })
+            self.service.selected_army({
+                'callsign': callsign, 'army': army,
+                'pos': {'x': 0.0, 'y': 0.0, },
+            })
+
+        for subscriber in radar._subscribers:
+            subscriber(RadarSnapshot(1, 0, tuple(
+                {'callsign': callsign, 'pos': {'x': x, 'y': 0, 'z': 0, }, }
+                for callsign, x in (("a", 0), ("b", 1000), ("c", 5000))
+            ), ()))
+
+        self.assertEqual(self.service.get_pilots_near(0, 0, 2000),
+                         [(0, "a"), (1000, "b"), ])
+        self.assertEqual(self.service.get_nearest_enemy("a"), (5000, "c"))
+        self.assertEqual(self.service.get_nearest_enemy("c"), (4000, "b"))
+
+        self.service.took_off({
+            'callsign': "c", 'pos': {'x': 500.0, 'y': 0.0, },
+        })
+        self.assertEqual(self.service.get_nearest_enemy("a"), (500, "c"))
+
+        self.service.user_left({'callsign': "c", })
+        self.assertIsNone(self.service.get_nearest_enemy("a"))
+        self.service.stopService()
+        self.assertEqual(len(self.service.positions), 0)
+        self.assertEqual(radar._subscribers, [])
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+from minic.profiling import ImportProfiler
+
+
+class ImportProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        sys.path.insert(0, self.root)
+
+        for name, content in [
+            ('minic_test_parent', "import minic_test_child\n"),
+            ('minic_test_child', "VALUE = 1\n"),
+        ]:
+            with open(os.path.join(self.root, name + '.py'), 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        sys.path.remove(self.root)
+        for name in ('minic_test_parent', 'minic_test_child'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_imports(self):
+        profiler = ImportProfiler()
+        profiler.install()
+        try:
+            import minic_test_parent
+            import minic_test_parent
+        finally:
+            profiler.uninstall()
+
+        self.assertFalse(profiler.is_installed)
+        self.assertEqual(set(profiler.imports),
+                         set(['minic_test_parent', 'minic_test_child', ]))
+
+        own, cumulative = profiler.imports['minic_test_parent']
+        child_own, child_cumulative = profiler.imports['minic_test_child']
+        self.assertAlmostEqual(cumulative, own + child_cumulative)
+
+        profiler.mark("done")
+        stream = StringIO()
+        profiler.report(stream)
+        self.assertIn("done", stream.getvalue())
+        self.assertIn("minic_test_child", stream.getvalue())
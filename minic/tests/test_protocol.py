@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.test.proto_helpers import StringTransport
+
+from il2ds_middleware.constants import DEVICE_LINK_OPCODE as DL_OPCODE
+
+from minic.protocol import (
+    ConsoleClient, DeviceLinkClient, ReconnectingConsoleClientFactory,
+)
+
+
+class FakeParser(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def parse_line(self, line):
+        self.lines.append(line)
+
+
+class ConsoleClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = FakeParser()
+        self.client = ConsoleClient(self.parser, timeout=1,
+                                    timeouts={'mission LOAD': 30, })
+        self.client.clock = self.clock = Clock()
+        self.transport = StringTransport()
+        self.client.transport = self.transport
+
+    def respond(self, rid, *lines):
+        wrapper = "Command not found: rid|{0}".format(rid)
+        for line in (wrapper, ) + lines + (wrapper, ):
+            self.client.lineReceived(line)
+
+    def test_get_timeout(self):
+        self.assertEqual(self.client.get_timeout("mission LOAD foo.mis"), 30)
+        self.assertEqual(self.client.get_timeout("mission"), 1)
+        self.assertEqual(self.client.get_timeout("mission LOADED"), 1)
+
+    def test_pipelining(self):
+        results = []
+        self.client.send_request("mission LOAD foo.mis").addCallback(
+            results.append)
+        self.client.send_request("mission").addCallback(results.append)
+        self.assertEqual(self.client.pending, 2)
+        self.assertEqual(len(self.transport.value().splitlines()), 6)
+
+        # Timeout of the second command starts after the first one is done
+        self.clock.advance(20)
+        self.respond(0, "loaded")
+        self.clock.advance(0.5)
+        self.respond(1, "status")
+
+        self.assertEqual(results, [["loaded", ], ["status", ]])
+        self.assertEqual(self.client.pending, 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_late_output_is_discarded(self):
+        failures = []
+        results = []
+        self.client.send_request("mission").addErrback(failures.append)
+        self.client.send_request("user").addCallback(results.append)
+
+        self.clock.advance(1)
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(defer.TimeoutError)
+
+        self.respond(0, "late")
+        self.respond(1, "users")
+        self.assertEqual(results, [["users", ], ])
+        self.assertEqual(self.parser.lines, [])
+
+    def test_lost_output(self):
+        failures = []
+        results = []
+        self.client.send_request("mission").addErrback(failures.append)
+        self.client.send_request("user").addCallback(results.append)
+
+        self.respond(1, "users")
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(results, [["users", ], ])
+
+    def test_connection_lost(self):
+        failures = []
+        self.client.send_request("mission").addErrback(failures.append)
+        self.client.connectionLost(Failure(Exception("lost")))
+
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(self.client.pending, 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+class FakeDatagramTransport(object):
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data, address=None):
+        self.written.append(data)
+
+
+class DeviceLinkClientTestCase(unittest.TestCase):
+
+    address = ('127.0.0.1', 10000)
+
+    def setUp(self):
+        self.client = DeviceLinkClient(self.address, timeout=1)
+        self.client.clock = self.clock = Clock()
+        self.client.transport = self.transport = FakeDatagramTransport()
+
+    def test_deferred_requests(self):
+        self.client.cmd_group_max_size = 2
+        results = []
+        commands = [DL_OPCODE.RADAR_REFRESH.make_command(), ] + [
+            DL_OPCODE.PILOT_POS.make_command(i) for i in range(3)
+        ]
+        self.client.deferred_requests(commands).addCallback(results.append)
+
+        # Radar refreshing is not answered
+        self.assertEqual(self.transport.written, ["R/1001/1004\\0", ])
+        self.assertEqual(self.client.pending, 1)
+        self.client.datagramReceived("A/1004\\0:a", self.address)
+        self.assertEqual(self.transport.written[1:],
+                         ["R/1004\\1/1004\\2", ])
+        self.client.datagramReceived("A/1004\\1:b/1004\\2:c", self.address)
+
+        self.assertEqual(results, [["0:a", "1:b", "2:c", ], ])
+        self.assertEqual(len(self.transport.written), 2)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_timeout(self):
+        failures = []
+        self.client.deferred_requests([
+            DL_OPCODE.PILOT_COUNT.make_command(),
+        ]).addErrback(failures.append)
+
+        self.clock.advance(1)
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(defer.TimeoutError)
+        self.assertEqual(self.client.pending, 0)
+
+
+class FakeConnector(object):
+
+    def __init__(self):
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+
+    def stopConnecting(self):
+        pass
+
+
+class ReconnectingConsoleClientFactoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = ReconnectingConsoleClientFactory()
+        self.factory.clock = self.clock = Clock()
+        self.factory.jitter = 0
+        self.factory.probe_limit = 2
+        self.connector = FakeConnector()
+        self.probes = []
+
+    def probe(self):
+        d = defer.Deferred()
+        self.probes.append(d)
+        return d
+
+    def test_get_delay(self):
+        self.assertEqual(
+            [self.factory.get_delay(i) for i in range(7)],
+            [0.5, 2, 4, 8, 16, 32, 60])
+
+        self.factory.jitter = 0.2
+        for i in range(100):
+            self.assertTrue(1.6 <= self.factory.get_delay(1) <= 2.4)
+
+    def test_retry(self):
+        self.factory.retry(self.connector)
+        self.clock.advance(0.5)
+        self.assertEqual(self.connector.attempts, 1)
+
+        self.factory.retry(self.connector)
+        self.clock.advance(1.9)
+        self.assertEqual(self.connector.attempts, 1)
+        self.clock.advance(0.1)
+        self.assertEqual(self.connector.attempts, 2)
+
+    def test_probe(self):
+        self.factory.probe = self.probe
+        self.factory.retry(self.connector)
+
+        self.clock.advance(0.5)
+        self.probes[-1].errback(defer.TimeoutError())
+        self.clock.advance(2)
+        self.probes[-1].errback(defer.TimeoutError())
+        self.assertEqual(len(self.probes), 2)
+        self.assertEqual(self.connector.attempts, 0)
+
+        # Connection is attempted anyway after too many failed probes
+        self.clock.advance(4)
+        self.assertEqual(len(self.probes), 2)
+        self.assertEqual(self.connector.attempts, 1)
+
+        self.factory.retry(self.connector)
+        self.clock.advance(8)
+        self.probes[-1].callback(0)
+        self.assertEqual(self.connector.attempts, 2)
+
+    def test_reconnect_time(self):
+        self.factory.on_connection_lost.addErrback(lambda unused: None)
+        self.factory.clientConnectionLost(
+            self.connector, Failure(Exception("lost")))
+        self.clock.advance(0.5)
+        self.assertEqual(self.connector.attempts, 1)
+
+        count = self.factory.reconnect_time.count
+        self.factory.clientConnectionMade(object())
+        self.assertEqual(self.factory.reconnect_time.count, count + 1)
+        self.assertIsNone(self.factory.lost_at)
+        self.assertEqual(self.factory.retries, 0)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from il2ds_middleware.parser import DeviceLinkParser
+
+from twisted.internet.task import Clock
+
+from minic.bus import EventBus
+from minic.protocol import DeviceLinkClient
+from minic.service.radar import RadarService, EMPTY_SNAPSHOT
+
+
+class FakeDeviceLinkServer(object):
+    """
+    Answers requests of Device Link client with given positions. Answers are
+    sent when `answer` is called, so tests can control duration of polls.
+    """
+
+    def __init__(self, client, pilots, statics):
+        self.client = client
+        self.pilots = pilots
+        self.statics = statics
+        self.datagrams = []
+        self.queue = []
+
+    def write(self, data, address=None):
+        self.datagrams.append(data)
+        self.queue.append(data)
+
+    def answer(self):
+        while self.queue:
+            data = self.queue.pop(0)
+            answers = []
+            for chunk in data[2:].split('/'):
+                opcode, unused, arg = chunk.partition('\\')
+                if opcode == '1002':
+                    answers.append("1002\\{0}".format(len(self.pilots)))
+                elif opcode == '1014':
+                    answers.append("1014\\{0}".format(len(self.statics)))
+                elif opcode == '1004':
+                    answers.append("1004\\{0}:{1}_{0};1;2;3".format(
+                                   arg, self.pilots[int(arg)]))
+                elif opcode == '1016':
+                    answers.append("1016\\{0}:{1};4;5;6".format(
+                                   arg, self.statics[int(arg)]))
+            if answers:
+                self.client.datagramReceived(
+                    "A/" + "/".join(answers), self.client.address)
+
+
+class FakePilotsService(object):
+    count = 0
+
+
+class FakeParent(object):
+
+    def __init__(self, client):
+        self.dl_client = client
+        self.bus = EventBus()
+        self.services = type('Services', (object, ), {
+            'pilots': FakePilotsService(),
+        })
+
+
+class RadarServiceTestCase(unittest.TestCase):
+
+    address = ('127.0.0.1', 10000)
+
+    def setUp(self):
+        self.clock = Clock()
+        self.client = DeviceLinkClient(self.address, DeviceLinkParser(), 1)
+        self.client.clock = self.clock
+        self.client.cmd_group_max_size = 4
+        self.server = FakeDeviceLinkServer(
+            self.client, ["user{0}".format(i) for i in range(5)],
+            ["{0}_Static".format(i) for i in range(2)])
+        self.client.transport = self.server
+
+        self.radar = RadarService()
+        self.radar.parent = FakeParent(self.client)
+        self.radar.clock = self.clock
+        self.radar.static_every = 2
+
+    def tearDown(self):
+        if self.radar.running:
+            self.radar.stopService()
+
+    def test_poll(self):
+        snapshots = []
+        self.radar.subscribe(snapshots.append)
+        self.radar.startService()
+        self.clock.advance(0)
+        self.clock.advance(0.5)
+        self.server.answer()
+
+        snapshot = self.radar.snapshot
+        self.assertEqual(snapshots, [snapshot, ])
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual([x['callsign'] for x in snapshot.pilots],
+                         ["user{0}".format(i) for i in range(5)])
+        self.assertEqual(snapshot.statics[1]['name'], "1_Static")
+        self.assertEqual(snapshot.pilots[0]['pos'],
+                         {'x': 1, 'y': 2, 'z': 3, })
+
+        # Counts go in one datagram, 7 positions go in 2 datagrams
+        self.assertEqual(len(self.server.datagrams), 3)
+        self.assertTrue(self.server.datagrams[0].startswith("R/1001/1002"))
+
+        # Poll took 0.5 s, so the next one is 5 s later and does not ask for
+        # static objects
+        self.assertEqual(self.radar.period, 5)
+        self.clock.advance(4.9)
+        self.assertEqual(len(self.server.datagrams), 3)
+        self.clock.advance(0.1)
+        self.server.answer()
+        self.assertEqual(self.radar.snapshot.version, 2)
+        self.assertEqual(self.radar.snapshot.statics, snapshot.statics)
+        self.assertEqual(len(self.server.datagrams), 6)
+        self.assertEqual(self.radar.period, self.radar.min_period)
+
+    def test_poll_waiters(self):
+        self.radar.startService()
+        results = []
+        self.radar.poll().addCallback(results.append)
+        self.radar.poll().addCallback(results.append)
+        self.server.answer()
+
+        self.assertEqual(len(results), 2)
+        self.assertIs(results[0], results[1])
+        self.assertEqual(len(self.server.datagrams), 3)
+
+    def test_empty_server(self):
+        self.server.pilots = []
+        self.radar.startService()
+        self.clock.advance(0)
+        self.server.answer()
+        self.assertEqual(self.radar.period, self.radar.max_period)
+
+    def test_refresh(self):
+        self.radar.startService()
+        self.clock.advance(0)
+        self.server.answer()
+        self.assertEqual(self.radar.period, self.radar.min_period)
+        self.radar.period = self.radar.max_period = 30
+        self.radar._schedule(30)
+        self.clock.advance(10)
+        self.assertEqual(self.radar.age, 10)
+
+        # A burst of requests is served by a single poll
+        for i in range(3):
+            self.radar.request_refresh()
+            self.clock.advance(0.1)
+        self.assertEqual(self.server.queue, [])
+        self.clock.advance(0.25)
+        self.assertEqual(len(self.server.queue), 1)
+
+        # Requests during poll are served by one more poll after it
+        self.radar.request_refresh()
+        self.radar.request_refresh()
+        self.server.answer()
+        self.assertEqual(self.radar.snapshot.version, 2)
+        self.assertEqual(self.radar.age, 0)
+        self.clock.advance(0.5)
+        self.server.answer()
+        self.assertEqual(self.radar.snapshot.version, 3)
+
+        self.assertEqual(self.radar.refresh_requests, 5)
+        self.assertEqual(self.radar.refreshes_saved, 3)
+
+        # Request is not needed when poll is due anyway
+        self.radar._schedule(0.3)
+        self.radar.request_refresh()
+        self.assertEqual(self.radar.refreshes_saved, 4)
+
+    def test_failure(self):
+        self.radar.startService()
+        self.clock.advance(0)
+        self.clock.advance(1)
+        self.assertEqual(self.radar.snapshot, EMPTY_SNAPSHOT)
+        self.assertEqual(self.radar.period, self.radar.max_period)
+
+        self.radar.stopService()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from il2ds_middleware.constants import MISSION_STATUS
+
+from twisted.internet.task import Clock
+
+from minic.benchmarks.replay import Replay, read_timed_lines
+from minic.constants import BUS_TOPIC
+from minic.tests.test_stats import SynchronousStore
+
+
+EVENT_LOG = """\
+[Sep 15, 2013 11:59:58 PM] Mission: net/dogfight/first.mis is Playing
+[11:59:58 PM] Mission BEGIN
+[11:59:59 PM] user1:Pe-8 in flight at 100.0 200.99
+[12:00:30 AM] user2:Bf-109G-6_Late in flight at 100.0 200.99
+[12:01:30 AM] user1:Pe-8 shot down by user2:Bf-109G-6_Late at 1.0 2.0
+[12:02:00 AM] user2:Bf-109G-6_Late landed at 100.0 200.99
+[12:03:00 AM] Mission END
+""".splitlines()
+
+CONSOLE = """\
+[11:59:50 PM] socket channel '0', ip 192.168.1.2:21000, user1, is complete \
+created
+[11:59:55 PM] socket channel '1', ip 192.168.1.3:21000, user2, is complete \
+created
+[12:02:30 AM] socketConnection with 192.168.1.3:21000 on channel 1 lost.  \
+Reason: 
+[12:02:30 AM] Chat: --- user2 has left the game.
+""".splitlines()
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.replay = Replay()
+        self.replay.commander.services.stats.store = SynchronousStore()
+        self.replay.start()
+
+    def tearDown(self):
+        self.replay.stop()
+
+    def results(self, d):
+        results = []
+        d.addCallback(results.append)
+        return results[0]
+
+    def test_clock(self):
+        services = self.replay.commander.services
+        for service in (services.chat, services.stats, services.radar,
+                        services.missions, self.replay.service.bus):
+            self.assertIs(service._get_clock(), self.replay.clock)
+        self.assertEqual(services.missions._timer.now(), 0)
+
+    def test_read_timed_lines(self):
+        lines = list(read_timed_lines(EVENT_LOG[:4] + ["no time", ""]))
+        self.assertEqual([x[0] for x in lines],
+                         [86398, 86398, 86399, 86430, 86430])
+        self.assertEqual(lines[0][2],
+                         "Mission: net/dogfight/first.mis is Playing")
+        self.assertEqual(lines[-1][1:], ("no time", "no time"))
+
+    def test_run(self):
+        commander = self.replay.commander
+        missions = commander.services.missions
+        statuses = []
+        self.replay.service.bus.subscribe(BUS_TOPIC.MISSION_STATUS,
+                                          statuses.append)
+
+        results = self.results(self.replay.run(EVENT_LOG, CONSOLE))
+        self.assertEqual(results['lines'], len(EVENT_LOG) + len(CONSOLE))
+        self.assertEqual(results['events'], 4)
+        self.assertEqual(results['virtual_time'], 190)
+        self.assertEqual(results['pilots'], 1)
+
+        mission = self.replay.service.mission_manager.get_current_mission()
+        self.assertEqual(mission.name, "first")
+        self.assertEqual(mission.relative_path, "first.mis")
+        self.assertEqual(statuses,
+                         [MISSION_STATUS.PLAYING, MISSION_STATUS.NOT_LOADED])
+        self.assertIn(('chat_all', u"Mission 'first' is playing."),
+                      self.replay.client.requests)
+
+        self.assertEqual(self.results(commander.services.stats.store
+                                      .get_run_stats()), {
+            "user1": {'took_off': 1, 'shot_down': 1, },
+            "user2": {'took_off': 1, 'landed': 1, 'kills': 1, },
+        })
+
+    def test_speed(self):
+        self.replay.speed = 10
+        self.replay.wall_clock = wall_clock = Clock()
+        results = []
+        self.replay.run(EVENT_LOG).addCallback(results.append)
+
+        wall_clock.pump([0.1, ] * 100)
+        self.assertEqual(self.replay.clock.seconds(), 92)
+        self.assertEqual(results, [])
+        wall_clock.pump([0.1, ] * 100)
+        self.assertEqual(results[0]['virtual_time'], 182)
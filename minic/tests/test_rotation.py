@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import datetime
+import random
+import unittest
+
+from minic.models import DEFAULT_ROTATION_RULE, MissionList
+from minic.rotation import (
+    RotationContext, RoundRobinScheduler, WeightedScheduler, get_scheduler,
+    is_rule_matched,
+)
+from minic.tests.test_models import FakeSettings
+
+
+class RotationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.missions = MissionList(FakeSettings())
+        self.missions.update([
+            (1, "first", "first.mis", 60),
+            (2, "second", "second.mis", 60),
+            (3, "third", "third.mis", 60),
+        ])
+        self.context = RotationContext(datetime.datetime(2014, 1, 1, 12, 30),
+                                       10, [])
+
+    def ids(self, scheduler, current_id, context=None):
+        return [m.id for m in scheduler.candidates(
+                self.missions, current_id, context or self.context)]
+
+    def test_is_rule_matched(self):
+        rule = DEFAULT_ROTATION_RULE._replace(hours=[22, 6], min_pilots=5)
+        self.assertFalse(is_rule_matched(rule, self.context))
+        night = self.context._replace(now=datetime.datetime(2014, 1, 1, 23))
+        self.assertTrue(is_rule_matched(rule, night))
+        self.assertFalse(is_rule_matched(rule, night._replace(pilots=4)))
+        self.assertTrue(is_rule_matched(rule, night._replace(pilots=None)))
+
+        rule = DEFAULT_ROTATION_RULE._replace(hours=[12, 13], max_pilots=10)
+        self.assertTrue(is_rule_matched(rule, self.context))
+        self.assertFalse(is_rule_matched(
+            rule, self.context._replace(pilots=11)))
+        self.assertFalse(is_rule_matched(
+            DEFAULT_ROTATION_RULE._replace(weight=0), self.context))
+
+    def test_round_robin(self):
+        scheduler = RoundRobinScheduler()
+        self.assertEqual(self.ids(scheduler, 2), [3, 1, 2, ])
+        self.assertEqual(self.ids(scheduler, 3), [1, 2, 3, ])
+
+    def test_weighted(self):
+        scheduler = WeightedScheduler(random.Random(0))
+        self.missions.set_rule(
+            1, DEFAULT_ROTATION_RULE._replace(weight=100))
+        self.missions.set_rule(
+            2, DEFAULT_ROTATION_RULE._replace(min_pilots=20))
+
+        firsts = [self.ids(scheduler, 3)[0] for i in range(100)]
+        self.assertGreater(firsts.count(1), 90)
+        self.assertNotIn(2, firsts)
+
+        # Recently played missions come after the others
+        ids = self.ids(scheduler, 2, self.context._replace(recent_ids=[1, ]))
+        self.assertEqual(ids, [3, 1, 2, ])
+        self.assertEqual(self.ids(scheduler, 1)[:2], [3, 1])
+
+    def test_weighted_falls_back_to_list_order(self):
+        scheduler = WeightedScheduler()
+        for mission_id in (1, 2, 3):
+            self.missions.set_rule(
+                mission_id, DEFAULT_ROTATION_RULE._replace(max_pilots=5))
+        self.assertEqual(self.ids(scheduler, 1), [2, 3, 1, ])
+
+    def test_get_scheduler(self):
+        self.assertIsInstance(get_scheduler(), RoundRobinScheduler)
+        self.assertIsInstance(get_scheduler('weighted'), WeightedScheduler)
+        self.assertIsInstance(get_scheduler('foo'), RoundRobinScheduler)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.error import DNSLookupError
+
+from minic.metrics import metrics
+from minic.service import RootService, get_root_service
+from minic.settings import user_settings, UserSettings
+from minic.tests.test_settings import write_server_config
+
+
+class FakeConnector(object):
+
+    def __init__(self, host=None, port=None):
+        self.host = host
+        self.port = port
+        self.disconnects = 0
+        self.listening = True
+
+    def disconnect(self):
+        self.disconnects += 1
+
+    def stopListening(self):
+        self.listening = False
+        return defer.succeed(None)
+
+
+class FakeDeviceLinkClient(object):
+    address = None
+
+
+class FakeRootService(RootService):
+
+    hosts = {'localhost': '127.0.0.1', }
+
+    def listen_device_link(self):
+        self.dl_connector = FakeConnector()
+
+    def _resolve(self, host):
+        if host[0].isdigit():
+            return defer.succeed(host)
+        if host in self.hosts:
+            return defer.succeed(self.hosts[host])
+        return defer.fail(DNSLookupError(host))
+
+
+class RootServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_default_server(self):
+        root_service = get_root_service()
+        self.assertIs(get_root_service(), root_service)
+        self.assertIs(root_service.user_settings, user_settings)
+        missions = root_service.commander.services.missions
+        self.assertIs(missions.user_settings, user_settings)
+
+    def test_servers_are_independent(self):
+        services = [
+            RootService(UserSettings(self.root, name + '.conf'), name)
+            for name in ("first", "second")
+        ]
+        first, second = services
+
+        first.user_settings.server_path = os.path.join(
+            self.root, 'first', 'il2server.exe')
+        self.assertIsNone(second.user_settings.server_path)
+        self.assertIsNot(first.server_settings, second.server_settings)
+        self.assertIsNot(first.mission_manager, second.mission_manager)
+
+        missions = first.commander.services.missions
+        self.assertIs(missions.mission_manager, first.mission_manager)
+        self.assertEqual(
+            missions.mission_manager.get_root_path(),
+            os.path.join(self.root, 'first', 'Missions', 'Net', 'dogfight'))
+
+        first.connection_count.inc()
+        second.connection_count.inc(0)
+        rendered = metrics.render()
+        self.assertIn('minic_chat_queue_size{server="first"} 0', rendered)
+        self.assertIn('minic_chat_queue_size{server="second"} 0', rendered)
+        self.assertIn('minic_connections_total{server="first"} 1', rendered)
+        self.assertIn('minic_connections_total{server="second"} 0', rendered)
+
+        # Metrics of removed server are not exported anymore
+        first.unregister_metrics()
+        rendered = metrics.render()
+        self.assertNotIn('server="first"', rendered)
+        self.assertIn('minic_connections_total{server="second"} 0', rendered)
+        second.unregister_metrics()
+
+    def test_reload_server_settings(self):
+        service = FakeRootService(UserSettings(self.root), "reload")
+        service.user_settings.server_path = os.path.join(
+            self.root, 'il2server.exe')
+        log_watcher = service.commander.services.missions.log_watcher
+
+        write_server_config(self.root, mtime=1000)
+        service.server_settings.load()
+        log_watcher.log_path = service.server_settings.log_path
+        service.dl_client = FakeDeviceLinkClient()
+        service.listen_device_link()
+        service.cl_connector = FakeConnector('127.0.0.1', 20000)
+        service.running = True
+
+        dl_connector = service.dl_connector
+        results = []
+        service.reload_server_settings().addCallback(results.append)
+        self.assertEqual(results, [set(), ])
+
+        write_server_config(self.root, dl_port=10001, mtime=2000)
+        service.reload_server_settings().addCallback(results.append)
+        self.assertEqual(results[-1], set(['dl_port', ]))
+        self.assertFalse(dl_connector.listening)
+        self.assertTrue(service.dl_connector.listening)
+        self.assertEqual(service.dl_client.address, ('127.0.0.1', 10001))
+        self.assertEqual(service.cl_connector.disconnects, 0)
+
+        write_server_config(self.root, dl_port=10001, cl_port=20001,
+                            log_name='other.lst', mtime=3000)
+        service.reload_server_settings().addCallback(results.append)
+        self.assertEqual(results[-1], set(['cl_port', 'log_path', ]))
+        self.assertEqual(service.cl_connector.port, 20001)
+        self.assertEqual(service.cl_connector.disconnects, 1)
+        self.assertEqual(log_watcher.log_path,
+                         os.path.join(self.root, 'other.lst'))
+
+        write_server_config(self.root, host='localhost', dl_port=10002,
+                            cl_port=20001, log_name='other.lst', mtime=4000)
+        service.reload_server_settings()
+        self.assertEqual(service.dl_client.address, ('127.0.0.1', 10002))
+
+        # Device Link keeps old address if new host cannot be resolved
+        dl_connector = service.dl_connector
+        write_server_config(self.root, host='unknown.invalid', dl_port=10003,
+                            cl_port=20001, log_name='other.lst', mtime=5000)
+        service.reload_server_settings().addCallback(results.append)
+        self.assertEqual(results[-1], set(['dl_host', 'dl_port', 'cl_host', ]))
+        self.assertEqual(service.dl_client.address, ('127.0.0.1', 10002))
+        self.assertIs(service.dl_connector, dl_connector)
+        self.assertTrue(dl_connector.listening)
+
+        # Invalid config is not applied
+        os.remove(os.path.join(self.root, 'confs.ini'))
+        service.reload_server_settings().addCallback(results.append)
+        self.assertEqual(results[-1], set())
+        self.assertEqual(service.server_settings.cl_port, 20001)
+
+        service.running = False
+        service.unregister_metrics()
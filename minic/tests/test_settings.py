@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+import minic
+from minic.benchmarks.server import CONFIG_TEMPLATE
+from minic.settings import ServerSettings, UserSettings
+
+
+class FakeUserSettings(UserSettings):
+
+    writes = 0
+
+    def __init__(self, root):
+        UserSettings.__init__(self)
+        self.root = root
+        self.clock = Clock()
+        self.writes = 0
+
+    def _write_in_thread(self, data, generation):
+        self.writes += 1
+        self._write(data, generation)
+        return defer.succeed(None)
+
+
+class UserSettingsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.settings = FakeUserSettings(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read(self):
+        with open(self.settings.file_path, 'r') as f:
+            return json.load(f)
+
+    def test_sync_is_coalesced(self):
+        self.settings.foo = 1
+        self.settings.sync()
+        self.settings.clock.advance(0.5)
+        self.settings.foo = 2
+        self.settings.sync()
+        self.settings.clock.advance(0.4)
+
+        self.assertEqual(self.settings.writes, 0)
+        self.assertFalse(os.path.exists(self.settings.file_path))
+
+        self.settings.clock.advance(0.1)
+        self.assertEqual(self.settings.writes, 1)
+        self.assertFalse(self.settings.has_pending_changes)
+
+        data = self.read()
+        self.assertEqual(data['foo'], 2)
+        self.assertEqual(data['version'], list(minic.VERSION))
+        self.assertEqual(os.listdir(self.root), [self.settings.file_name, ])
+
+    def test_flush(self):
+        self.settings.foo = 1
+        self.settings.sync()
+        self.settings.flush()
+
+        self.assertEqual(self.read()['foo'], 1)
+        self.assertFalse(self.settings.has_pending_changes)
+
+        self.settings.clock.advance(self.settings.sync_delay)
+        self.assertEqual(self.settings.writes, 0)
+
+    def test_outdated_snapshot_is_skipped(self):
+        self.settings.foo = 1
+        self.settings.sync()
+        snapshot = self.settings._snapshot()
+        generation = self.settings._generation
+
+        self.settings.foo = 2
+        self.settings.sync()
+        self.settings.flush()
+
+        self.settings._write(snapshot, generation)
+        self.assertEqual(self.read()['foo'], 2)
+
+
+def write_server_config(root, host='127.0.0.1', cl_port=20000, dl_port=10000,
+                        log_name='eventlog.lst', mtime=None):
+    file_path = os.path.join(root, 'confs.ini')
+    with open(file_path, 'w') as f:
+        f.write(CONFIG_TEMPLATE.format(
+            host=host, cl_port=cl_port, dl_port=dl_port, log_name=log_name))
+    if mtime is not None:
+        os.utime(file_path, (mtime, mtime))
+
+
+class ServerSettingsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        settings = UserSettings(self.root)
+        settings.server_path = os.path.join(self.root, 'il2server.exe')
+        self.settings = ServerSettings(settings)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_load(self):
+        write_server_config(self.root, mtime=1000)
+        self.assertEqual(self.settings.load(), set([
+            'log_path', 'max_channels', 'difficulty', 'cl_host', 'cl_port',
+            'dl_host', 'dl_port', 'name', 'description',
+        ]))
+        self.assertEqual(self.settings.dl_port, 10000)
+        self.assertEqual(self.settings.log_path,
+                         os.path.join(self.root, 'eventlog.lst'))
+
+        # Config is not parsed again while it is not changed
+        config = self.settings.config
+        self.assertEqual(self.settings.load(), set())
+        self.assertIs(self.settings.config, config)
+
+        write_server_config(self.root, dl_port=10001, mtime=1500)
+        self.assertEqual(self.settings.load(), set(['dl_port', ]))
+        self.assertEqual(self.settings.dl_port, 10001)
+
+        write_server_config(self.root, dl_port=10001, cl_port=20001,
+                            log_name='other.lst', mtime=2000)
+        self.assertEqual(self.settings.load(),
+                         set(['cl_port', 'log_path', ]))
+
+        write_server_config(self.root, mtime=3000)
+        self.assertEqual(self.settings.load(),
+                         set(['cl_port', 'dl_port', 'log_path', ]))
+
+    def test_invalid_config(self):
+        write_server_config(self.root, mtime=1000)
+        self.settings.load()
+
+        write_server_config(self.root, host='', dl_port=10001, mtime=2000)
+        with open(os.path.join(self.root, 'confs.ini'), 'r') as f:
+            data = f.read().replace('localHost=\n', '')
+        with open(os.path.join(self.root, 'confs.ini'), 'w') as f:
+            f.write(data)
+        self.assertRaises(ValueError, self.settings.load)
+        self.assertEqual(self.settings.cl_host, '127.0.0.1')
+        self.assertEqual(self.settings.dl_port, 10000)
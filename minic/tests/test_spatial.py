@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+import unittest
+
+from minic.spatial import GridIndex
+
+
+class GridIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = GridIndex(cell_size=1000)
+
+    def brute_within(self, points, x, y, radius):
+        results = []
+        for key, (px, py) in points.iteritems():
+            dx, dy = px - x, py - y
+            distance = math.sqrt(dx * dx + dy * dy)
+            if distance <= radius:
+                results.append((distance, key))
+        return sorted(results)
+
+    def test_update(self):
+        self.index.update('a', 100, 100)
+        self.index.update('b', -100, 100)
+        self.assertEqual(len(self.index), 2)
+        self.assertIn('a', self.index)
+        self.assertEqual(self.index.get('b'), (-100, 100))
+        self.assertIsNone(self.index.get('c'))
+
+        self.index.update('a', 5500, 100)
+        self.assertEqual(self.index.get('a'), (5500, 100))
+        self.assertEqual(self.index.within(0, 0, 1000), [
+            (math.hypot(100, 100), 'b'),
+        ])
+        self.assertEqual(sorted(self.index._cells), [(-1, 0), (5, 0), ])
+
+        self.index.remove('b')
+        self.index.remove('c')
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(list(self.index._cells), [(5, 0), ])
+
+    def test_replace(self):
+        self.index.update('a', 0, 0)
+        self.index.update('b', 0, 0)
+        self.index.replace({'b': (2000, 0), 'c': (0, 3000), })
+        self.assertNotIn('a', self.index)
+        self.assertEqual(self.index.get('b'), (2000, 0))
+        self.assertEqual(self.index.get('c'), (0, 3000))
+        self.assertEqual(sorted(self.index._cells), [(0, 3), (2, 0), ])
+
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.within(0, 0, 10000), [])
+        self.assertEqual(self.index.nearest(0, 0), [])
+
+    def test_queries(self):
+        rnd = random.Random(0)
+        points = dict(
+            (i, (rnd.uniform(-20000, 20000), rnd.uniform(-20000, 20000)))
+            for i in xrange(300))
+        self.index.replace(points)
+        centers = [(rnd.uniform(-25000, 25000), rnd.uniform(-25000, 25000))
+                   for unused in xrange(30)]
+
+        for radius in (0, 500, 3000, 50000):
+            results = self.index.within_many(centers, radius)
+            for (x, y), found in zip(centers, results):
+                self.assertEqual(found,
+                                 self.brute_within(points, x, y, radius))
+                self.assertEqual(found, self.index.within(x, y, radius))
+
+        def is_even(key):
+            return key % 2 == 0
+
+        for x, y in centers:
+            expected = self.brute_within(points, x, y, float('inf'))
+            self.assertEqual(self.index.nearest(x, y), expected[:1])
+            self.assertEqual(self.index.nearest(x, y, count=5), expected[:5])
+            self.assertEqual(self.index.nearest(x, y, count=3,
+                                                predicate=is_even),
+                             [p for p in expected if is_even(p[1])][:3])
+
+    def test_nearest_sparse(self):
+        self.index.update('a', 0, 0)
+        self.index.update('b', 900000, 0)
+        self.assertEqual(self.index.nearest(800000, 0), [(100000, 'b'), ])
+        self.assertEqual(self.index.nearest(0, 0, count=3), [
+            (0, 'a'), (900000, 'b'),
+        ])
+        self.assertEqual(
+            self.index.nearest(0, 0, predicate=lambda key: key != 'a'),
+            [(900000, 'b'), ])
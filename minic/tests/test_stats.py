@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from minic.constants import EVENT_KIND
+from minic.models import Mission
+from minic.parser import EventLogParser
+from minic.service.stats import StatsService
+from minic.stats import EventStore
+
+
+class SynchronousStore(EventStore):
+
+    def _call_in_thread(self, func, *args):
+        return defer.maybeDeferred(func, *args)
+
+
+class FlakyConnection(object):
+    """
+    Connection which fails to commit as many times as store tells it to.
+    """
+
+    def __init__(self, store, connection):
+        self.store = store
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def commit(self):
+        if self.store.failures:
+            self.store.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        self.connection.commit()
+
+
+class FlakyStore(SynchronousStore):
+
+    failures = 0
+
+    def _connect(self):
+        return FlakyConnection(self, SynchronousStore._connect(self))
+
+
+EVENTS = (
+    "[8:49:32 PM] user1:Pe-8 in flight at 100.0 200.99",
+    "[8:49:33 PM] user2:Bf-109G-6_Late in flight at 100.0 200.99",
+    "[8:50:32 PM] user1:Pe-8 shot down by user2:Bf-109G-6_Late at 1.0 2.0",
+    "[8:51:39 PM] 3do/Buildings/Finland/CenterHouse1_w/live.sim destroyed "
+    "by user2:Bf-109G-6_Late at 100.0 200.99",
+    "[8:52:32 PM] user2:Bf-109G-6_Late landed at 100.0 200.99",
+)
+
+
+class EventStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'stats.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def results(self, d):
+        results = []
+        d.addCallback(results.append)
+        return results[0]
+
+    def test_store(self):
+        store = SynchronousStore(self.path)
+        run_id = store.begin_run("first", 1000)
+        store.append(EVENT_KIND.TOOK_OFF, 10, "user1", "Pe-8",
+                     pos={'x': 1.0, 'y': 2.0})
+        store.append(EVENT_KIND.TOOK_OFF, 11, "user2", "Pe-8")
+        store.append(EVENT_KIND.SHOT_DOWN, 20, "user1", "Pe-8", "user2")
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.intern("Pe-8"), 2)
+
+        self.assertEqual(self.results(store.flush()), 3)
+        self.assertEqual(len(store), 0)
+
+        second_id = store.begin_run("second", 1000)
+        self.assertGreater(second_id, run_id)
+        store.append(EVENT_KIND.LANDED, 30, "user2", "Pe-8")
+
+        self.assertEqual(self.results(store.get_run_stats(run_id)), {
+            "user1": {'took_off': 1, 'shot_down': 1, },
+            "user2": {'took_off': 1, 'kills': 1, },
+        })
+        self.assertEqual(self.results(store.get_run_stats()), {
+            "user2": {'landed': 1, },
+        })
+        self.assertEqual(
+            [x[1] for x in self.results(store.get_runs())],
+            ["second", "first", ])
+        self.results(store.close())
+
+        # Names interned before are reused by new stores
+        store = SynchronousStore(self.path)
+        store.begin_run("third", 2000)
+        store.append(EVENT_KIND.CRASHED, 40, "user1", "Pe-8")
+        self.assertEqual(self.results(store.get_run_stats()), {
+            "user1": {'crashed': 1, },
+        })
+        self.results(store.close())
+
+    def test_failed_write(self):
+        store = FlakyStore(self.path)
+        store.failures = 1
+        run_id = store.begin_run("first", 1000)
+        store.append(EVENT_KIND.TOOK_OFF, 10, "user1", "Pe-8")
+
+        failures = []
+        store.flush().addErrback(failures.append)
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(sqlite3.OperationalError)
+
+        # Events are kept with names and runs they refer to
+        store.append(EVENT_KIND.LANDED, 20, "user1", "Pe-8")
+        self.assertEqual(len(store), 2)
+        self.assertEqual(self.results(store.flush()), 2)
+        self.assertEqual(self.results(store.get_run_stats(run_id)), {
+            "user1": {'took_off': 1, 'landed': 1, },
+        })
+        self.assertEqual([x[1] for x in self.results(store.get_runs())],
+                         ["first", ])
+        self.results(store.close())
+
+    def test_run_id(self):
+        store = SynchronousStore()
+        started = 1792310400.75
+        run_id = store.begin_run("first", started)
+        self.assertLess(run_id, 2 ** 32)
+        store.append(EVENT_KIND.TOOK_OFF, 10, "user1", "Pe-8")
+        self.assertEqual(list(store._columns['run']), [run_id, ])
+
+        # Runs started within the same second get different IDs
+        self.assertEqual(store.begin_run("second", started), run_id + 1)
+        self.assertEqual(self.results(store.get_run_stats(run_id)), {
+            "user1": {'took_off': 1, },
+        })
+
+    def test_service(self):
+        service = StatsService()
+        service.store = SynchronousStore()
+        service.clock = clock = Clock()
+        service.flush_period = 10
+        parser = EventLogParser((service, ))
+
+        service.startService()
+        service.begin_run(Mission(1, "first", "first.mis", 60))
+        for line in EVENTS:
+            parser.parse_line(line)
+        self.assertEqual(len(service.store), len(EVENTS))
+        clock.advance(10)
+        self.assertEqual(len(service.store), 0)
+
+        self.assertEqual(self.results(service.store.get_run_stats()), {
+            "user1": {'took_off': 1, 'shot_down': 1, },
+            "user2": {'took_off': 1, 'destroyed': 1, 'landed': 1,
+                      'kills': 1, },
+        })
+        service.stopService()
+        self.assertEqual(clock.getDelayedCalls(), [])
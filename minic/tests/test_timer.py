@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+
+from twisted.internet.task import Clock
+
+from minic import util
+from minic.timer import CountdownTimer
+
+
+class CountdownTimerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.expired = []
+        self.timer = CountdownTimer(lambda: self.expired.append(True),
+                                    now=self.clock.seconds)
+        self.timer.clock = self.clock
+
+    def test_expiry(self):
+        self.timer.start(10)
+        self.assertEqual(self.timer.time_left, 10)
+
+        self.clock.advance(2.5)
+        self.assertEqual(self.timer.time_left, 8)
+        self.assertEqual(self.timer.seconds_left, 7.5)
+        # Nothing is scheduled except the deadline
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+
+        self.clock.advance(7.5)
+        self.assertEqual(self.expired, [True, ])
+        self.assertFalse(self.timer.running)
+        self.assertEqual(self.timer.time_left, 0)
+
+    def test_scheduler_clock_runs_ahead(self):
+        self.timer.start(10)
+        # E.g. system time is moved forward
+        self.timer.now = lambda: self.clock.seconds() - 2
+        self.clock.advance(10)
+        self.assertEqual(self.expired, [])
+        self.assertEqual(self.timer.time_left, 2)
+        self.clock.advance(2)
+        self.assertEqual(self.expired, [True, ])
+
+    def test_scheduler_clock_lags(self):
+        self.timer.start(600)
+        self.clock.pump([60, ])
+        # E.g. system time is moved back by 5 minutes
+        self.timer.now = lambda: self.clock.seconds() + 300
+        self.assertEqual(self.timer.time_left, 240)
+        self.clock.pump([60, 60, 60, ])
+        self.assertEqual(self.expired, [])
+        self.clock.pump([60, ])
+        self.assertEqual(self.expired, [True, ])
+
+    def test_ticks(self):
+        ticks = []
+        self.timer.start(3.5)
+        self.timer.subscribe(lambda: ticks.append(self.timer.time_left))
+        self.clock.pump([0.5, 1, 1, 1, ])
+        self.assertEqual(ticks, [3, 2, 1, ])
+        self.assertEqual(self.expired, [True, ])
+
+        self.timer.tick_interval = 60
+        self.timer.start(130)
+        self.clock.pump([10, 60, 60, ])
+        self.assertEqual(ticks[3:], [120, 60, ])
+
+    def test_schedule(self):
+        alarms = []
+        self.timer.start(100)
+        self.timer.schedule(60, alarms.append, 'preload')
+        self.clock.advance(39)
+        self.assertEqual(alarms, [])
+        self.clock.advance(1)
+        self.assertEqual(alarms, ['preload', ])
+
+        self.timer.schedule(60, alarms.append, 'late')
+        self.clock.advance(0)
+        self.assertEqual(alarms, ['preload', 'late', ])
+
+        self.timer.schedule(10, alarms.append, 'cancelled')
+        self.timer.stop()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_pause(self):
+        alarms = []
+        self.timer.start(100)
+        self.timer.schedule(60, alarms.append, 'preload')
+        self.clock.advance(10)
+        self.timer.pause()
+
+        self.assertTrue(self.timer.paused)
+        self.assertFalse(self.timer.running)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.clock.advance(1000)
+        self.assertEqual(self.timer.time_left, 90)
+
+        self.timer.start(self.timer.seconds_left)
+        self.assertFalse(self.timer.paused)
+        self.clock.advance(90)
+        self.assertEqual(self.expired, [True, ])
+        self.assertEqual(alarms, [])
+
+
+class MonotonicClockTestCase(unittest.TestCase):
+
+    def test_no_native_clock_in_windows(self):
+        # Windows before Vista has no GetTickCount64
+        kernel32 = type('Kernel32', (object, ), {})()
+        windll = type('WinDLL', (object, ), {'kernel32': kernel32})()
+        self.assertIs(util._get_monotonic_clock('nt', windll), time.time)
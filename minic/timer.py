@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Countdown timers.
+"""
+import math
+
+from minic.util import ClockMixin, monotonic
+
+
+class CountdownTimer(ClockMixin):
+    """
+    Countdown to a deadline on a monotonic clock. Time left is computed from
+    the deadline, so it does not drift if reactor is busy. Reactor wakes up
+    at most every `max_wait` seconds to check the deadline, at scheduled
+    alarms and, if there are subscribers, once per `tick_interval` to let
+    them display time left. Reactor schedules calls by system time, so if it
+    is moved back, countdown ends at most `max_wait` seconds late, and if it
+    is moved forward, deadline is still respected.
+    """
+
+    #: Seconds between ticks passed to subscribers
+    tick_interval = 1
+    #: Max seconds between checks of deadline
+    max_wait = 60
+
+    def __init__(self, on_expired, now=None):
+        """
+        Input:
+        `on_expired`    # a callable to call when time is over.
+        `now`           # a callable which returns current seconds of a
+                        # monotonic clock.
+        """
+        self.on_expired = on_expired
+        self.now = now or monotonic
+        self.deadline = None
+        self._paused_left = None
+        self._subscribers = []
+        self._expiry_call = None
+        self._tick_call = None
+        self._alarms = []
+
+    @property
+    def running(self):
+        return self.deadline is not None
+
+    @property
+    def paused(self):
+        return self._paused_left is not None
+
+    @property
+    def seconds_left(self):
+        """
+        Exact time left in seconds.
+        """
+        if self._paused_left is not None:
+            return self._paused_left
+        if self.deadline is None:
+            return 0
+        return max(self.deadline - self.now(), 0)
+
+    @property
+    def time_left(self):
+        """
+        Time left in whole seconds rounded up.
+        """
+        return int(math.ceil(round(self.seconds_left, 3)))
+
+    def start(self, duration):
+        """
+        Start countdown of given number of seconds. Alarms scheduled before
+        are cancelled.
+        """
+        self.stop()
+        self.deadline = self.now() + duration
+        self._schedule_expiry(duration)
+        self._schedule_tick()
+
+    def pause(self):
+        """
+        Stop countdown keeping time left. Scheduled alarms are cancelled.
+        Countdown is continued by starting it with `seconds_left`.
+        """
+        if self.running:
+            seconds_left = self.seconds_left
+            self.stop()
+            self._paused_left = seconds_left
+
+    def stop(self):
+        self.deadline = None
+        self._paused_left = None
+        for call in [self._expiry_call, self._tick_call] + self._alarms:
+            if call is not None and call.active():
+                call.cancel()
+        self._expiry_call = None
+        self._tick_call = None
+        self._alarms = []
+
+    def schedule(self, seconds_left, func, *args, **kwargs):
+        """
+        Call function when given number of seconds is left. Function is called
+        as soon as possible if less time is left already.
+        """
+        delay = max(self.seconds_left - seconds_left, 0)
+        self._alarms = [x for x in self._alarms if x.active()]
+        self._alarms.append(self._get_clock().callLater(delay, func, *args,
+                                                        **kwargs))
+
+    def subscribe(self, callback):
+        """
+        Call given function every `tick_interval` seconds while timer is
+        running.
+        """
+        self._subscribers.append(callback)
+        if self._tick_call is None:
+            self._schedule_tick()
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _schedule_tick(self):
+        if not self._subscribers or not self.running:
+            self._tick_call = None
+            return
+        # Tick when time left crosses a multiple of interval, so displayed
+        # values change exactly in time
+        seconds_left = self.seconds_left
+        delay = seconds_left % self.tick_interval or self.tick_interval
+        if delay >= seconds_left:
+            self._tick_call = None
+            return
+        self._tick_call = self._get_clock().callLater(delay, self._on_tick)
+
+    def _on_tick(self):
+        self._tick_call = None
+        for callback in list(self._subscribers):
+            callback()
+        self._schedule_tick()
+
+    def _schedule_expiry(self, seconds_left):
+        self._expiry_call = self._get_clock().callLater(
+            min(seconds_left, self.max_wait), self._on_deadline)
+
+    def _on_deadline(self):
+        self._expiry_call = None
+        seconds_left = self.seconds_left
+        if seconds_left > 0.001:
+            # Deadline is not reached yet or scheduler's clock differs from
+            # ours, wait for the rest
+            self._schedule_expiry(seconds_left)
+            return
+        self.stop()
+        self.on_expired()
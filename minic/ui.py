@@ -4,10 +4,13 @@ import tx_logging
 
 from il2ds_middleware.constants import MISSION_STATUS
 
-from minic.constants import MISSION_STATUS_INFO
+from minic.constants import (
+    BUS_TOPIC, DELIVERY, MISSION_FILE_STATE, MISSION_STATUS_INFO,
+)
+from minic.library import mission_index
 from minic.models import MissionManager
 from minic.resources import image_path
-from minic.service import root_service
+from minic.service import get_root_service
 from minic.settings import user_settings
 from minic.util import ugettext_lazy as _
 
@@ -100,6 +103,10 @@ class MissionsDialog(gtk.Dialog):
         self._load_data()
         self.show_all()
 
+        mission_index.subscribe(self._on_index_changed)
+        self.connect('destroy', lambda widget: mission_index.unsubscribe(
+                     self._on_index_changed))
+
     def _build_components(self):
         scrolled_tree = self._build_treeview()
         panel = self._build_side_panel()
@@ -146,9 +153,21 @@ class MissionsDialog(gtk.Dialog):
         def relative_path_renderer(treeviewcolumn, cell, model, iterator):
             value = model.get_value(iterator,
                                     MissionsDialog.COLUMNS.RELATIVE_PATH)
+            state = MISSION_FILE_STATE.UNKNOWN
             if not value:
                 value = _("Not selected")
+            elif user_settings.server_path:
+                state = mission_index.get_state(
+                    MissionManager.absolute_path(value))
+
+            if state == MISSION_FILE_STATE.MISSING:
+                value = _("{0} (missing)").format(value)
+            elif state == MISSION_FILE_STATE.INVALID:
+                value = _("{0} (invalid)").format(value)
             cell.set_property('text', value)
+            cell.set_property('foreground', 'red')
+            cell.set_property('foreground-set', state in (
+                MISSION_FILE_STATE.MISSING, MISSION_FILE_STATE.INVALID))
 
         renderer = gtk.CellRendererText()
         column = gtk.TreeViewColumn(
@@ -387,6 +406,11 @@ class MissionsDialog(gtk.Dialog):
             if response != gtk.RESPONSE_OK:
                 return
 
+            info = mission_index.check_file(relative_path)
+            if info.error is not None:
+                show_error(_("Mission is invalid: {0}").format(info.error))
+                return
+
             try:
                 relative_path = \
                     MissionManager.short_relative_path(relative_path)
@@ -396,6 +420,9 @@ class MissionsDialog(gtk.Dialog):
                 store[path][MissionsDialog.COLUMNS.RELATIVE_PATH] = \
                     relative_path
 
+    def _on_index_changed(self, paths):
+        self.treeview.queue_draw()
+
     def _on_data_changed(self):
         flag = len(self.store) > 0
         self._set_controls_sensitive(flag, self.b_delete)
@@ -455,6 +482,7 @@ class MainWindow(gtk.Window):
 
     def __init__(self):
         super(MainWindow, self).__init__()
+        self.root_service = get_root_service()
 
         self.set_title(self.title)
         self.set_size_request(350, 215)
@@ -594,15 +622,15 @@ class MainWindow(gtk.Window):
         frame = gtk.Frame(label=_("Server connection"))
         frame.add(alignment)
 
-        root_service.set_callbacks(self.on_connection_done,
-                                   self.on_connection_failed,
-                                   self.on_connection_closed,
-                                   self.on_connection_lost)
+        self.root_service.set_callbacks(self.on_connection_done,
+                                        self.on_connection_failed,
+                                        self.on_connection_closed,
+                                        self.on_connection_lost)
         return frame
 
     def on_connect_clicked(self, widget):
         try:
-            root_service.startService()
+            self.root_service.startService()
         except Exception as e:
             show_error(e)
         else:
@@ -621,7 +649,7 @@ class MainWindow(gtk.Window):
         def errback(reason):
             LOG.error("Failed to stop root service: {0}".format(
                       unicode(reason.value)))
-        return root_service.stopService().addErrback(errback)
+        return self.root_service.stopService().addErrback(errback)
 
     def build_missions_frame(self):
 
@@ -714,19 +742,19 @@ class MainWindow(gtk.Window):
 
         button = to_button(gtk.STOCK_MEDIA_STOP)
         button.set_tooltip_text(_("Stop mission"))
-        method = root_service.commander.services.missions.mission_stop
+        method = self.root_service.commander.services.missions.mission_stop
         button.connect('clicked', lambda *args: method())
         self.b_mission_stop = button
 
         button = to_button(gtk.STOCK_MEDIA_PLAY)
         button.set_tooltip_text(_("Run mission"))
-        method = root_service.commander.services.missions.mission_run
+        method = self.root_service.commander.services.missions.mission_run
         button.connect('clicked', lambda *args: method())
         self.b_mission_run = button
 
         button = to_button(gtk.STOCK_REFRESH)
         button.set_tooltip_text(_("Restart mission"))
-        method = root_service.commander.services.missions.mission_restart
+        method = self.root_service.commander.services.missions.mission_restart
         button.connect('clicked', lambda *args: method())
         self.b_mission_restart = button
 
@@ -767,9 +795,10 @@ class MainWindow(gtk.Window):
         self._display_mission_status()
         self._display_mission_time_left()
 
-        root_service.commander.services.missions.register_callbacks(
-            self.on_mission_status_changed,
-            self.on_mission_timer_tick)
+        bus = self.root_service.bus
+        bus.subscribe(BUS_TOPIC.MISSION_STATUS, self.on_mission_status_changed)
+        bus.subscribe(BUS_TOPIC.MISSION_TIME_LEFT, self.on_mission_timer_tick,
+                      DELIVERY.LATEST)
 
         return frame
 
@@ -803,7 +832,8 @@ class MainWindow(gtk.Window):
             # if mission list is empty, disable all mission flow controls
             self._update_mission_flow_buttons()
             # but if some mission was running, make it possible to stop it
-            if root_service.commander.services.missions.is_mission_playing:
+            missions = self.root_service.commander.services.missions
+            if missions.is_mission_playing:
                 self.b_mission_stop.set_sensitive(True)
         else:
             self.mission_selector.set_active(new_index)
@@ -821,7 +851,7 @@ class MainWindow(gtk.Window):
 
         if new_id != old_id:
             MissionManager.set_current_id(new_id)
-            missions = root_service.commander.services.missions
+            missions = self.root_service.commander.services.missions
             if (
                 widget.is_changed_not_from_ui is False
                 and missions.is_mission_playing
@@ -846,14 +876,14 @@ class MainWindow(gtk.Window):
         if total:
             index = self.mission_selector.get_active()
 
-            missions = root_service.commander.services.missions
+            missions = self.root_service.commander.services.missions
             is_running = missions.is_mission_playing
 
             self.b_mission_first.set_sensitive(index > 0)
             self.b_mission_prev.set_sensitive(total > 1)
             self.b_mission_stop.set_sensitive(is_running)
             self.b_mission_run.set_sensitive(
-                root_service.is_connected and not is_running)
+                self.root_service.is_connected and not is_running)
             self.b_mission_restart.set_sensitive(is_running)
             self.b_mission_next.set_sensitive(total > 1)
             self.b_mission_last.set_sensitive(index < total - 1)
@@ -931,11 +961,11 @@ class MainWindow(gtk.Window):
         else:
             self._unlock_mission_controls()
 
-    def on_mission_timer_tick(self):
+    def on_mission_timer_tick(self, time_left):
         self._display_mission_time_left()
 
     def _display_mission_status(self):
-        status = root_service.commander.services.missions.status
+        status = self.root_service.commander.services.missions.status
         info = MISSION_STATUS_INFO[status]
 
         name = unicode(info['verbose_name'])
@@ -947,4 +977,4 @@ class MainWindow(gtk.Window):
 
     def _display_mission_time_left(self):
         self.lb_mission_time_left.set_text(
-            root_service.commander.services.missions.time_left_str)
+            self.root_service.commander.services.missions.time_left_str)
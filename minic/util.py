@@ -20,6 +20,12 @@ if os.name == 'posix':
             return e.errno == errno.EPERM
         else:
             return True
+
+    def replace_file(src, dst):
+        """
+        Atomically replace file `dst` with file `src` in POSIX-like OS.
+        """
+        os.rename(src, dst)
 else:
     def pid_exists(pid):
         """
@@ -34,3 +40,98 @@ else:
         if exists:
             kernel32.CloseHandle(process)
         return exists
+
+    def replace_file(src, dst):
+        """
+        Replace file `dst` with file `src` in Windows. Plain `os.rename` fails
+        here if destination exists, so native call is used instead.
+        """
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        MOVEFILE_REPLACE_EXISTING = 0x1
+        MOVEFILE_WRITE_THROUGH = 0x8
+
+        if not kernel32.MoveFileExW(
+                unicode(src), unicode(dst),
+                MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+            raise ctypes.WinError()
+
+
+class ClockMixin(object):
+    """
+    Gives access to reactor-like object to schedule calls with. Reactor is
+    used unless `clock` is set, e.g. to `task.Clock` in tests and replays.
+    """
+    clock = None
+
+    def _get_clock(self):
+        if self.clock is None:
+            from twisted.internet import reactor
+            return reactor
+        return self.clock
+
+
+def _get_monotonic_clock(os_name=None, windll=None):
+    """
+    Get native function which returns seconds of monotonic clock. Falls back
+    to `time.time` if there is no such function.
+
+    Input:
+    `os_name`   # name of OS as in `os.name`. Current one is used by default.
+    `windll`    # loader of Windows libraries. `ctypes.windll` is used by
+                # default.
+    """
+    import ctypes
+    import ctypes.util
+    import sys
+    import time
+
+    if (os_name or os.name) == 'nt':
+        try:
+            get_tick_count = (windll or ctypes.windll).kernel32.GetTickCount64
+        except AttributeError:
+            # Not available before Windows Vista
+            return time.time
+        get_tick_count.restype = ctypes.c_ulonglong
+        return lambda: get_tick_count() / 1000.0
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long), ]
+
+    CLOCK_MONOTONIC = 6 if sys.platform == 'darwin' else 1
+
+    for name in ('c', 'rt', ):
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec), ]
+        value = timespec()
+
+        def monotonic():
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(value)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return value.tv_sec + value.tv_nsec * 1e-9
+
+        return monotonic
+
+    return time.time
+
+
+_monotonic = None
+
+
+def monotonic():
+    """
+    Get seconds of a clock which cannot go backwards. Unlike `time.time` it is
+    not affected by changes of system time.
+    """
+    global _monotonic
+    if _monotonic is None:
+        _monotonic = _get_monotonic_clock()
+    return _monotonic()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP endpoint for metrics. Kept apart from `minic.metrics`, so `twisted.web`
+is imported only if the endpoint is enabled.
+"""
+from twisted.application.service import Service
+from twisted.internet import defer
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from minic.metrics import metrics
+
+
+#: Default interface for metrics HTTP endpoint. Metrics are local by default.
+DEFAULT_INTERFACE = '127.0.0.1'
+
+
+class MetricsResource(Resource):
+    """
+    Web resource which renders metrics from given registry.
+    """
+    isLeaf = True
+
+    def __init__(self, registry):
+        Resource.__init__(self)
+        self.registry = registry
+
+    def render_GET(self, request):
+        request.setHeader('Content-Type', 'text/plain; version=0.0.4')
+        return self.registry.render()
+
+
+class MetricsService(Service):
+    """
+    Serve metrics as plain text over HTTP.
+    """
+
+    def __init__(self, port, interface=DEFAULT_INTERFACE, registry=None):
+        self.port = port
+        self.interface = interface
+        self.registry = registry or metrics
+        self.listener = None
+
+    def startService(self):
+        from twisted.internet import reactor
+        self.listener = reactor.listenTCP(
+            self.port, Site(MetricsResource(self.registry)),
+            interface=self.interface)
+        Service.startService(self)
+
+    def stopService(self):
+        Service.stopService(self)
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            return defer.maybeDeferred(listener.stopListening)
+        return defer.succeed(None)
@@ -85,9 +85,8 @@ setup(
             ],
             'excludes': [
                 '_gtkagg', '_tkagg', 'bsddb', 'curses', 'pywin.debugger',
-                'pywin.debugger.dbgcon', 'email', 'calendar', 'unittest',
-                'urllib', 'urllib2', 'xml', 'tcl', 'Tkconstants', 'Tkinter',
-                'gtk.glade',
+                'pywin.debugger.dbgcon', 'unittest', 'urllib2', 'tcl',
+                'Tkconstants', 'Tkinter', 'gtk.glade',
             ],
             'optimize': 2,
         }